@@ -2,21 +2,22 @@
 Base agent class with shared LLM call logic (Anthropic + OpenAI + Groq + OpenRouter).
 """
 from __future__ import annotations
+import asyncio
 import os
 import time
-from typing import Any
+from typing import Any, AsyncIterator
+import duckdb
+from backend import telemetry
+from backend.agents.context import count_llm_call, estimate_tokens, record_prompt
+from backend.agents.llm_cache import cache_key, get_llm_cache
+from backend.agents.llm_clients import PROVIDERS, get_client
+from backend.db import database as db
+from backend.db.result import QueryResult
 
-try:
-    import anthropic as _anthropic
-    _HAS_ANTHROPIC = True
-except ImportError:
-    _HAS_ANTHROPIC = False
-
-try:
-    import openai as _openai
-    _HAS_OPENAI = True
-except ImportError:
-    _HAS_OPENAI = False
+# Consolidated mode: analysis agents skip their own explanation call and the
+# visualization agent picks charts heuristically; the report stage explains
+# the actual results in its single call.
+CONSOLIDATED = os.getenv("OLAP_CONSOLIDATED", "0") == "1"
 
 
 class BaseAgent:
@@ -25,69 +26,246 @@ class BaseAgent:
 
     def __init__(self, provider: str = "groq", model: str | None = None):
         self.provider = provider.lower()
-
-        if self.provider == "anthropic":
-            self.model = model or "claude-haiku-4-5-20251001"
-            if _HAS_ANTHROPIC:
-                self._client = _anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-        elif self.provider == "openai":
-            self.model = model or "gpt-4o-mini"
-            if _HAS_OPENAI:
-                self._client = _openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        elif self.provider == "groq":
-            self.model = model or "llama-3.3-70b-versatile"
-            if _HAS_OPENAI:
-                self._client = _openai.OpenAI(
-                    api_key=os.getenv("GROQ_API_KEY"),
-                    base_url="https://api.groq.com/openai/v1",
-                )
-
-        elif self.provider == "openrouter":
-            self.model = model or "llama-3.3-70b-versatile"
-            if _HAS_OPENAI:
-                self._client = _openai.OpenAI(
-                    api_key=os.getenv("OPENROUTER_API_KEY"),
-                    base_url="https://openrouter.ai/api/v1",
-                )
-
-        else:
+        if self.provider not in PROVIDERS:
             raise ValueError(f"Unknown provider: {provider}")
+        self.model = model or PROVIDERS[self.provider][3]
+        self._client = get_client(self.provider)
 
     def _call_llm(self, system: str, user: str, max_tokens: int = 1500) -> str:
-        for attempt in range(3):
-            try:
-                if self.provider == "anthropic" and _HAS_ANTHROPIC:
-                    resp = self._client.messages.create(
-                        model=self.model,
-                        max_tokens=max_tokens,
-                        system=system,
-                        messages=[{"role": "user", "content": user}],
-                    )
-                    return resp.content[0].text
-
-                elif self.provider in ("openai", "groq", "openrouter") and _HAS_OPENAI:
-                    resp = self._client.chat.completions.create(
-                        model=self.model,
-                        max_tokens=max_tokens,
-                        messages=[
-                            {"role": "system", "content": system},
-                            {"role": "user", "content": user},
-                        ],
-                    )
-                    return resp.choices[0].message.content
-
-                else:
-                    raise RuntimeError(f"Provider not available: {self.provider}")
-
-            except Exception as e:
-                if "rate_limit" in str(e).lower() or "429" in str(e):
-                    time.sleep(3)
-                    continue
-                raise
-
-        raise RuntimeError("Max retries exceeded")
+        cache = get_llm_cache()
+        if cache is None:
+            return self._request_llm(system, user, max_tokens)
+
+        key = cache_key(self.provider, self.model, system, user, max_tokens)
+        cached = cache.get(key)
+        if cached is not None:
+            count_llm_call(self.name, cached=True)
+            with self._llm_span(cached=True):
+                return cached
+        text = self._request_llm(system, user, max_tokens)
+        if text:
+            cache.set(key, text)
+        return text
+
+    def _request_llm(self, system: str, user: str, max_tokens: int) -> str:
+        record_prompt(self.name, system, user)
+        with self._llm_span() as span:
+            for attempt in range(3):
+                try:
+                    if self._client is None:
+                        raise RuntimeError(f"Provider not available: {self.provider}")
+                    if self.provider == "anthropic":
+                        resp = self._client.messages.create(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            system=system,
+                            messages=[{"role": "user", "content": user}],
+                        )
+                        text = resp.content[0].text
+
+                    else:
+                        resp = self._client.chat.completions.create(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            messages=[
+                                {"role": "system", "content": system},
+                                {"role": "user", "content": user},
+                            ],
+                        )
+                        text = resp.choices[0].message.content
+                    span.update(_usage(resp, system, user, text))
+                    return text
+
+                except Exception as e:
+                    if "rate_limit" in str(e).lower() or "429" in str(e):
+                        self._note_retry(span, attempt)
+                        time.sleep(3)
+                        continue
+                    raise
+
+            raise RuntimeError("Max retries exceeded")
+
+    async def _acall_llm(self, system: str, user: str, max_tokens: int = 1500) -> str:
+        """Async counterpart of _call_llm; never blocks the event loop."""
+        cache = get_llm_cache()
+        if cache is None:
+            return await self._arequest_llm(system, user, max_tokens)
+
+        key = cache_key(self.provider, self.model, system, user, max_tokens)
+        cached = await _cache_io(cache, cache.get, key)
+        if cached is not None:
+            count_llm_call(self.name, cached=True)
+            with self._llm_span(cached=True):
+                return cached
+        text = await self._arequest_llm(system, user, max_tokens)
+        if text:
+            await _cache_io(cache, cache.set, key, text)
+        return text
+
+    async def _arequest_llm(self, system: str, user: str, max_tokens: int) -> str:
+        record_prompt(self.name, system, user)
+        aclient = get_client(self.provider, asynchronous=True)
+        with self._llm_span() as span:
+            for attempt in range(3):
+                try:
+                    if aclient is None:
+                        raise RuntimeError(f"Provider not available: {self.provider}")
+                    if self.provider == "anthropic":
+                        resp = await aclient.messages.create(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            system=system,
+                            messages=[{"role": "user", "content": user}],
+                        )
+                        text = resp.content[0].text
+
+                    else:
+                        resp = await aclient.chat.completions.create(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            messages=[
+                                {"role": "system", "content": system},
+                                {"role": "user", "content": user},
+                            ],
+                        )
+                        text = resp.choices[0].message.content
+                    span.update(_usage(resp, system, user, text))
+                    return text
+
+                except Exception as e:
+                    if "rate_limit" in str(e).lower() or "429" in str(e):
+                        self._note_retry(span, attempt)
+                        await asyncio.sleep(3)
+                        continue
+                    raise
+
+            raise RuntimeError("Max retries exceeded")
+
+    async def _astream_llm(self, system: str, user: str,
+                           max_tokens: int = 1500) -> AsyncIterator[str]:
+        """Yield response text as the provider streams it; cached responses arrive whole."""
+        cache = get_llm_cache()
+        key = cache_key(self.provider, self.model, system, user, max_tokens)
+        if cache is not None:
+            cached = await _cache_io(cache, cache.get, key)
+            if cached is not None:
+                count_llm_call(self.name, cached=True)
+                with self._llm_span(cached=True, streamed=True):
+                    pass
+                yield cached
+                return
+
+        record_prompt(self.name, system, user)
+        aclient = get_client(self.provider, asynchronous=True)
+        if aclient is None:
+            raise RuntimeError(f"Provider not available: {self.provider}")
+        chunks: list[str] = []
+        with self._llm_span(streamed=True) as span:
+            for attempt in range(3):
+                try:
+                    if self.provider == "anthropic":
+                        async with aclient.messages.stream(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            system=system,
+                            messages=[{"role": "user", "content": user}],
+                        ) as stream:
+                            async for text in stream.text_stream:
+                                chunks.append(text)
+                                yield text
+
+                    else:
+                        stream = await aclient.chat.completions.create(
+                            model=self.model,
+                            max_tokens=max_tokens,
+                            messages=[
+                                {"role": "system", "content": system},
+                                {"role": "user", "content": user},
+                            ],
+                            stream=True,
+                        )
+                        async for chunk in stream:
+                            text = chunk.choices[0].delta.content if chunk.choices else None
+                            if text:
+                                chunks.append(text)
+                                yield text
+                    break
+
+                except Exception as e:
+                    # Only retry before anything has been sent downstream
+                    if not chunks and ("rate_limit" in str(e).lower() or "429" in str(e)):
+                        self._note_retry(span, attempt)
+                        await asyncio.sleep(3)
+                        continue
+                    raise
+            else:
+                raise RuntimeError("Max retries exceeded")
+            span.update(_usage(None, system, user, "".join(chunks)))
+
+        if cache is not None and chunks:
+            await _cache_io(cache, cache.set, key, "".join(chunks))
+
+    def _llm_span(self, **attrs):
+        return telemetry.span("llm", agent=self.name, provider=self.provider, model=self.model, **attrs)
+
+    def _note_retry(self, span: dict, attempt: int):
+        span["retries"] = attempt + 1
+        telemetry.inc("llm_rate_limit_retries_total", provider=self.provider, model=self.model)
+
+    def _compile_olap(self, olap_query: dict | None) -> tuple[str, list] | None:
+        """Compile a structured OLAP query; None means fall back to LLM-written SQL."""
+        if not olap_query:
+            return None
+        try:
+            return db.compile_olap(olap_query)
+        except ValueError:
+            return None
+
+    def _run_compiled(self, compiled: tuple[str, list] | None) -> tuple[str, list, QueryResult] | None:
+        """Execute compiled SQL; None means DuckDB rejected it and LLM-written SQL should be used."""
+        if not compiled:
+            return None
+        sql, params = compiled
+        try:
+            return sql, params, db.query_arrow(sql, params)
+        except duckdb.Error as e:
+            self._note_compile_fallback(e)
+            return None
+
+    async def _arun_compiled(self, compiled: tuple[str, list] | None) -> tuple[str, list, QueryResult] | None:
+        if not compiled:
+            return None
+        sql, params = compiled
+        try:
+            return sql, params, await asyncio.to_thread(db.query_arrow, sql, params)
+        except duckdb.Error as e:
+            self._note_compile_fallback(e)
+            return None
+
+    def _note_compile_fallback(self, error: Exception):
+        print(f"[{self.name}] Compiled OLAP SQL failed, falling back to LLM SQL: {error}")
+        telemetry.inc("olap_compiled_sql_fallbacks_total", agent=self.name)
 
     def run(self, query: str, context: dict | None = None) -> dict[str, Any]:
         raise NotImplementedError
+
+    async def arun(self, query: str, context: dict | None = None) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+async def _cache_io(cache, fn, *args):
+    """Run an LLM cache call; SQLite lookups and writes go to a worker thread."""
+    if cache.disk is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+def _usage(resp: Any, system: str, user: str, text: str | None) -> dict:
+    """Token counts reported by the provider (Anthropic or OpenAI style), else estimated."""
+    usage = getattr(resp, "usage", None)
+    input_tokens = getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", None)
+    output_tokens = getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", None)
+    return {
+        "input_tokens": input_tokens or estimate_tokens(system) + estimate_tokens(user),
+        "output_tokens": output_tokens or estimate_tokens(text or ""),
+    }
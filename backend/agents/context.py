@@ -0,0 +1,165 @@
+"""
+Compact context handoff between agents, and prompt-size / LLM call accounting.
+
+An analysis agent that follows another one used to receive the whole previous
+result (every row, the SQL, the explanation) stringified into its prompt.
+summarize_context turns that result into a bounded JSON digest — schema, row
+count, per-column stats, applied filters, SQL and the top rows — trimmed until
+it fits a token budget.
+
+Configuration (environment):
+  OLAP_CONTEXT_TOKENS   token budget for a context digest (default 800)
+  OLAP_CONTEXT_ROWS     max sample rows in a digest (default 10)
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+from contextvars import ContextVar
+import pandas as pd
+from backend.db.result import as_frame
+
+CONTEXT_TOKENS = int(os.getenv("OLAP_CONTEXT_TOKENS", "800"))
+CONTEXT_ROWS = int(os.getenv("OLAP_CONTEXT_ROWS", "10"))
+_TOP_VALUES = 5
+
+_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+_CLAUSE_END = re.compile(r"\b(?:GROUP\s+BY|ORDER\s+BY|HAVING|QUALIFY|LIMIT)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) — no tokenizer dependency."""
+    return (len(text) + 3) // 4
+
+
+def summarize_context(context: dict | None, budget: int = CONTEXT_TOKENS) -> str:
+    """Bounded JSON digest of a previous agent result for the next agent's prompt."""
+    if not context:
+        return ""
+    df = as_frame(context.get("data"))
+    digest = {
+        "agent": context.get("agent", ""),
+        "operation": context.get("operation", ""),
+        "row_count": len(df),
+        "schema": {c: str(t) for c, t in df.dtypes.items()},
+        "filters": _filters(context.get("sql") or "", context.get("params")),
+        "stats": _column_stats(df),
+        "sql": context.get("sql", ""),
+        "top_rows": df.head(CONTEXT_ROWS).to_dict("records"),
+    }
+
+    # Shed the least useful detail first until the digest fits the budget
+    text = _dump(digest)
+    while estimate_tokens(text) > budget and digest["top_rows"]:
+        digest["top_rows"] = digest["top_rows"][:len(digest["top_rows"]) // 2]
+        text = _dump(digest)
+    if estimate_tokens(text) > budget:
+        digest["stats"] = {c: s for c, s in digest["stats"].items() if "sum" in s}
+        text = _dump(digest)
+    if estimate_tokens(text) > budget:
+        digest["sql"] = digest["sql"][: budget * 2] + "…"
+        text = _dump(digest)
+    return text
+
+
+def _filters(sql: str, params: list | None) -> list[str]:
+    filters = [" ".join(clause.split()) for clause in _where_clauses(sql)]
+    if params:
+        filters.append(f"params={params}")
+    return filters
+
+
+def _where_clauses(sql: str):
+    """Body of each WHERE clause, up to the next clause or the enclosing ')'."""
+    for m in _WHERE.finditer(sql):
+        depth, quote, i = 0, None, m.end()
+        while i < len(sql):
+            ch = sql[i]
+            if quote:
+                quote = None if ch == quote else quote
+            elif ch in "'\"":
+                quote = ch
+            elif ch == "(":
+                depth += 1
+            elif ch == ")":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and _CLAUSE_END.match(sql, i):
+                break
+            i += 1
+        yield sql[m.end():i]
+
+
+def _column_stats(df: pd.DataFrame) -> dict:
+    stats = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            stats[col] = {
+                "sum": round(float(series.sum()), 2),
+                "mean": round(float(series.mean()), 2) if len(series) else None,
+                "min": round(float(series.min()), 2) if len(series) else None,
+                "max": round(float(series.max()), 2) if len(series) else None,
+            }
+        else:
+            counts = series.value_counts()
+            stats[col] = {
+                "distinct": int(len(counts)),
+                "top": [str(v) for v in counts.index[:_TOP_VALUES]],
+            }
+    return stats
+
+
+def _dump(digest: dict) -> str:
+    return json.dumps(digest, default=str, separators=(",", ":"))
+
+
+# ── Prompt size metrics ──────────────────────────────────────────────────────
+
+_prompt_stats: dict[str, dict] = {}
+_prompt_lock = threading.Lock()
+
+
+def record_prompt(agent: str, system: str, user: str):
+    """Count the estimated input tokens of one LLM request for an agent."""
+    tokens = estimate_tokens(system) + estimate_tokens(user)
+    count_llm_call(agent)
+    with _prompt_lock:
+        s = _prompt_stats.setdefault(agent, {"calls": 0, "tokens": 0, "max_tokens": 0})
+        s["calls"] += 1
+        s["tokens"] += tokens
+        s["max_tokens"] = max(s["max_tokens"], tokens)
+
+
+def get_prompt_stats() -> dict:
+    with _prompt_lock:
+        return {
+            agent: {**s, "avg_tokens": round(s["tokens"] / s["calls"], 1)}
+            for agent, s in _prompt_stats.items()
+        }
+
+
+# ── Per-request LLM call counter ─────────────────────────────────────────────
+
+# Set by Planner for each request; asyncio tasks and planner threads share it
+_call_counter: ContextVar[dict | None] = ContextVar("olap_llm_calls", default=None)
+
+
+def start_call_counter() -> dict:
+    counter = {"llm_calls": 0, "cache_hits": 0, "by_agent": {}}
+    _call_counter.set(counter)
+    return counter
+
+
+def count_llm_call(agent: str, cached: bool = False):
+    counter = _call_counter.get()
+    if counter is None:
+        return
+    with _prompt_lock:
+        if cached:
+            counter["cache_hits"] += 1
+        else:
+            counter["llm_calls"] += 1
+            counter["by_agent"][agent] = counter["by_agent"].get(agent, 0) + 1
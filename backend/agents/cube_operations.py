@@ -3,10 +3,12 @@ Agent 2 – Cube Operations Agent
 Handles: Slice, Dice, Pivot
 """
 from __future__ import annotations
+import asyncio
 import re
-import pandas as pd
-from backend.agents.base import BaseAgent
+from backend.agents.base import CONSOLIDATED, BaseAgent
+from backend.agents.context import summarize_context
 from backend.db import database as db
+from backend.db.result import QueryResult
 
 SYSTEM_PROMPT = """You are the Cube Operations Agent for an OLAP Business Intelligence system.
 Your role is to translate Slice, Dice, and Pivot requests into DuckDB SQL.
@@ -40,50 +42,93 @@ class CubeOperationsAgent(BaseAgent):
     name = "Cube Operations"
     description = "Slice, Dice, and Pivot operations on the OLAP cube."
 
-    def run(self, query: str, context: dict | None = None) -> dict:
+    def run(self, query: str, context: dict | None = None,
+            olap_query: dict | None = None) -> dict:
         op_type = _detect_operation(query)
-        ctx_str = f"\nPrevious context: {context}" if context else ""
+        compiled = self._run_compiled(self._compile_olap(olap_query))
+        if compiled:
+            sql, params, result = compiled
+        else:
+            sql_raw = self._call_llm(system=SYSTEM_PROMPT, user=self._sql_request(query, op_type, context))
+            sql, params, result = _extract_sql(sql_raw), None, None
 
-        sql_raw = self._call_llm(
-            system=SYSTEM_PROMPT,
-            user=f"Operation type: {op_type}\nUser request: {query}{ctx_str}\n\nGenerate the SQL:",
-        )
+        try:
+            if result is None:
+                result = db.query_arrow(sql, params)
+            explanation = self._explain(query, op_type, result)
+            return self._response(op_type, sql, result, explanation, params=params)
+        except Exception as e:
+            return self._response(op_type, sql, params=params, error=e)
 
-        sql = _extract_sql(sql_raw)
+    async def arun(self, query: str, context: dict | None = None,
+                   olap_query: dict | None = None) -> dict:
+        op_type = _detect_operation(query)
+        compiled = await self._arun_compiled(self._compile_olap(olap_query))
+        if compiled:
+            sql, params, result = compiled
+        else:
+            sql_raw = await self._acall_llm(system=SYSTEM_PROMPT, user=self._sql_request(query, op_type, context))
+            sql, params, result = _extract_sql(sql_raw), None, None
 
         try:
-            result_df = db.query(sql)
-            explanation = self._explain(query, op_type, result_df)
-            return {
-                "agent": self.name,
-                "operation": op_type,
-                "sql": sql,
-                "data": result_df.to_dict("records"),
-                "columns": list(result_df.columns),
-                "row_count": len(result_df),
-                "explanation": explanation,
-                "error": None,
-            }
+            if result is None:
+                result = await asyncio.to_thread(db.query_arrow, sql, params)
+            explanation = await self._aexplain(query, op_type, result)
+            return self._response(op_type, sql, result, explanation, params=params)
         except Exception as e:
+            return self._response(op_type, sql, params=params, error=e)
+
+    def _sql_request(self, query: str, op_type: str, context: dict | None) -> str:
+        ctx_str = f"\nPrevious context: {summarize_context(context)}" if context else ""
+        return f"Operation type: {op_type}\nUser request: {query}{ctx_str}\n\nGenerate the SQL:"
+
+    def _response(self, op_type: str, sql: str, result: QueryResult | None = None,
+                  explanation: str = "", params: list | None = None,
+                  error: Exception | None = None) -> dict:
+        if error is not None or result is None:
             return {
                 "agent": self.name,
                 "operation": op_type,
                 "sql": sql,
+                "params": params or [],
                 "data": [],
                 "columns": [],
                 "row_count": 0,
                 "explanation": "",
-                "error": str(e),
+                "error": str(error),
             }
+        return {
+            "agent": self.name,
+            "operation": op_type,
+            "sql": sql,
+            "params": params or [],
+            "data": result,
+            "columns": result.columns,
+            "row_count": result.num_rows,
+            "explanation": explanation,
+            "error": None,
+        }
+
+    def _explain(self, query: str, operation: str, result: QueryResult) -> str:
+        if result.empty:
+            return "No data matched the filter criteria."
+        if CONSOLIDATED:
+            return ""  # explained by the report stage
+        return self._call_llm(**self._explain_prompt(query, operation, result))
 
-    def _explain(self, query: str, operation: str, df: pd.DataFrame) -> str:
-        if df.empty:
+    async def _aexplain(self, query: str, operation: str, result: QueryResult) -> str:
+        if result.empty:
             return "No data matched the filter criteria."
-        summary = df.head(3).to_dict("records")
-        return self._call_llm(
-            system="You are a BI analyst. Write 2 concise business insight sentences. No bullet points.",
-            user=f"OLAP Operation: {operation}\nQuestion: {query}\nTop rows: {summary}",
-        )
+        if CONSOLIDATED:
+            return ""  # explained by the report stage
+        return await self._acall_llm(**self._explain_prompt(query, operation, result))
+
+    def _explain_prompt(self, query: str, operation: str, result: QueryResult) -> dict:
+        summary = result.head(3).to_records()
+        return {
+            "system": "You are a BI analyst. Write 2 concise business insight sentences. No bullet points.",
+            "user": f"OLAP Operation: {operation}\nQuestion: {query}\nTop rows: {summary}",
+        }
 
 
 def _detect_operation(query: str) -> str:
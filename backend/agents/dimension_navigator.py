@@ -3,10 +3,12 @@ Agent 1 – Dimension Navigator
 Handles: Drill-Down, Roll-Up, Hierarchy Navigation
 """
 from __future__ import annotations
+import asyncio
 import re
-import pandas as pd
-from backend.agents.base import BaseAgent
+from backend.agents.base import CONSOLIDATED, BaseAgent
+from backend.agents.context import summarize_context
 from backend.db import database as db
+from backend.db.result import QueryResult
 
 SYSTEM_PROMPT = """You are the Dimension Navigator Agent for an OLAP Business Intelligence system.
 Your role is to translate natural language drill-down and roll-up requests into DuckDB SQL.
@@ -37,53 +39,92 @@ class DimensionNavigatorAgent(BaseAgent):
     name = "Dimension Navigator"
     description = "Drill-Down & Roll-Up across Time, Geography, and Product hierarchies."
 
-    def run(self, query: str, context: dict | None = None) -> dict:
-        ctx_str = f"\nPrevious context: {context}" if context else ""
+    def run(self, query: str, context: dict | None = None,
+            olap_query: dict | None = None) -> dict:
+        compiled = self._run_compiled(self._compile_olap(olap_query))
+        if compiled:
+            sql, params, result = compiled
+        else:
+            sql_raw = self._call_llm(system=SYSTEM_PROMPT, user=self._sql_request(query, context))
+            sql, params, result = _extract_sql(sql_raw), None, None
 
-        sql_raw = self._call_llm(
-            system=SYSTEM_PROMPT,
-            user=f"User request: {query}{ctx_str}\n\nGenerate the SQL query:",
-        )
+        try:
+            if result is None:
+                result = db.query_arrow(sql, params)
+            explanation = self._explain(query, sql, result)
+            return self._response(sql, result, explanation, params=params)
+        except Exception as e:
+            return self._response(sql, params=params, error=e)
 
-        sql = _extract_sql(sql_raw)
+    async def arun(self, query: str, context: dict | None = None,
+                   olap_query: dict | None = None) -> dict:
+        compiled = await self._arun_compiled(self._compile_olap(olap_query))
+        if compiled:
+            sql, params, result = compiled
+        else:
+            sql_raw = await self._acall_llm(system=SYSTEM_PROMPT, user=self._sql_request(query, context))
+            sql, params, result = _extract_sql(sql_raw), None, None
 
         try:
-            result_df = db.query(sql)
-            explanation = self._explain(query, sql, result_df)
-            return {
-                "agent": self.name,
-                "operation": "drill_down_roll_up",
-                "sql": sql,
-                "data": result_df.to_dict("records"),
-                "columns": list(result_df.columns),
-                "row_count": len(result_df),
-                "explanation": explanation,
-                "error": None,
-            }
+            if result is None:
+                result = await asyncio.to_thread(db.query_arrow, sql, params)
+            explanation = await self._aexplain(query, sql, result)
+            return self._response(sql, result, explanation, params=params)
         except Exception as e:
+            return self._response(sql, params=params, error=e)
+
+    def _sql_request(self, query: str, context: dict | None) -> str:
+        ctx_str = f"\nPrevious context: {summarize_context(context)}" if context else ""
+        return f"User request: {query}{ctx_str}\n\nGenerate the SQL query:"
+
+    def _response(self, sql: str, result: QueryResult | None = None,
+                  explanation: str = "", params: list | None = None,
+                  error: Exception | None = None) -> dict:
+        if error is not None or result is None:
             return {
                 "agent": self.name,
                 "operation": "drill_down_roll_up",
                 "sql": sql,
+                "params": params or [],
                 "data": [],
                 "columns": [],
                 "row_count": 0,
                 "explanation": "",
-                "error": str(e),
+                "error": str(error),
             }
+        return {
+            "agent": self.name,
+            "operation": "drill_down_roll_up",
+            "sql": sql,
+            "params": params or [],
+            "data": result,
+            "columns": result.columns,
+            "row_count": result.num_rows,
+            "explanation": explanation,
+            "error": None,
+        }
 
-    def _explain(self, query: str, sql: str, df: pd.DataFrame) -> str:
-        if df.empty:
+    def _explain(self, query: str, sql: str, result: QueryResult) -> str:
+        if result.empty:
             return "No data found for this query."
-        top = df.iloc[0]
-        col0 = df.columns[0]
-        return (
-            self._call_llm(
-                system="You are a BI analyst. Given a user question, SQL, and top result, "
-                       "write a concise 2-sentence business insight. No bullet points.",
-                user=f"Question: {query}\nTop result: {top.to_dict()}\nColumns: {list(df.columns)}",
-            )
-        )
+        if CONSOLIDATED:
+            return ""  # explained by the report stage
+        return self._call_llm(**self._explain_prompt(query, result))
+
+    async def _aexplain(self, query: str, sql: str, result: QueryResult) -> str:
+        if result.empty:
+            return "No data found for this query."
+        if CONSOLIDATED:
+            return ""  # explained by the report stage
+        return await self._acall_llm(**self._explain_prompt(query, result))
+
+    def _explain_prompt(self, query: str, result: QueryResult) -> dict:
+        top = result.head(1).to_records()[0]
+        return {
+            "system": "You are a BI analyst. Given a user question, SQL, and top result, "
+                      "write a concise 2-sentence business insight. No bullet points.",
+            "user": f"Question: {query}\nTop result: {top}\nColumns: {result.columns}",
+        }
 
 
 def _extract_sql(text: str) -> str:
@@ -3,10 +3,12 @@ Agent 3 – KPI Calculator Agent
 Handles: Year-over-Year, Month-over-Month, Profit Margins, Rankings (Top N)
 """
 from __future__ import annotations
+import asyncio
 import re
-import pandas as pd
-from backend.agents.base import BaseAgent
+from backend.agents.base import CONSOLIDATED, BaseAgent
+from backend.agents.context import summarize_context
 from backend.db import database as db
+from backend.db.result import QueryResult
 
 SYSTEM_PROMPT = """You are the KPI Calculator Agent for an OLAP Business Intelligence system.
 Your role is to compute business KPIs: YoY growth, MoM change, profit margins, rankings.
@@ -40,51 +42,94 @@ class KPICalculatorAgent(BaseAgent):
     name = "KPI Calculator"
     description = "Computes YoY growth, MoM changes, profit margins, and Top-N rankings."
 
-    def run(self, query: str, context: dict | None = None) -> dict:
+    def run(self, query: str, context: dict | None = None,
+            olap_query: dict | None = None) -> dict:
         kpi_type = _detect_kpi(query)
-        ctx_str = f"\nPrevious context: {context}" if context else ""
+        compiled = self._run_compiled(self._compile_olap(olap_query))
+        if compiled:
+            sql, params, result = compiled
+        else:
+            sql_raw = self._call_llm(system=SYSTEM_PROMPT, user=self._sql_request(query, kpi_type, context))
+            sql, params, result = _extract_sql(sql_raw), None, None
 
-        sql_raw = self._call_llm(
-            system=SYSTEM_PROMPT,
-            user=f"KPI type: {kpi_type}\nUser request: {query}{ctx_str}\n\nGenerate the SQL:",
-        )
+        try:
+            if result is None:
+                result = db.query_arrow(sql, params)
+            explanation = self._explain(query, kpi_type, result)
+            return self._response(kpi_type, sql, result, explanation, params=params)
+        except Exception as e:
+            return self._response(kpi_type, sql, params=params, error=e)
 
-        sql = _extract_sql(sql_raw)
+    async def arun(self, query: str, context: dict | None = None,
+                   olap_query: dict | None = None) -> dict:
+        kpi_type = _detect_kpi(query)
+        compiled = await self._arun_compiled(self._compile_olap(olap_query))
+        if compiled:
+            sql, params, result = compiled
+        else:
+            sql_raw = await self._acall_llm(system=SYSTEM_PROMPT, user=self._sql_request(query, kpi_type, context))
+            sql, params, result = _extract_sql(sql_raw), None, None
 
         try:
-            result_df = db.query(sql)
-            explanation = self._explain(query, kpi_type, result_df)
-            return {
-                "agent": self.name,
-                "operation": kpi_type,
-                "sql": sql,
-                "data": result_df.to_dict("records"),
-                "columns": list(result_df.columns),
-                "row_count": len(result_df),
-                "explanation": explanation,
-                "error": None,
-            }
+            if result is None:
+                result = await asyncio.to_thread(db.query_arrow, sql, params)
+            explanation = await self._aexplain(query, kpi_type, result)
+            return self._response(kpi_type, sql, result, explanation, params=params)
         except Exception as e:
+            return self._response(kpi_type, sql, params=params, error=e)
+
+    def _sql_request(self, query: str, kpi_type: str, context: dict | None) -> str:
+        ctx_str = f"\nPrevious context: {summarize_context(context)}" if context else ""
+        return f"KPI type: {kpi_type}\nUser request: {query}{ctx_str}\n\nGenerate the SQL:"
+
+    def _response(self, kpi_type: str, sql: str, result: QueryResult | None = None,
+                  explanation: str = "", params: list | None = None,
+                  error: Exception | None = None) -> dict:
+        if error is not None or result is None:
             return {
                 "agent": self.name,
                 "operation": kpi_type,
                 "sql": sql,
+                "params": params or [],
                 "data": [],
                 "columns": [],
                 "row_count": 0,
                 "explanation": "",
-                "error": str(e),
+                "error": str(error),
             }
+        return {
+            "agent": self.name,
+            "operation": kpi_type,
+            "sql": sql,
+            "params": params or [],
+            "data": result,
+            "columns": result.columns,
+            "row_count": result.num_rows,
+            "explanation": explanation,
+            "error": None,
+        }
+
+    def _explain(self, query: str, kpi_type: str, result: QueryResult) -> str:
+        if result.empty:
+            return "No KPI data available for this query."
+        if CONSOLIDATED:
+            return ""  # explained by the report stage
+        return self._call_llm(**self._explain_prompt(query, kpi_type, result))
 
-    def _explain(self, query: str, kpi_type: str, df: pd.DataFrame) -> str:
-        if df.empty:
+    async def _aexplain(self, query: str, kpi_type: str, result: QueryResult) -> str:
+        if result.empty:
             return "No KPI data available for this query."
-        summary = df.head(5).to_dict("records")
-        return self._call_llm(
-            system="You are a CFO-level analyst. Provide a 2-sentence insight about these KPI results. "
-                   "Be specific about numbers. No bullet points.",
-            user=f"KPI: {kpi_type}\nQuestion: {query}\nResults: {summary}",
-        )
+        if CONSOLIDATED:
+            return ""  # explained by the report stage
+        return await self._acall_llm(**self._explain_prompt(query, kpi_type, result))
+
+    def _explain_prompt(self, query: str, kpi_type: str, result: QueryResult) -> dict:
+        summary = result.head(5).to_records()
+        return {
+            "system": "You are a CFO-level analyst. Provide a 2-sentence insight about these KPI results. "
+                      "Be specific about numbers. No bullet points.",
+            "user": f"KPI: {kpi_type}\nQuestion: {query}\nResults: {summary}",
+        }
 
 
 def _detect_kpi(query: str) -> str:
@@ -0,0 +1,189 @@
+"""
+LLM response cache used by BaseAgent._call_llm.
+
+Responses are keyed on (provider, model, system prompt hash, normalized user
+prompt, max_tokens). Lookups go through an in-process LRU first and, when
+OLAP_LLM_CACHE_PATH is set, an on-disk SQLite store shared across workers
+and restarts.
+
+Configuration (environment):
+  OLAP_LLM_CACHE            "0" disables caching (default on)
+  OLAP_LLM_CACHE_TTL        entry lifetime in seconds (default 3600)
+  OLAP_LLM_CACHE_SIZE       max in-memory entries (default 512)
+  OLAP_LLM_CACHE_MAX_BYTES  max in-memory payload bytes (default 16 MiB)
+  OLAP_LLM_CACHE_PATH       SQLite file for the persistent tier (optional)
+  OLAP_LLM_CACHE_DISK_SIZE  max persistent entries (default 10000)
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def cache_key(provider: str, model: str, system: str, user: str, max_tokens: int) -> str:
+    payload = json.dumps([
+        provider,
+        model,
+        hashlib.sha256(system.encode("utf-8")).hexdigest(),
+        normalize_prompt(user),
+        max_tokens,
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryStore:
+    """LRU bounded by entry count and total payload bytes."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str, ttl: float) -> str | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        created, value = item
+        if time.time() - created > ttl:
+            self._pop(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, created: float | None = None):
+        if key in self._data:
+            self._pop(key)
+        self._data[key] = (created or time.time(), value)
+        self._bytes += len(value)
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            self._pop(next(iter(self._data)))
+            self.evictions += 1
+
+    def _pop(self, key: str):
+        _, value = self._data.pop(key)
+        self._bytes -= len(value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+
+class SQLiteStore:
+    """Persistent tier: one row per response, oldest rows evicted past max_entries."""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache(created)")
+
+    def get(self, key: str, ttl: float) -> tuple[float, str] | None:
+        row = self._conn.execute(
+            "SELECT created, value FROM llm_cache WHERE key = ? AND created >= ?",
+            (key, time.time() - ttl),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class LLMCache:
+    """Two-tier (memory → SQLite) response cache with hit/miss counters."""
+
+    def __init__(self, ttl: float = 3600, memory: MemoryStore | None = None,
+                 disk: SQLiteStore | None = None):
+        self.ttl = ttl
+        self.memory = memory or MemoryStore()
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self.memory.get(key, self.ttl)
+            if value is not None:
+                self._stats["hits"] += 1
+                return value
+            if self.disk is not None:
+                found = self.disk.get(key, self.ttl)
+                if found is not None:
+                    created, value = found
+                    self.memory.set(key, value, created=created)
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return value
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self.memory.set(key, value)
+            if self.disk is not None:
+                self.disk.set(key, value)
+            self._stats["stores"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self.memory),
+                "bytes": self.memory.bytes,
+                "evictions": self.memory.evictions,
+            }
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache | None:
+    """Process-wide cache configured from the environment, or None if disabled."""
+    global _cache
+    if os.getenv("OLAP_LLM_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.getenv("OLAP_LLM_CACHE_PATH")
+                _cache = LLMCache(
+                    ttl=float(os.getenv("OLAP_LLM_CACHE_TTL", "3600")),
+                    memory=MemoryStore(
+                        max_entries=int(os.getenv("OLAP_LLM_CACHE_SIZE", "512")),
+                        max_bytes=int(os.getenv("OLAP_LLM_CACHE_MAX_BYTES", str(16 << 20))),
+                    ),
+                    disk=SQLiteStore(
+                        path, max_entries=int(os.getenv("OLAP_LLM_CACHE_DISK_SIZE", "10000"))
+                    ) if path else None,
+                )
+    return _cache
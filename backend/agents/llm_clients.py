@@ -0,0 +1,127 @@
+"""
+Process-wide LLM SDK client registry used by BaseAgent.
+
+Every agent of every Planner used to build its own Anthropic / OpenAI client,
+each with a private HTTP connection pool. Clients are now shared per
+(provider, base_url, api key) — async clients per event loop as well — so
+keep-alive connections and TLS sessions are reused across agents and requests.
+Async clients are held per loop object and dropped once their loop closes.
+The "replay" provider serves recorded responses instead (see replay.py).
+
+Configuration (environment):
+  OLAP_LLM_MAX_CONNECTIONS     max open connections per client (default 20)
+  OLAP_LLM_MAX_KEEPALIVE       max idle keep-alive connections (default 10)
+  OLAP_LLM_KEEPALIVE_EXPIRY    idle connection lifetime in seconds (default 60)
+  OLAP_LLM_TIMEOUT             request timeout in seconds (default 60)
+  OLAP_LLM_HTTP2               "0" disables HTTP/2 (used when the h2 package is installed)
+"""
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+from backend.agents import replay
+
+try:
+    import anthropic as _anthropic
+    _HAS_ANTHROPIC = True
+except ImportError:
+    _HAS_ANTHROPIC = False
+
+try:
+    import openai as _openai
+    _HAS_OPENAI = True
+except ImportError:
+    _HAS_OPENAI = False
+
+try:
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+# provider → (SDK, API key variable, base URL, default model)
+PROVIDERS = {
+    "anthropic": ("anthropic", "ANTHROPIC_API_KEY", None, "claude-haiku-4-5-20251001"),
+    "openai": ("openai", "OPENAI_API_KEY", None, "gpt-4o-mini"),
+    "groq": ("openai", "GROQ_API_KEY", "https://api.groq.com/openai/v1", "llama-3.3-70b-versatile"),
+    "openrouter": ("openai", "OPENROUTER_API_KEY", "https://openrouter.ai/api/v1", "llama-3.3-70b-versatile"),
+    "replay": ("replay", None, None, "replay"),
+}
+
+_clients: dict[tuple, object] = {}
+# event loop → its async clients; entries go away with the loop (or once it is closed)
+_loop_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _http_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=int(os.getenv("OLAP_LLM_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("OLAP_LLM_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("OLAP_LLM_KEEPALIVE_EXPIRY", "60")),
+        ),
+        "timeout": httpx.Timeout(float(os.getenv("OLAP_LLM_TIMEOUT", "60")), connect=10.0),
+        "http2": _HAS_H2 and os.getenv("OLAP_LLM_HTTP2", "1") != "0",
+    }
+
+
+def _build(sdk: str, api_key: str | None, base_url: str | None, asynchronous: bool):
+    if sdk == "replay":
+        return replay.build_client(asynchronous)
+    kwargs = {"api_key": api_key}
+    if base_url:
+        kwargs["base_url"] = base_url
+    http = httpx.AsyncClient if asynchronous else httpx.Client
+    kwargs["http_client"] = http(**_http_options())
+    if sdk == "anthropic":
+        cls = _anthropic.AsyncAnthropic if asynchronous else _anthropic.Anthropic
+    else:
+        cls = _openai.AsyncOpenAI if asynchronous else _openai.OpenAI
+    return cls(**kwargs)
+
+
+def get_client(provider: str, asynchronous: bool = False):
+    """Shared SDK client for a provider, or None if its SDK is not installed."""
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown provider: {provider}")
+    sdk, key_var, base_url, _ = PROVIDERS[provider]
+    if not {"anthropic": _HAS_ANTHROPIC, "openai": _HAS_OPENAI}.get(sdk, True):
+        return None
+
+    api_key = os.getenv(key_var) if key_var else None
+    key = (provider, base_url, api_key, "async" if asynchronous else "sync")
+    # Async connection pools belong to the event loop that opened them
+    loop = _running_loop() if asynchronous else None
+    with _clients_lock:
+        clients = _clients if loop is None else _clients_for(loop)
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = _build(sdk, api_key, base_url, asynchronous)
+    return client
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _clients_for(loop: asyncio.AbstractEventLoop) -> dict:
+    """Async clients of a loop; forgets loops that have closed (caller holds the lock)."""
+    for stale in [l for l in list(_loop_clients) if l.is_closed()]:
+        _loop_clients.pop(stale, None)
+    return _loop_clients.setdefault(loop, {})
+
+
+def get_client_stats() -> dict:
+    with _clients_lock:
+        keys = list(_clients) + [k for clients in list(_loop_clients.values()) for k in clients]
+    return {
+        "clients": len(keys),
+        "providers": sorted({k[0] for k in keys}),
+        "http2": _HAS_H2 and os.getenv("OLAP_LLM_HTTP2", "1") != "0",
+    }
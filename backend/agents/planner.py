@@ -3,10 +3,17 @@ Planner / Orchestrator
 Understands user intent, selects agents, coordinates multi-step analysis.
 """
 from __future__ import annotations
+import asyncio
 import json
+import os
 import re
-from typing import Any
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable
+from backend import telemetry
+from backend.agents import router
 from backend.agents.base import BaseAgent
+from backend.agents.context import start_call_counter
 from backend.agents.dimension_navigator import DimensionNavigatorAgent
 from backend.agents.cube_operations import CubeOperationsAgent
 from backend.agents.kpi_calculator import KPICalculatorAgent
@@ -14,6 +21,16 @@ from backend.agents.report_generator import ReportGeneratorAgent
 from backend.agents.visualization_agent import VisualizationAgent
 from backend.agents.anomaly_detection import AnomalyDetectionAgent
 
+_ROUTER_ENABLED = os.getenv("OLAP_ROUTER", "1") != "0"
+
+# Agents that only read the latest analysis result and never replace it
+CONSUMER_AGENTS = {"visualization", "report_generator"}
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OLAP_PLANNER_WORKERS", "8")),
+    thread_name_prefix="planner",
+)
+
 PLANNER_SYSTEM = """You are the Planner/Orchestrator for a multi-agent OLAP BI platform.
 Your job: analyze a user's natural language question and decide which agent(s) to invoke.
 
@@ -57,6 +74,7 @@ class Planner:
     def __init__(self, provider: str = "openrouter"):
         self.provider = provider
         self._base = BaseAgent(provider=provider)
+        self._base.name = "Planner"
         self._agents = {
             "dimension_navigator": DimensionNavigatorAgent(provider=provider),
             "cube_operations": CubeOperationsAgent(provider=provider),
@@ -67,96 +85,325 @@ class Planner:
         }
 
     def plan(self, query: str, history: list[dict] | None = None) -> dict:
-        """Call LLM to decide which agents to invoke."""
-        history_str = ""
-        if history:
-            recent = history[-3:]
-            history_str = f"\nConversation history (last {len(recent)} turns): " + json.dumps(recent)
-
-        raw = self._base._call_llm(
-            system=PLANNER_SYSTEM,
-            user=f"User query: {query}{history_str}\n\nProduce the plan JSON:",
-        )
-
-        try:
-            raw = raw.strip()
-            match = re.search(r"```(?:json)?\s*([\s\S]+?)```", raw, re.IGNORECASE)
-            if match:
-                raw = match.group(1).strip()
-            plan = json.loads(raw)
-        except Exception:
-            # Fallback plan
-            plan = {
-                "intent": query,
-                "agents": ["cube_operations", "report_generator", "visualization"],
-                "primary_agent": "cube_operations",
-                "complexity": "simple",
-                "parameters": {"filters": {}, "groupby": [], "metric": "revenue", "top_n": None},
-                "reasoning": "Default fallback plan",
-            }
-
-        # Ensure report_generator is always last
-        agents = plan.get("agents", [])
-        if "report_generator" not in agents:
-            agents.append("report_generator")
-        if "visualization" not in agents:
-            agents.append("visualization")
-        # Move report_generator to last
-        agents = [a for a in agents if a != "report_generator"] + ["report_generator"]
-        plan["agents"] = agents
-        return plan
+        """Route common query shapes locally; call the LLM to plan the rest."""
+        with telemetry.span("plan") as span:
+            if _ROUTER_ENABLED:
+                routed = router.route(query, history)
+                if routed:
+                    span["routed_by"] = "rules"
+                    return _finalize_plan(routed)
+            span["routed_by"] = "llm"
+            raw = self._base._call_llm(system=PLANNER_SYSTEM, user=_plan_request(query, history))
+            return _finalize_plan(_parse_plan(raw, query))
+
+    async def aplan(self, query: str, history: list[dict] | None = None) -> dict:
+        with telemetry.span("plan") as span:
+            if _ROUTER_ENABLED:
+                routed = router.route(query, history)
+                if routed:
+                    span["routed_by"] = "rules"
+                    return _finalize_plan(routed)
+            span["routed_by"] = "llm"
+            raw = await self._base._acall_llm(system=PLANNER_SYSTEM, user=_plan_request(query, history))
+            return _finalize_plan(_parse_plan(raw, query))
 
     def execute(self, query: str, history: list[dict] | None = None) -> dict[str, Any]:
         """Full pipeline: plan → execute agents → return combined result."""
-        plan = self.plan(query, history)
-        agents_to_run = plan.get("agents", [])
+        with telemetry.in_flight("planner_executions_in_flight"):
+            counter, trace = start_call_counter(), telemetry.start_trace()
+            plan = self.plan(query, history)
+            agents_to_run = plan.get("agents", [])
+            olap_idx = _olap_query_target(plan)
 
-        results: dict[str, Any] = {
-            "query": query,
-            "plan": plan,
-            "agent_results": {},
-            "final_data": [],
-            "final_columns": [],
-            "report": None,
-            "viz_config": None,
-            "anomalies": [],
-            "error": None,
-        }
+            # Analysis agents (and anomaly detection) produce data; visualization and
+            # report_generator only consume it. Every agent reads the latest
+            # successful producer result before it in plan order, so it only has to
+            # wait for the producers ahead of it — consumers and a context-free
+            # anomaly_detection run concurrently with whatever else is ready.
+            outcomes: dict[int, tuple[dict | None, Exception | None]] = {}
+            futures: dict[int, Future] = {}
+            producers: list[int] = []
+
+            for idx, agent_name in enumerate(agents_to_run):
+                agent = self._agents.get(agent_name)
+                if not agent:
+                    continue
+                for dep in producers:
+                    outcomes[dep] = futures[dep].result()
+                context = _latest_context(agents_to_run, producers, outcomes)
+                olap_query = plan["olap_query"] if idx == olap_idx else None
+                futures[idx] = _executor.submit(
+                    contextvars.copy_context().run, _run_agent, agent, query, context, olap_query
+                )
+                if agent_name not in CONSUMER_AGENTS:
+                    producers.append(idx)
+
+            for idx, future in futures.items():
+                outcomes[idx] = future.result()
+
+            return {**_merge_outcomes(query, plan, outcomes), "llm_calls": dict(counter),
+                    "timings": telemetry.finish_trace(trace)}
+
+    async def aexecute(self, query: str, history: list[dict] | None = None,
+                       emit: Callable[[tuple[str, Any]], None] | None = None) -> dict[str, Any]:
+        """
+        Async pipeline with the same stage scheduling as execute(). emit, if
+        given, receives the same (event, payload) pairs as astream() while it runs.
+        """
+        with telemetry.in_flight("planner_executions_in_flight"):
+            counter, trace = start_call_counter(), telemetry.start_trace()
+            plan = await self.aplan(query, history)
+            if emit:
+                emit(("plan", plan))
+            outcomes = await self._arun_stages(query, plan, emit=emit)
+            return {**_merge_outcomes(query, plan, outcomes), "llm_calls": dict(counter),
+                    "timings": telemetry.finish_trace(trace)}
+
+    async def astream(self, query: str,
+                      history: list[dict] | None = None) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Async pipeline that yields (event, payload) pairs as soon as each piece exists:
+        plan, then data / anomalies / viz / report as their stages finish, report_token
+        while the report streams, error for failed stages and finally done.
+        """
+        with telemetry.in_flight("planner_executions_in_flight"):
+            counter, trace = start_call_counter(), telemetry.start_trace()
+            plan = await self.aplan(query, history)
+            yield "plan", plan
+
+            events: asyncio.Queue = asyncio.Queue()
 
-        last_analysis_result = None
+            async def run_stages():
+                try:
+                    return await self._arun_stages(query, plan, emit=events.put_nowait)
+                finally:
+                    events.put_nowait(None)
 
-        for agent_name in agents_to_run:
+            run = asyncio.create_task(run_stages())
+            try:
+                while (event := await events.get()) is not None:
+                    yield event
+                result = _merge_outcomes(query, plan, await run)
+                yield "done", {"error": result["error"], "llm_calls": dict(counter),
+                               "timings": telemetry.finish_trace(trace)}
+            finally:
+                run.cancel()
+
+    async def _arun_stages(self, query: str, plan: dict,
+                           emit: Callable[[tuple[str, Any]], None] | None = None) -> dict:
+        agents_to_run = plan.get("agents", [])
+        olap_idx = _olap_query_target(plan)
+
+        outcomes: dict[int, tuple[dict | None, Exception | None]] = {}
+        tasks: dict[int, asyncio.Task] = {}
+        producers: list[int] = []
+
+        for idx, agent_name in enumerate(agents_to_run):
             agent = self._agents.get(agent_name)
             if not agent:
                 continue
+            for dep in producers:
+                outcomes[dep] = await tasks[dep]
+            kwargs: dict[str, Any] = {}
+            if idx == olap_idx:
+                kwargs["olap_query"] = plan["olap_query"]
+            if emit and agent_name == "report_generator":
+                kwargs["on_token"] = lambda text: emit(("report_token", {"text": text}))
+            context = _latest_context(agents_to_run, producers, outcomes)
+            tasks[idx] = asyncio.create_task(
+                _arun_stage(agent_name, agent, query, context, emit, **kwargs)
+            )
+            if agent_name not in CONSUMER_AGENTS:
+                producers.append(idx)
 
-            try:
-                if agent_name == "report_generator":
-                    result = agent.run(query, context=last_analysis_result)
-                    results["report"] = result.get("report")
-                elif agent_name == "visualization":
-                    result = agent.run(query, context=last_analysis_result)
-                    results["viz_config"] = result.get("config")
-                elif agent_name == "anomaly_detection":
-                    result = agent.run(query, context=last_analysis_result)
-                    results["anomalies"] = result.get("anomalies", [])
-                    if result.get("data"):
-                        last_analysis_result = result
-                        results["final_data"] = result["data"]
-                        results["final_columns"] = result.get("columns", [])
-                else:
-                    result = agent.run(query, context=last_analysis_result)
-                    if result.get("error"):
-                        results["error"] = result["error"]
-                    else:
-                        last_analysis_result = result
-                        results["final_data"] = result.get("data", [])
-                        results["final_columns"] = result.get("columns", [])
-
-                results["agent_results"][agent_name] = result
-
-            except Exception as e:
-                results["agent_results"][agent_name] = {"error": str(e)}
-                results["error"] = str(e)
-
-        return results
+        for idx, task in tasks.items():
+            outcomes[idx] = await task
+        return outcomes
+
+
+def _plan_request(query: str, history: list[dict] | None) -> str:
+    history_str = ""
+    if history:
+        recent = history[-3:]
+        history_str = f"\nConversation history (last {len(recent)} turns): " + json.dumps(recent)
+    return f"User query: {query}{history_str}\n\nProduce the plan JSON:"
+
+
+def _parse_plan(raw: str, query: str) -> dict:
+    try:
+        raw = raw.strip()
+        match = re.search(r"```(?:json)?\s*([\s\S]+?)```", raw, re.IGNORECASE)
+        if match:
+            raw = match.group(1).strip()
+        plan = json.loads(raw)
+    except Exception:
+        # Fallback plan
+        plan = {
+            "intent": query,
+            "agents": ["cube_operations", "report_generator", "visualization"],
+            "primary_agent": "cube_operations",
+            "complexity": "simple",
+            "parameters": {"filters": {}, "groupby": [], "metric": "revenue", "top_n": None},
+            "reasoning": "Default fallback plan",
+        }
+    plan["routed_by"] = "llm"
+    return plan
+
+
+def _finalize_plan(plan: dict) -> dict:
+    # Ensure report_generator is always last
+    agents = plan.get("agents", [])
+    if "report_generator" not in agents:
+        agents.append("report_generator")
+    if "visualization" not in agents:
+        agents.append("visualization")
+    # Move report_generator to last
+    agents = [a for a in agents if a != "report_generator"] + ["report_generator"]
+    plan["agents"] = agents
+    return plan
+
+
+def _latest_context(agents: list[str], producers: list[int], outcomes: dict) -> dict | None:
+    """Most recent producer result that would have become the analysis context."""
+    for idx in reversed(producers):
+        result, error = outcomes[idx]
+        if error is not None:
+            continue
+        if agents[idx] == "anomaly_detection":
+            if result.get("data"):
+                return result
+        elif not result.get("error"):
+            return result
+    return None
+
+
+def _merge_outcomes(query: str, plan: dict, outcomes: dict) -> dict[str, Any]:
+    """Combine agent outcomes in plan order so later agents win as in a sequential run."""
+    results: dict[str, Any] = {
+        "query": query,
+        "plan": plan,
+        "agent_results": {},
+        "final_data": [],
+        "final_columns": [],
+        "report": None,
+        "viz_config": None,
+        "anomalies": [],
+        "error": None,
+    }
+    data_agent = None
+
+    for idx, agent_name in enumerate(plan.get("agents", [])):
+        if idx not in outcomes:
+            continue
+        result, error = outcomes[idx]
+        if error is not None:
+            results["agent_results"][agent_name] = {"error": str(error)}
+            results["error"] = str(error)
+            continue
+
+        if agent_name == "report_generator":
+            results["report"] = result.get("report")
+        elif agent_name == "visualization":
+            results["viz_config"] = result.get("config")
+        elif agent_name == "anomaly_detection":
+            results["anomalies"] = result.get("anomalies", [])
+            if result.get("data"):
+                results["final_data"] = result["data"]
+                results["final_columns"] = result.get("columns", [])
+                data_agent = agent_name
+        elif result.get("error"):
+            results["error"] = result["error"]
+        else:
+            results["final_data"] = result.get("data", [])
+            results["final_columns"] = result.get("columns", [])
+            data_agent = agent_name
+
+        results["agent_results"][agent_name] = result
+
+    # Consolidated mode: the report stage explained the analysis result
+    explanation = (results["report"] or {}).pop("analysis_explanation", None)
+    if explanation and data_agent and not results["agent_results"][data_agent].get("explanation"):
+        results["agent_results"][data_agent]["explanation"] = explanation
+    return results
+
+
+def _olap_query_target(plan: dict) -> int | None:
+    """Plan index of the agent that should run the plan's structured OLAP query."""
+    if not plan.get("olap_query"):
+        return None
+    agents = plan.get("agents", [])
+    primary = plan.get("primary_agent")
+    return agents.index(primary) if primary in agents else None
+
+
+def _run_agent(agent: BaseAgent, query: str, context: dict | None,
+               olap_query: dict | None = None) -> tuple[dict | None, Exception | None]:
+    try:
+        with telemetry.span("agent", agent=agent.name) as span:
+            if olap_query:
+                result = agent.run(query, context=context, olap_query=olap_query)
+            else:
+                result = agent.run(query, context=context)
+            span.update(_stage_attrs(result))
+            return result, None
+    except Exception as e:
+        return None, e
+
+
+async def _arun_agent(agent: BaseAgent, query: str, context: dict | None,
+                      **kwargs) -> tuple[dict | None, Exception | None]:
+    try:
+        with telemetry.span("agent", agent=agent.name) as span:
+            result = await agent.arun(query, context=context, **kwargs)
+            span.update(_stage_attrs(result))
+            return result, None
+    except Exception as e:
+        return None, e
+
+
+def _stage_attrs(result: dict) -> dict:
+    attrs = {}
+    if isinstance(result.get("row_count"), int):
+        attrs["rows"] = result["row_count"]
+    if result.get("error"):
+        attrs["error"] = str(result["error"])[:200]
+    return attrs
+
+
+async def _arun_stage(name: str, agent: BaseAgent, query: str, context: dict | None,
+                      emit: Callable[[tuple[str, Any]], None] | None,
+                      **kwargs) -> tuple[dict | None, Exception | None]:
+    outcome = await _arun_agent(agent, query, context, **kwargs)
+    if emit:
+        for event in _stage_events(name, *outcome):
+            emit(event)
+    return outcome
+
+
+def _stage_events(name: str, result: dict | None, error: Exception | None) -> list[tuple[str, Any]]:
+    """Streaming events for one finished stage."""
+    if error is not None:
+        return [("error", {"agent": name, "error": str(error)})]
+    if name == "report_generator":
+        return [("report", result.get("report"))]
+    if name == "visualization":
+        return [("viz", result.get("config"))]
+    if result.get("error"):
+        return [("error", {"agent": name, "error": result["error"]})]
+
+    events = []
+    if name == "anomaly_detection":
+        events.append(("anomalies", {
+            "anomalies": result.get("anomalies", []),
+            "summary": result.get("summary", ""),
+        }))
+    if result.get("data"):
+        events.append(("data", {
+            "agent": name,
+            "operation": result.get("operation"),
+            "sql": result.get("sql"),
+            "explanation": result.get("explanation", ""),
+            "columns": result.get("columns", []),
+            "rows": result["data"],
+        }))
+    return events
@@ -0,0 +1,224 @@
+"""
+Record / replay LLM provider ("replay") for offline, deterministic runs.
+
+The replay client speaks the OpenAI chat-completions shape BaseAgent already
+handles. In record mode each request is forwarded to a real upstream provider
+and the (system, user) → response pair is appended to a JSONL fixture file,
+together with the observed latency and token usage. In replay mode responses
+come only from the fixture file, after a synthetic delay, so the whole Planner
+pipeline can be load-tested and profiled without API keys or network jitter.
+
+Configuration (environment):
+  OLAP_REPLAY_MODE        "replay" (default) or "record"
+  OLAP_REPLAY_FIXTURES    JSONL fixture file (default data/llm_fixtures.jsonl)
+  OLAP_REPLAY_UPSTREAM    provider recorded from (default groq)
+  OLAP_REPLAY_LATENCY_MS  delay per replayed response in ms, or "recorded" (default 0)
+  OLAP_REPLAY_JITTER_MS   extra delay, uniform in [0, jitter), seeded per prompt (default 0)
+  OLAP_REPLAY_API         "1" lets API clients pick provider "replay" (default 0);
+                          the API refuses it in record mode regardless
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from backend.agents.llm_cache import normalize_prompt
+
+_DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "..", "..", "data", "llm_fixtures.jsonl")
+
+
+def fixture_key(system: str, user: str) -> str:
+    payload = json.dumps([hashlib.sha256(system.encode("utf-8")).hexdigest(), normalize_prompt(user)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Fixtures:
+    """Recorded responses keyed on (system, user), loaded from and appended to a JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    def get(self, system: str, user: str) -> dict | None:
+        entry = self._entries.get(fixture_key(system, user))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def record(self, system: str, user: str, response: str, latency_ms: float,
+               usage: dict | None = None) -> dict:
+        entry = {
+            "key": fixture_key(system, user),
+            "system": system,
+            "user": user,
+            "response": response,
+            "latency_ms": round(latency_ms, 1),
+            "usage": usage or {},
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._entries[entry["key"]] = entry
+            self.recorded += 1
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits,
+                    "misses": self.misses, "recorded": self.recorded}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ReplayClient:
+    """Stands in for an OpenAI SDK client: client.chat.completions.create(...)."""
+
+    def __init__(self, fixtures: Fixtures, asynchronous: bool = False, mode: str = "replay",
+                 upstream: str = "groq", latency_ms: str = "0", jitter_ms: float = 0.0):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        self.fixtures = fixtures
+        self.asynchronous = asynchronous
+        self.mode = mode
+        self.upstream = upstream
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=self._acreate if asynchronous else self._create
+        ))
+
+    def _create(self, model: str, messages: list[dict], max_tokens: int = 1500, stream: bool = False):
+        system, user = _prompts(messages)
+        if self.mode == "record":
+            return _response(self._record(system, user, max_tokens))
+        entry = self._lookup(system, user)
+        time.sleep(self._delay(entry))
+        return _response(entry)
+
+    async def _acreate(self, model: str, messages: list[dict], max_tokens: int = 1500,
+                       stream: bool = False):
+        system, user = _prompts(messages)
+        if self.mode == "record":
+            # Recording goes through the upstream's sync client off the event loop
+            entry = await asyncio.to_thread(self._record, system, user, max_tokens)
+        else:
+            entry = self._lookup(system, user)
+            await asyncio.sleep(self._delay(entry))
+        return _chunks(entry["response"]) if stream else _response(entry)
+
+    def _lookup(self, system: str, user: str) -> dict:
+        entry = self.fixtures.get(system, user)
+        if entry is None:
+            raise LookupError(
+                f"No recorded LLM response in {self.fixtures.path} for prompt "
+                f"{user[:80]!r} (run with OLAP_REPLAY_MODE=record to capture it)"
+            )
+        return entry
+
+    def _delay(self, entry: dict) -> float:
+        base = entry["latency_ms"] if self.latency_ms == "recorded" else float(self.latency_ms)
+        jitter = random.Random(entry["key"]).uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        return (base + jitter) / 1000
+
+    def _record(self, system: str, user: str, max_tokens: int) -> dict:
+        from backend.agents.llm_clients import PROVIDERS, get_client
+
+        if self.upstream not in PROVIDERS or PROVIDERS[self.upstream][0] == "replay":
+            raise ValueError(f"Cannot record from provider: {self.upstream}")
+        client = get_client(self.upstream)
+        if client is None:
+            raise RuntimeError(f"Provider not available: {self.upstream}")
+        sdk, model = PROVIDERS[self.upstream][0], PROVIDERS[self.upstream][3]
+        start = time.perf_counter()
+        if sdk == "anthropic":
+            resp = client.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                system=system,
+                messages=[{"role": "user", "content": user}],
+            )
+            text = resp.content[0].text
+        else:
+            resp = client.chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": user},
+                ],
+            )
+            text = resp.choices[0].message.content
+        latency_ms = (time.perf_counter() - start) * 1000
+        usage = getattr(resp, "usage", None)
+        return self.fixtures.record(system, user, text or "", latency_ms, {
+            "prompt_tokens": getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "output_tokens", None)
+            or getattr(usage, "completion_tokens", None),
+        })
+
+
+def _prompts(messages: list[dict]) -> tuple[str, str]:
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in messages if m["role"] == "user"), "")
+    return system, user
+
+
+def _response(entry: dict) -> SimpleNamespace:
+    usage = entry.get("usage") or {}
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=entry["response"]))],
+        usage=SimpleNamespace(prompt_tokens=usage.get("prompt_tokens"),
+                              completion_tokens=usage.get("completion_tokens")),
+    )
+
+
+async def _chunks(text: str):
+    """Replay a response as a token stream, one word per chunk."""
+    for word in re.findall(r"\s*\S+\s*|\s+", text):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+        await asyncio.sleep(0)
+
+
+_fixtures: Fixtures | None = None
+_fixtures_lock = threading.Lock()
+
+
+def get_fixtures() -> Fixtures:
+    """Process-wide fixture store (OLAP_REPLAY_FIXTURES), loaded on first use."""
+    global _fixtures
+    if _fixtures is None:
+        with _fixtures_lock:
+            if _fixtures is None:
+                _fixtures = Fixtures(os.getenv("OLAP_REPLAY_FIXTURES") or _DEFAULT_FIXTURES)
+    return _fixtures
+
+
+def build_client(asynchronous: bool = False) -> ReplayClient:
+    return ReplayClient(
+        get_fixtures(),
+        asynchronous=asynchronous,
+        mode=os.getenv("OLAP_REPLAY_MODE", "replay").lower(),
+        upstream=os.getenv("OLAP_REPLAY_UPSTREAM", "groq").lower(),
+        latency_ms=os.getenv("OLAP_REPLAY_LATENCY_MS", "0"),
+        jitter_ms=float(os.getenv("OLAP_REPLAY_JITTER_MS", "0")),
+    )
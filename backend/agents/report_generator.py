@@ -4,8 +4,12 @@ Handles: Executive summaries, formatted tables, conditional formatting hints,
          follow-up question suggestions.
 """
 from __future__ import annotations
+import json
+import re
+from typing import Callable
 import pandas as pd
-from backend.agents.base import BaseAgent
+from backend.agents.base import CONSOLIDATED, BaseAgent
+from backend.db.result import as_frame
 
 SYSTEM_PROMPT = """You are the Report Generator Agent for an OLAP Business Intelligence platform.
 Your role is to transform raw analytical results into polished business reports.
@@ -40,6 +44,15 @@ RULES:
 4. follow_up_questions must be natural language business questions.
 """
 
+# Consolidated mode: the analysis agents skip their own explanation call
+CONSOLIDATED_PROMPT = """
+5. Also include the key "analysis_explanation": a concise 2-sentence business insight
+   about the results that answers the question with specific numbers.
+"""
+
+
+_SYSTEM = SYSTEM_PROMPT + (CONSOLIDATED_PROMPT if CONSOLIDATED else "")
+
 
 class ReportGeneratorAgent(BaseAgent):
     name = "Report Generator"
@@ -50,16 +63,40 @@ class ReportGeneratorAgent(BaseAgent):
         if not context or "data" not in context:
             return self._empty_report()
 
-        data = context.get("data", [])
-        operation = context.get("operation", "analysis")
-        columns = context.get("columns", [])
-        agent_name = context.get("agent", "")
+        df = as_frame(context.get("data", []))
+        if df.empty:
+            return self._empty_report()
 
-        # Build data summary for LLM
-        df = pd.DataFrame(data)
+        raw = self._call_llm(
+            system=_SYSTEM,
+            user=self._request(query, context, df),
+            max_tokens=1000,
+        )
+        return self._response(raw, query, context, df)
+
+    async def arun(self, query: str, context: dict | None = None,
+                   on_token: Callable[[str], None] | None = None) -> dict:
+        """Async run; on_token, if given, receives report text as the LLM streams it."""
+        if not context or "data" not in context:
+            return self._empty_report()
+
+        df = as_frame(context.get("data", []))
         if df.empty:
             return self._empty_report()
 
+        user = self._request(query, context, df)
+        if on_token is None:
+            raw = await self._acall_llm(system=_SYSTEM, user=user, max_tokens=1000)
+        else:
+            chunks = []
+            async for text in self._astream_llm(system=_SYSTEM, user=user, max_tokens=1000):
+                chunks.append(text)
+                on_token(text)
+            raw = "".join(chunks)
+        return self._response(raw, query, context, df)
+
+    def _request(self, query: str, context: dict, df: pd.DataFrame) -> str:
+        """Build data summary for LLM."""
         stats = {}
         for col in df.select_dtypes(include=["float64", "int64"]).columns:
             stats[col] = {
@@ -71,24 +108,20 @@ class ReportGeneratorAgent(BaseAgent):
 
         summary = {
             "question": query,
-            "operation": operation,
-            "agent": agent_name,
+            "operation": context.get("operation", "analysis"),
+            "agent": context.get("agent", ""),
             "total_rows": len(df),
-            "columns": columns,
+            "columns": context.get("columns", []),
             "top_5_rows": df.head(5).to_dict("records"),
             "statistics": stats,
         }
 
-        import json
-        raw = self._call_llm(
-            system=SYSTEM_PROMPT,
-            user=f"Analysis summary:\n{json.dumps(summary, indent=2)}",
-            max_tokens=1000,
-        )
+        return f"Analysis summary:\n{json.dumps(summary, indent=2)}"
 
+    def _response(self, raw: str, query: str, context: dict, df: pd.DataFrame) -> dict:
+        columns = context.get("columns", [])
         try:
             # Strip possible markdown fences
-            import re
             raw = raw.strip()
             match = re.search(r"```(?:json)?\s*([\s\S]+?)```", raw, re.IGNORECASE)
             if match:
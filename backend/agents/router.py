@@ -0,0 +1,239 @@
+"""
+Rule-based intent router.
+
+Classifies common query shapes (slice / dice / pivot / YoY / MoM / top-N /
+anomaly / drill-down / roll-up) into a plan without calling the LLM.
+Planner.plan only falls back to the LLM planner when no rule fires or the
+match is ambiguous (confidence below OLAP_ROUTER_MIN_CONFIDENCE).
+
+When the extracted parameters fully describe the request, the plan also
+carries an "olap_query" (see backend/db/olap.py) so the primary agent can
+compile SQL deterministically instead of asking the LLM to write it.
+"""
+from __future__ import annotations
+import os
+import re
+import threading
+from backend.db.olap import COMPARISONS, with_year
+
+MIN_CONFIDENCE = float(os.getenv("OLAP_ROUTER_MIN_CONFIDENCE", "0.75"))
+
+# (operation, agent, strong keywords, weak keywords) — checked in this order
+RULES = [
+    ("anomaly", "anomaly_detection",
+     ["anomal", "unusual", "outlier", "irregular"],
+     ["spike", "sudden drop", "unexpected", "strange"]),
+    ("pivot", "cube_operations",
+     ["pivot", "as columns", "as column", "rotate", "cross-tab", "crosstab"],
+     []),
+    ("yoy_growth", "kpi_calculator",
+     ["year over year", "year-over-year", r"yoy\b", "annual growth",
+      r"20\d\d\s+(?:vs\.?|versus|against|compared to)\s+20\d\d"],
+     ["compare", "growth"]),
+    ("mom_change", "kpi_calculator",
+     ["month over month", "month-over-month", r"mom\b", "monthly change"],
+     ["monthly trend"]),
+    ("ranking", "kpi_calculator",
+     [r"top\s+\d+", r"bottom\s+\d+", r"rank(?:ing|ed)?\b"],
+     [r"top\b", "best", "worst", "highest", "lowest"]),
+    ("profit_margin", "kpi_calculator",
+     ["profit margin", "profitability"],
+     ["margin"]),
+    ("drill_down", "dimension_navigator",
+     ["drill", "break down", "breakdown"],
+     []),
+    ("roll_up", "dimension_navigator",
+     ["roll up", "roll-up", "rollup", "summarize to", "aggregate to"],
+     ["totals"]),
+    ("slice_dice", "cube_operations",
+     ["show only", "filter to", "only show", "filtered"],
+     ["only", "sales in", "sales for"]),
+]
+
+# Ranking words also turn a YoY / MoM request into a ranked comparison
+_RANKING_WORDS = next(strong + weak for op, _, strong, weak in RULES if op == "ranking")
+
+# Follow-ups that lean on earlier turns need the LLM planner to read history
+_ANAPHORA = re.compile(r"\b(it|that|those|them|this|these|same|instead|previous|above)\b")
+
+_DIMENSION_VALUES = {
+    "region": ["North America", "Europe", "Asia Pacific", "Latin America"],
+    "category": ["Electronics", "Furniture", "Office Supplies", "Clothing"],
+    "customer_segment": ["Consumer", "Corporate", "Small Business", "Government"],
+}
+_GROUPBY_WORDS = {
+    "year": "year", "quarter": "quarter", "month": "month_name", "region": "region",
+    "country": "country", "category": "category", "subcategory": "subcategory",
+    "segment": "customer_segment",
+}
+# Plural / entity nouns that imply the grouping level ("top 5 countries")
+_ENTITY_WORDS = {
+    "countries": "country", "regions": "region", "categories": "category",
+    "category": "category", "subcategories": "subcategory", "subcategory": "subcategory",
+    "segments": "customer_segment", "segment": "customer_segment",
+    "region": "region", "country": "country",
+}
+# Known member lists for pivot columns
+_PIVOT_VALUES = {
+    **_DIMENSION_VALUES,
+    "year": [2022, 2023, 2024],
+    "quarter": ["Q1", "Q2", "Q3", "Q4"],
+}
+_DEFAULT_MEASURES = ["revenue", "profit", "quantity", "profit_margin"]
+_METRICS = [("profit margin", "profit_margin"), ("margin", "profit_margin"),
+            ("profit", "profit"), ("quantity", "quantity"), ("units", "quantity")]
+
+_stats = {"fast_path": 0, "llm": 0, "by_operation": {}}
+_stats_lock = threading.Lock()
+
+
+def _matches(q: str, patterns: list[str]) -> bool:
+    return any(re.search(p if p.startswith(r"\b") else rf"(?:^|\W){p}", q) for p in patterns)
+
+
+def classify(query: str, history: list[dict] | None = None) -> dict | None:
+    """Return a plan dict with a confidence score, or None when no rule matches."""
+    q = query.lower().strip()
+    strong = [(op, agent) for op, agent, kws, _ in RULES if _matches(q, kws)]
+    weak = [(op, agent) for op, agent, _, kws in RULES if _matches(q, kws)]
+
+    if strong:
+        candidates, confidence = strong, 0.9
+    elif weak:
+        candidates, confidence = weak, 0.7
+    else:
+        return None
+
+    operation, primary = candidates[0]
+    agents = {agent for _, agent in strong + weak}
+    parameters = _parameters(query)
+    if operation == "slice_dice" and parameters["filters"]:
+        # Explicit dimension values make a plain filter request unambiguous
+        confidence += 0.1
+    if len(agents) > 1:
+        # Several agents implied (e.g. "break down ... then rank") → multi-step
+        confidence -= 0.3
+    if " then " in q or "and then" in q:
+        confidence -= 0.1
+    if history and _ANAPHORA.search(q):
+        confidence -= 0.3
+
+    plan = {
+        "intent": query,
+        "agents": [primary, "visualization", "report_generator"],
+        "primary_agent": primary,
+        "complexity": "multi_step" if len(agents) > 1 else "simple",
+        "parameters": parameters,
+        "reasoning": f"Rule-based router matched '{operation}'",
+        "operation": operation,
+        "routed_by": "rules",
+        "confidence": round(min(confidence, 1.0), 2),
+    }
+    olap_query = _olap_query(operation, parameters, q)
+    if olap_query and len(agents) == 1:
+        plan["olap_query"] = olap_query
+    return plan
+
+
+def route(query: str, history: list[dict] | None = None) -> dict | None:
+    """Confident plan for the fast path, or None to defer to the LLM planner."""
+    plan = classify(query, history)
+    with _stats_lock:
+        if plan and plan["confidence"] >= MIN_CONFIDENCE:
+            _stats["fast_path"] += 1
+            ops = _stats["by_operation"]
+            ops[plan["operation"]] = ops.get(plan["operation"], 0) + 1
+            return plan
+        _stats["llm"] += 1
+    return None
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        total = _stats["fast_path"] + _stats["llm"]
+        return {
+            "fast_path": _stats["fast_path"],
+            "llm": _stats["llm"],
+            "hit_rate": round(_stats["fast_path"] / total, 4) if total else 0.0,
+            "by_operation": dict(_stats["by_operation"]),
+        }
+
+
+def _parameters(query: str) -> dict:
+    q = query.lower()
+    filters: dict = {}
+    years = re.findall(r"\b(20\d\d)\b", q)
+    if years:
+        filters["year"] = [int(y) for y in dict.fromkeys(years)]
+    quarters = re.findall(r"\bq([1-4])\b", q)
+    if quarters:
+        filters["quarter"] = [f"Q{n}" for n in dict.fromkeys(quarters)]
+    for dim, values in _DIMENSION_VALUES.items():
+        found = [v for v in values if v.lower() in q]
+        if found:
+            filters[dim] = found
+
+    groupby = [col for word, col in _GROUPBY_WORDS.items()
+               if re.search(rf"\bby {word}\b|\bper {word}\b|\b{word}s? as (?:rows|columns)\b", q)]
+    target = re.search(r"\bto (year|quarter|month)(?:ly)?\b", q)
+    if target and _GROUPBY_WORDS[target.group(1)] not in groupby:
+        groupby.insert(0, _GROUPBY_WORDS[target.group(1)])
+    entity = re.search(r"\b(?:top|bottom)\s+\d+\s+(\w+)|\bwhich\s+(\w+)", q)
+    if entity:
+        col = _ENTITY_WORDS.get(entity.group(1) or entity.group(2))
+        if col and col not in groupby:
+            groupby.insert(0, col)
+    groupby = with_year(groupby, filters)
+    metric = next((m for word, m in _METRICS if word in q), "revenue")
+    top_n = re.search(r"\b(?:top|bottom)\s+(\d+)\b", q)
+
+    return {
+        "filters": filters,
+        "groupby": groupby,
+        "metric": metric,
+        "top_n": int(top_n.group(1)) if top_n else None,
+    }
+
+
+def _descending(q: str) -> bool:
+    return not re.search(r"\b(?:bottom|worst|lowest)\b", q)
+
+
+def _olap_query(operation: str, parameters: dict, q: str) -> dict | None:
+    """Structured query for the primary agent, or None if the LLM should write SQL."""
+    if " then " in q:
+        return None
+    metric = parameters["metric"]
+    groupby = list(parameters["groupby"])
+    measures = [metric] + [m for m in _DEFAULT_MEASURES if m != metric]
+    olap = {"filters": parameters["filters"], "measures": measures, "group_by": groupby}
+
+    if operation == "pivot":
+        axis = re.search(r"\b(\w+?)s?\s+as\s+columns?\b", q)
+        pivot = _GROUPBY_WORDS.get(axis.group(1)) if axis else None
+        rows = [c for c in groupby if c != pivot]
+        if not pivot or pivot not in _PIVOT_VALUES or not rows or metric == "profit_margin":
+            return None
+        return {**olap, "measures": [metric], "group_by": rows, "pivot": pivot,
+                "pivot_values": _PIVOT_VALUES[pivot]}
+
+    if not groupby:
+        return None
+    if operation in ("slice_dice", "drill_down", "roll_up"):
+        return olap
+    if operation in ("yoy_growth", "mom_change"):
+        if metric == "profit_margin":
+            return None
+        compare = "yoy" if operation == "yoy_growth" else "mom"
+        olap = {**olap, "measures": [metric], "compare": compare}
+        if parameters["top_n"] or _matches(q, _RANKING_WORDS):
+            # "Top 5 countries by YoY growth" ranks on the growth, not the metric
+            return {**olap, "order_by": COMPARISONS[compare][2], "descending": _descending(q),
+                    "top_n": parameters["top_n"] or 5}
+        return olap
+    if operation == "ranking":
+        return {**olap, "order_by": metric, "descending": _descending(q),
+                "top_n": parameters["top_n"] or 5}
+    if operation == "profit_margin":
+        return {**olap, "measures": ["margin_pct", "revenue", "profit"], "order_by": "margin_pct"}
+    return None
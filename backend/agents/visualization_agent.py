@@ -1,11 +1,17 @@
 """
 Optional Agent 5 – Visualization Agent
 Selects appropriate chart types and builds Plotly figure configs.
+
+Common result shapes are charted deterministically by recommend_chart; the LLM
+is only asked when the shape is ambiguous.
 """
 from __future__ import annotations
-import pandas as pd
 import json
-from backend.agents.base import BaseAgent
+import re
+import pandas as pd
+from backend.agents.base import CONSOLIDATED, BaseAgent
+from backend.db import rollup
+from backend.db.result import as_frame
 
 SYSTEM_PROMPT = """You are the Visualization Agent for a BI platform.
 Given a dataset (columns + sample rows) and the analytical context,
@@ -33,6 +39,100 @@ RULES:
 """
 
 
+# Finest time level first: it becomes the x-axis, a coarser one the colour
+_TIME_COLUMNS = ["month_name", "month", "quarter", "year"]
+# parent → child levels of the non-time hierarchies (region → country, ...)
+_HIERARCHY_CHILD = {
+    h[i][0]: h[i + 1][0]
+    for h in rollup.HIERARCHIES[1:]
+    for i in range(len(h) - 1)
+}
+_HELPER_COLUMNS = {"rank", "month"}
+_SHARE_WORDS = re.compile(r"\b(share|proportion|percent of|mix|composition|split)\b", re.IGNORECASE)
+_MAX_COLORS = 8
+_MAX_VERTICAL_BARS = 12
+
+
+def recommend_chart(df: pd.DataFrame, operation: str = "", query: str = "") -> dict | None:
+    """Chart config decided from dtypes, cardinalities and the operation, or None if ambiguous."""
+    if df.empty:
+        return None
+    columns = list(df.columns)
+    num_cols = [c for c in df.select_dtypes(include="number").columns
+                if c not in _TIME_COLUMNS and c not in _HELPER_COLUMNS]
+    time_cols = [c for c in _TIME_COLUMNS if c in columns]
+    if "month_name" in time_cols and "month" in time_cols:
+        time_cols.remove("month")
+    cat_cols = [c for c in columns if c not in num_cols and c not in _TIME_COLUMNS and c not in _HELPER_COLUMNS]
+    if not num_cols:
+        return None
+    y_col = next((c for c in num_cols if "revenue" in c), num_cols[0])
+    cardinality = {c: df[c].nunique() for c in cat_cols + time_cols}
+
+    def config(chart_type, x_col, rationale, color_col=None, orientation="v", y=y_col,
+               title=None, **extra):
+        return {
+            "chart_type": chart_type,
+            "title": title or _title(y, x_col, color_col),
+            "x_col": x_col,
+            "y_col": y,
+            "color_col": color_col,
+            "orientation": orientation,
+            "rationale": rationale,
+            **extra,
+        }
+
+    # Pivot / cross-tab: one row label, several value columns
+    if operation == "pivot" or (len(num_cols) >= 3 and len(cat_cols + time_cols) == 1
+                                 and not any(c in rollup.MEASURES for c in num_cols)):
+        rows = (cat_cols + time_cols)[:1]
+        if rows:
+            return config("heatmap", rows[0], "Cross-tab values read best as a matrix",
+                          title=f"Cross-tab by {_label(rows[0])}", value_cols=num_cols)
+
+    if time_cols:
+        x_col = time_cols[0]
+        coarser = time_cols[1] if len(time_cols) > 1 else None
+        small = [c for c in cat_cols if cardinality[c] <= _MAX_COLORS]
+        if len(cat_cols) > 1 or (coarser and cat_cols) or (cat_cols and not small):
+            return None  # several series dimensions — let the LLM pick
+        color_col = coarser or (small[0] if small else None)
+        return config("line", x_col, "Time on the x-axis shows the trend", color_col)
+
+    if not cat_cols:
+        if len(num_cols) >= 2:
+            return config("scatter", num_cols[0], "Two numeric measures", y=num_cols[1])
+        return None
+
+    if len(cat_cols) == 2:
+        parent, child = cat_cols
+        if _HIERARCHY_CHILD.get(child) == parent:
+            parent, child = child, parent
+        if _HIERARCHY_CHILD.get(parent) == child:
+            return config("treemap", child, "Nested hierarchy levels", path=[parent, child])
+        low, high = sorted(cat_cols, key=cardinality.get)
+        if cardinality[low] > _MAX_COLORS:
+            return None
+        return config("bar", high, "Grouped categorical comparison", low)
+    if len(cat_cols) > 2:
+        return None
+
+    x_col = cat_cols[0]
+    if _SHARE_WORDS.search(query) and cardinality[x_col] <= _MAX_COLORS and (df[y_col] >= 0).all():
+        return config("pie", x_col, "Part-of-whole comparison")
+    horizontal = operation == "ranking" or cardinality[x_col] > _MAX_VERTICAL_BARS
+    return config("bar", x_col, "Categorical comparison", orientation="h" if horizontal else "v")
+
+
+def _title(y_col: str, x_col: str, color_col: str | None) -> str:
+    title = f"{_label(y_col)} by {_label(x_col)}"
+    return f"{title} and {_label(color_col)}" if color_col else title
+
+
+def _label(column: str) -> str:
+    return "Month" if column == "month_name" else column.replace("_", " ").title()
+
+
 class VisualizationAgent(BaseAgent):
     name = "Visualization Agent"
     description = "Selects optimal chart types and generates Plotly configurations."
@@ -41,29 +141,43 @@ class VisualizationAgent(BaseAgent):
         if not context or not context.get("data"):
             return {"agent": self.name, "config": None, "error": "No data provided"}
 
-        data = context["data"]
+        df = as_frame(context["data"])
+        config = recommend_chart(df, context.get("operation", ""), query)
+        if config or CONSOLIDATED:
+            return self._result(config or self._fallback_config(context.get("columns", []), df))
+        raw = self._call_llm(system=SYSTEM_PROMPT, user=self._request(query, context, df))
+        return self._response(raw, context, df)
+
+    async def arun(self, query: str, context: dict | None = None) -> dict:
+        if not context or not context.get("data"):
+            return {"agent": self.name, "config": None, "error": "No data provided"}
+
+        df = as_frame(context["data"])
+        config = recommend_chart(df, context.get("operation", ""), query)
+        if config or CONSOLIDATED:
+            return self._result(config or self._fallback_config(context.get("columns", []), df))
+        raw = await self._acall_llm(system=SYSTEM_PROMPT, user=self._request(query, context, df))
+        return self._response(raw, context, df)
+
+    def _request(self, query: str, context: dict, df: pd.DataFrame) -> str:
         columns = context.get("columns", [])
         operation = context.get("operation", "")
-
-        df = pd.DataFrame(data)
         sample = df.head(3).to_dict("records")
+        return (f"Operation: {operation}\nQuestion: {query}\n"
+                f"Columns: {columns}\nSample rows: {json.dumps(sample)}")
 
-        raw = self._call_llm(
-            system=SYSTEM_PROMPT,
-            user=f"Operation: {operation}\nQuestion: {query}\n"
-                 f"Columns: {columns}\nSample rows: {json.dumps(sample)}",
-        )
-
+    def _response(self, raw: str, context: dict, df: pd.DataFrame) -> dict:
         try:
-            import re
             raw = raw.strip()
             match = re.search(r"```(?:json)?\s*([\s\S]+?)```", raw, re.IGNORECASE)
             if match:
                 raw = match.group(1).strip()
             config = json.loads(raw)
         except Exception:
-            config = self._fallback_config(columns, df)
+            config = self._fallback_config(context.get("columns", []), df)
+        return self._result(config)
 
+    def _result(self, config: dict) -> dict:
         return {
             "agent": self.name,
             "config": config,
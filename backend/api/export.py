@@ -0,0 +1,97 @@
+"""
+Output formats for POST /sql.
+
+The format comes from the request's "format" field or, failing that, its
+Accept header. Non-JSON formats are encoded record batch by record batch so
+a streamed response never holds more than one batch in memory.
+"""
+from __future__ import annotations
+import json
+from typing import Iterator
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from backend.db.result import QueryResult
+
+# format → (media type, file extension)
+FORMATS = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+_ALIASES = {"application/x-parquet": "parquet", "application/jsonl": "ndjson", "application/jsonlines": "ndjson"}
+
+
+def negotiate(fmt: str | None, accept: str | None) -> str:
+    """Pick the output format; raises ValueError for an unsupported explicit format."""
+    if fmt:
+        if fmt.lower() not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+        return fmt.lower()
+    by_type = {media: name for name, (media, _) in FORMATS.items()} | _ALIASES
+    for part in (accept or "").split(","):
+        media = part.split(";")[0].strip().lower()
+        if media in by_type:
+            return by_type[media]
+    return "json"
+
+
+def encode(fmt: str, schema: pa.Schema, batches: Iterator[pa.RecordBatch]) -> Iterator[bytes]:
+    """Serialize record batches incrementally in a streaming format."""
+    if fmt == "ndjson":
+        for batch in batches:
+            rows = QueryResult(pa.Table.from_batches([batch])).to_records()
+            yield "".join(json.dumps(row, default=str) + "\n" for row in rows).encode("utf-8")
+        return
+
+    sink = _Sink()
+    if fmt == "csv":
+        writer = pa_csv.CSVWriter(sink, schema)
+    elif fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+    elif fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        raise ValueError(f"Format '{fmt}' cannot be streamed")
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+class _Sink:
+    """Write-only file object whose contents are handed off as they are produced."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet footers record absolute offsets, so report bytes written so far
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
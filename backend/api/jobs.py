@@ -0,0 +1,130 @@
+"""
+Background job queue for long-running queries (POST /jobs, GET /jobs/{id}).
+
+Submitting a job returns its id at once; a fixed pool of worker tasks runs
+queued jobs through the planner and records partial results (plan, each
+stage's data, anomalies, chart, report) as the stages finish. When the queue
+is full, submit raises asyncio.QueueFull and the API answers 429, so bursts are
+smoothed instead of piling up open connections.
+
+Configuration (environment):
+  OLAP_JOB_WORKERS     jobs run concurrently per API process (default 4)
+  OLAP_JOB_QUEUE_SIZE  max jobs waiting for a worker (default 64)
+  OLAP_JOB_TTL         seconds a finished job stays available (default 3600)
+"""
+from __future__ import annotations
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+from backend import telemetry
+
+# (job, emit) -> planner result
+Runner = Callable[[dict, Callable[[tuple[str, Any]], None]], Awaitable[dict]]
+
+
+class JobQueue:
+    """Bounded queue of query jobs drained by a fixed number of asyncio workers."""
+
+    def __init__(self, run: Runner, workers: int = 4, max_queued: int = 64, ttl: float = 3600):
+        self._run = run
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.ttl = ttl
+        self._jobs: dict[str, dict] = {}
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def submit(self, query: str, provider: str, history: list[dict]) -> dict:
+        """Queue a job; raises asyncio.QueueFull when the queue is saturated."""
+        self._ensure_workers()
+        self._expire()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "query": query,
+            "provider": provider,
+            "history": history,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "partial": {},
+            "result": None,
+            "error": None,
+        }
+        self._queue.put_nowait(job)
+        self._jobs[job["id"]] = job
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "queued": self._queue.qsize() if self._queue else 0,
+            **{s: statuses.count(s) for s in ("running", "done", "failed")},
+        }
+
+    def _ensure_workers(self):
+        # Workers live on the event loop serving the API
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            job["status"], job["started_at"] = "running", time.time()
+            try:
+                with telemetry.in_flight("jobs_running"):
+                    job["result"] = await self._run(job, lambda event: _record(job, event))
+                job["status"], job["error"] = "done", job["result"].get("error")
+            except Exception as e:
+                job["status"], job["error"] = "failed", str(e)
+            finally:
+                job["finished_at"] = time.time()
+                telemetry.observe("job_latency_ms", (job["finished_at"] - job["created_at"]) * 1000,
+                                  status=job["status"])
+                self._queue.task_done()
+
+
+def _record(job: dict, event: tuple[str, Any]):
+    """Fold a planner stream event into the job's partial results."""
+    name, payload = event
+    partial = job["partial"]
+    if name == "data":
+        partial.setdefault("data", {})[payload["agent"]] = payload
+    elif name == "error":
+        partial.setdefault("errors", []).append(payload)
+    elif name != "report_token":
+        partial[name] = payload
+
+
+def view(job: dict) -> dict:
+    """Public view of a job (everything but the conversation history)."""
+    return {k: v for k, v in job.items() if k != "history"}
+
+
+def from_env(run: Runner) -> JobQueue:
+    return JobQueue(
+        run,
+        workers=int(os.getenv("OLAP_JOB_WORKERS", "4")),
+        max_queued=int(os.getenv("OLAP_JOB_QUEUE_SIZE", "64")),
+        ttl=float(os.getenv("OLAP_JOB_TTL", "3600")),
+    )
@@ -2,13 +2,26 @@
 FastAPI backend – exposes OLAP multi-agent endpoints.
 """
 from __future__ import annotations
+import asyncio
+import json
 import os
+import time
 from typing import Any
-from fastapi import FastAPI, HTTPException
+import pyarrow as pa
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from backend import telemetry
+from backend.agents import router
+from backend.agents.context import get_prompt_stats
+from backend.agents.llm_cache import get_llm_cache, normalize_prompt
+from backend.agents.llm_clients import PROVIDERS
 from backend.agents.planner import Planner
+from backend.api import export, jobs
 from backend.db import database as db
+from backend.db import cursors, result_cache, rollup
+from backend.db.result import QueryResult, to_jsonable
 
 app = FastAPI(
     title="OLAP BI Platform API",
@@ -24,6 +37,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    """Request count and latency per endpoint (route template, not raw path)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        labels = {"method": request.method, "endpoint": getattr(route, "path", "unmatched")}
+        telemetry.observe("http_request_latency_ms", (time.perf_counter() - start) * 1000, **labels)
+        telemetry.inc("http_requests_total", status=status, **labels)
+
+
+# The replay provider answers from local fixtures; it is for load tests only
+_REPLAY_API = os.getenv("OLAP_REPLAY_API", "0") == "1"
+
 # Lazy planner cache per provider
 _planners: dict[str, Planner] = {}
 
@@ -52,19 +85,103 @@ class QueryResponse(BaseModel):
     anomalies: list[dict]
     agent_results: dict
     error: str | None
+    llm_calls: dict | None = None
+    timings: dict | None = None
+    coalesced: bool = False
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    query: str
+    provider: str
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    partial: dict
+    result: QueryResponse | None
+    error: str | None
 
 
 class SQLRequest(BaseModel):
-    sql: str
+    sql: str = ""
+    format: str | None = None          # json | ndjson | csv | arrow | parquet (else Accept header)
+    limit: int | None = None           # row cap for the statement (default OLAP_SQL_ROW_LIMIT)
+    page_size: int | None = None       # rows per JSON page (default OLAP_SQL_PAGE_SIZE)
+    page_token: str | None = None      # next_page_token from the previous JSON page
 
 
 # ── Endpoints ────────────────────────────────────────────────────────────────
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok", "message": "OLAP BI Platform is running"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics: request, LLM, agent and DuckDB latency histograms, row
+    and token counts, rate-limit retries, cache / router / rollup hit ratios,
+    cursor pool usage and in-flight planner executions.
+    """
+    return PlainTextResponse(
+        telemetry.render_prometheus(_component_samples()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def _component_samples() -> list[tuple[str, str, dict, float]]:
+    samples = []
+    cache = get_llm_cache()
+    if cache is not None:
+        stats = cache.stats()
+        for key in ("hits", "disk_hits", "misses", "stores", "evictions"):
+            samples.append((f"llm_cache_{key}_total", "counter", {}, stats[key]))
+        samples += [("llm_cache_hit_ratio", "gauge", {}, stats["hit_ratio"]),
+                    ("llm_cache_entries", "gauge", {}, stats["entries"]),
+                    ("llm_cache_bytes", "gauge", {}, stats["bytes"])]
+
+    results = result_cache.get_result_cache()
+    if results is not None:
+        stats = results.stats()
+        for key in ("hits", "misses", "stores", "evictions"):
+            samples.append((f"db_result_cache_{key}_total", "counter", {}, stats[key]))
+        samples += [("db_result_cache_hit_ratio", "gauge", {}, stats["hit_ratio"]),
+                    ("db_result_cache_bytes", "gauge", {}, stats["bytes"]),
+                    ("db_data_version", "gauge", {}, stats["version"])]
+
+    queue = _jobs.stats()
+    samples += [("jobs_queued", "gauge", {}, queue["queued"]),
+                ("jobs_queue_capacity", "gauge", {}, queue["max_queued"]),
+                ("jobs_workers", "gauge", {}, queue["workers"])]
+
+    open_cursors = cursors.get_cursor_stats()
+    samples += [("sql_cursors_open", "gauge", {}, open_cursors["open"])]
+
+    routed = router.get_stats()
+    samples += [("planner_routed_total", "counter", {"routed_by": "rules"}, routed["fast_path"]),
+                ("planner_routed_total", "counter", {"routed_by": "llm"}, routed["llm"]),
+                ("planner_router_hit_ratio", "gauge", {}, routed["hit_rate"])]
+
+    rewrites = rollup.get_stats()
+    total = rewrites["rewritten"] + rewrites["skipped"]
+    samples += [("rollup_queries_total", "counter", {"rewritten": "true"}, rewrites["rewritten"]),
+                ("rollup_queries_total", "counter", {"rewritten": "false"}, rewrites["skipped"]),
+                ("rollup_hit_ratio", "gauge", {}, round(rewrites["rewritten"] / total, 4) if total else 0.0)]
+
+    pool = db.get_pool_stats()
+    samples += [("db_pool_in_use", "gauge", {}, pool["in_use"]),
+                ("db_pool_size", "gauge", {}, pool["size"]),
+                ("db_pool_waits_total", "counter", {}, pool["waits"]),
+                ("db_pool_timeouts_total", "counter", {}, pool["timeouts"])]
+
+    for agent, stats in get_prompt_stats().items():
+        samples += [("llm_requests_total", "counter", {"agent": agent}, stats["calls"]),
+                    ("llm_prompt_tokens_total", "counter", {"agent": agent}, stats["tokens"])]
+    return samples
+
+
 @app.get("/schema")
 def get_schema():
     """Return database schema information."""
@@ -109,22 +226,15 @@ def get_overview():
 
 
 @app.post("/query", response_model=QueryResponse)
-def run_query(req: QueryRequest):
+async def run_query(req: QueryRequest):
     """Main endpoint: run a natural language OLAP query."""
-    if not req.query.strip():
-        raise HTTPException(status_code=400, detail="Query cannot be empty")
-
-    provider = req.provider.lower()
-    api_key_env = "ANTHROPIC_API_KEY" if provider == "anthropic" else "OPENAI_API_KEY"
-    if not os.getenv(api_key_env):
-        raise HTTPException(
-            status_code=400,
-            detail=f"{api_key_env} not set. Add it to your .env file.",
-        )
+    provider = _check_query(req)
+    result, coalesced = await _execute_once(provider, req.query, req.history)
+    return _query_response(result, coalesced)
 
-    planner = _get_planner(provider)
-    result = planner.execute(req.query, history=req.history)
 
+def _query_response(result: dict, coalesced: bool = False) -> QueryResponse:
+    result = to_jsonable(result)
     return QueryResponse(
         query=result["query"],
         plan=result["plan"],
@@ -135,25 +245,192 @@ def run_query(req: QueryRequest):
         anomalies=result.get("anomalies", []),
         agent_results=result["agent_results"],
         error=result.get("error"),
+        llm_calls=result.get("llm_calls"),
+        timings=result.get("timings"),
+        coalesced=coalesced,
+    )
+
+
+# Planner runs in flight in this worker, keyed by (provider, query, history)
+_inflight: dict[tuple, asyncio.Task] = {}
+
+
+async def _execute_once(provider: str, query: str, history: list[dict]) -> tuple[dict, bool]:
+    """
+    Single-flight Planner.aexecute: concurrent identical requests await the run
+    already in flight instead of starting their own. Returns (result, coalesced).
+    """
+    key = (provider, normalize_prompt(query), _history_key(history))
+    task = _inflight.get(key)
+    coalesced = task is not None
+    if task is None:
+        task = asyncio.create_task(_get_planner(provider).aexecute(query, history=history))
+        _inflight[key] = task
+
+        def forget(done: asyncio.Task):
+            if _inflight.get(key) is done:
+                del _inflight[key]
+
+        task.add_done_callback(forget)
+    telemetry.inc("query_requests_coalesced_total" if coalesced else "query_executions_total")
+    # A disconnecting client must not cancel the run other requests are waiting on
+    return await asyncio.shield(task), coalesced
+
+
+def _history_key(history: list[dict]) -> str:
+    return json.dumps(
+        [{k: normalize_prompt(str(v)) for k, v in sorted(turn.items())} for turn in history or []]
     )
 
 
+@app.post("/query/stream")
+async def stream_query(req: QueryRequest):
+    """
+    Run a natural language OLAP query and stream progress as Server-Sent Events.
+
+    Events: plan, data, anomalies, viz, report_token (report text as the LLM
+    writes it), report, error, done. Each data line is a JSON payload.
+    """
+    planner = _get_planner(_check_query(req))
+
+    async def events():
+        try:
+            async for event, payload in planner.astream(req.query, history=req.history):
+                yield _sse(event, payload)
+        except Exception as e:
+            yield _sse("error", {"agent": "planner", "error": str(e)})
+            yield _sse("done", {"error": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Background jobs: queued queries drained by a bounded worker pool
+_jobs = jobs.from_env(
+    lambda job, emit: _get_planner(job["provider"]).aexecute(job["query"], history=job["history"], emit=emit)
+)
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(req: QueryRequest):
+    """Queue a natural language OLAP query; poll GET /jobs/{id} for progress and the result."""
+    provider = _check_query(req)
+    try:
+        job = _jobs.submit(req.query, provider, req.history)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later",
+                            headers={"Retry-After": "5"})
+    return {"id": job["id"], "status": job["status"]}
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Status, partial results (plan and each finished stage) and, once done, the full result."""
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    view = to_jsonable(jobs.view(job))
+    view["result"] = _query_response(job["result"]) if job["result"] else None
+    return JobResponse(**view)
+
+
+def _check_query(req: QueryRequest) -> str:
+    """Validate a query request and return its provider."""
+    if not req.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+
+    provider = req.provider.lower()
+    if provider not in PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {req.provider}")
+    if provider == "replay":
+        # Record mode forwards prompts upstream on the server's own credentials
+        if not _REPLAY_API or os.getenv("OLAP_REPLAY_MODE", "replay").lower() != "replay":
+            raise HTTPException(status_code=400, detail="The replay provider is not enabled on this server")
+    api_key_env = PROVIDERS[provider][1]
+    if api_key_env and not os.getenv(api_key_env):
+        raise HTTPException(
+            status_code=400,
+            detail=f"{api_key_env} not set. Add it to your .env file.",
+        )
+    return provider
+
+
+def _sse(event: str, payload: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(to_jsonable(payload), default=str)}\n\n"
+
+
 @app.post("/sql")
-def run_sql(req: SQLRequest):
-    """Execute raw SQL (for power users / debugging)."""
+def run_sql(req: SQLRequest, accept: str | None = Header(default=None)):
+    """
+    Execute raw SQL (for power users / debugging).
+
+    JSON answers one page at a time from a server-side cursor; pass
+    next_page_token back as page_token for the next page. NDJSON, CSV, Arrow
+    IPC stream and Parquet are streamed from DuckDB record batches. Every
+    statement is capped at `limit` rows (default OLAP_SQL_ROW_LIMIT).
+    """
     try:
-        df = db.query(req.sql)
-        return {
-            "data": df.to_dict("records"),
-            "columns": list(df.columns),
-            "row_count": len(df),
-        }
+        fmt = export.negotiate(req.format, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+    if req.page_token:
+        cursor = cursors.take(req.page_token)
+        if cursor is None:
+            raise HTTPException(status_code=410, detail="Page token is unknown or expired")
+    elif not req.sql.strip():
+        raise HTTPException(status_code=400, detail="SQL cannot be empty")
+    else:
+        try:
+            cursor = cursors.ServerCursor(req.sql, limit=req.limit or cursors.ROW_LIMIT)
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if fmt == "json":
+        return _sql_page(cursor, req.page_size or cursors.PAGE_SIZE)
+
+    def body():
+        try:
+            yield from export.encode(fmt, cursor.schema, cursor.batches())
+        finally:
+            cursor.close()
+
+    media_type, extension = export.FORMATS[fmt]
+    return StreamingResponse(body(), media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="result.{extension}"',
+        "X-Row-Limit": str(cursor.remaining),
+    })
+
+
+def _sql_page(cursor: cursors.ServerCursor, page_size: int) -> dict:
+    try:
+        batches = list(cursor.batches(min(max(1, page_size), cursors.MAX_PAGE_SIZE)))
+        result = QueryResult(pa.Table.from_batches(batches, schema=cursor.schema))
+        more, truncated = cursor.has_more(), cursor.truncated
     except Exception as e:
+        cursor.close()
         raise HTTPException(status_code=400, detail=str(e))
+    if more:
+        token = cursors.register(cursor)
+    else:
+        token = None
+        cursor.close()
+    return {
+        "data": result.to_records(),
+        "columns": result.columns,
+        "row_count": result.num_rows,
+        "next_page_token": token,
+        "truncated": truncated,
+    }
 
 
 @app.get("/examples")
-def get_example_queries():
+async def get_example_queries():
     """Return example queries organized by OLAP operation."""
     return {
         "examples": [
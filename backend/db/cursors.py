@@ -0,0 +1,132 @@
+"""
+Server-side cursors for raw SQL results (POST /sql).
+
+A ServerCursor keeps a DuckDB result open and hands out rows batch by batch
+from its Arrow record batch reader, so large results are paged or streamed
+without ever being materialized. Every statement is capped at a row limit
+(OLAP_SQL_ROW_LIMIT unless the client asks for another one).
+
+Each open cursor is checked out of the DuckDB cursor pool, so streamed and
+paged results count against OLAP_DB_POOL_SIZE like any other query.
+
+Cursors that still have rows after a JSON page are registered under an opaque
+page token. Each page issues a fresh token; idle cursors expire after
+OLAP_SQL_CURSOR_TTL seconds and at most OLAP_SQL_MAX_CURSORS stay open (the
+least recently used one is closed first), and never so many that parked pages
+hold every pooled cursor.
+
+Configuration (environment):
+  OLAP_SQL_ROW_LIMIT     default max rows per statement (default 100000)
+  OLAP_SQL_PAGE_SIZE     default rows per JSON page (default 1000)
+  OLAP_SQL_CURSOR_TTL    idle seconds before a paged cursor is closed (default 300)
+  OLAP_SQL_MAX_CURSORS   max open paged cursors per process (default 32)
+"""
+from __future__ import annotations
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator
+import pyarrow as pa
+from backend.db import database as db
+
+ROW_LIMIT = int(os.getenv("OLAP_SQL_ROW_LIMIT", "100000"))
+PAGE_SIZE = int(os.getenv("OLAP_SQL_PAGE_SIZE", "1000"))
+MAX_PAGE_SIZE = 10_000
+CURSOR_TTL = float(os.getenv("OLAP_SQL_CURSOR_TTL", "300"))
+MAX_CURSORS = int(os.getenv("OLAP_SQL_MAX_CURSORS", "32"))
+BATCH_ROWS = 10_000
+
+
+class ServerCursor:
+    """Open query result consumed in record batches, bounded by a row limit."""
+
+    def __init__(self, sql: str, limit: int = ROW_LIMIT):
+        self.cursor, self.reader = db.open_reader(sql, batch_rows=BATCH_ROWS)
+        self.schema = self.reader.schema
+        self.remaining = max(0, limit)
+        self.touched = time.monotonic()
+        self._pending: pa.RecordBatch | None = None
+        self._exhausted = False
+
+    def batches(self, max_rows: int | None = None) -> Iterator[pa.RecordBatch]:
+        """Yield the next max_rows rows (all rows up to the limit if None)."""
+        want = self.remaining if max_rows is None else min(max_rows, self.remaining)
+        while want > 0 and self._peek():
+            batch, self._pending = self._pending, None
+            if batch.num_rows > want:
+                batch, self._pending = batch.slice(0, want), batch.slice(want)
+            want -= batch.num_rows
+            self.remaining -= batch.num_rows
+            yield batch
+
+    def has_more(self) -> bool:
+        return self.remaining > 0 and self._peek()
+
+    @property
+    def truncated(self) -> bool:
+        """True once the row limit cut off rows the query still had."""
+        return self.remaining <= 0 and self._peek()
+
+    def close(self):
+        cursor, self.cursor = self.cursor, None
+        db.close_reader(cursor)
+
+    def _peek(self) -> bool:
+        while self._pending is None and not self._exhausted:
+            try:
+                batch = self.reader.read_next_batch()
+            except StopIteration:
+                self._exhausted = True
+                break
+            if batch.num_rows:
+                self._pending = batch
+        return self._pending is not None
+
+
+_cursors: OrderedDict[str, ServerCursor] = OrderedDict()
+_cursors_lock = threading.Lock()
+
+
+def register(cursor: ServerCursor) -> str:
+    """Park a cursor for its next page; returns the page token."""
+    token = secrets.token_urlsafe(16)
+    cursor.touched = time.monotonic()
+    with _cursors_lock:
+        _cursors[token] = cursor
+        closing = _expired_locked()
+        while len(_cursors) > _max_parked():
+            closing.append(_cursors.popitem(last=False)[1])
+    for stale in closing:
+        stale.close()
+    return token
+
+
+def take(token: str) -> ServerCursor | None:
+    """Claim the cursor behind a page token (tokens are single use)."""
+    with _cursors_lock:
+        cursor = _cursors.pop(token, None)
+        closing = _expired_locked()
+    for stale in closing:
+        stale.close()
+    if cursor is not None and time.monotonic() - cursor.touched > CURSOR_TTL:
+        cursor.close()
+        return None
+    return cursor
+
+
+def _max_parked() -> int:
+    # Leave at least one pooled cursor for queries that are not parked
+    return min(MAX_CURSORS, max(1, db.get_pool().size - 1))
+
+
+def _expired_locked() -> list[ServerCursor]:
+    cutoff = time.monotonic() - CURSOR_TTL
+    expired = [token for token, cursor in _cursors.items() if cursor.touched < cutoff]
+    return [_cursors.pop(token) for token in expired]
+
+
+def get_cursor_stats() -> dict:
+    with _cursors_lock:
+        return {"open": len(_cursors), "max": _max_parked()}
@@ -1,115 +1,497 @@
 """
-Database module: loads CSV into DuckDB in-memory star schema.
+Database module: loads CSV into DuckDB star schema.
 Provides a connection and helper query functions.
+
+By default the schema is built in memory on first use. Set OLAP_DB_PATH to a
+file path to enable persistent mode: the star schema is built once into that
+DuckDB file together with a fingerprint of the source CSV, and later starts
+attach it read-only as long as the fingerprint and schema version still match.
+
+query / query_arrow results are cached (see result_cache) until the data
+version bumps on the next schema load or write statement. Writes that touch
+fact_sales also rebuild the rollup cube, so rewritten queries keep matching
+the fact table; while a rebuild fails, rewriting is switched off.
 """
+import hashlib
+import json
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 import duckdb
 import pandas as pd
+import pyarrow as pa
+from backend import telemetry
+from backend.db import result_cache, rollup
+from backend.db.olap import OlapQuery, compile_query
+from backend.db.result import QueryResult
 
 _conn = None
-_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "global_retail_sales.csv")
+_pool = None
+_init_lock = threading.Lock()
+_CSV_PATH = os.getenv("OLAP_CSV_PATH") or os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "global_retail_sales.csv"
+)
+_PARQUET_PATH = os.getenv("OLAP_FACT_PARQUET")
+_ROLLUP_ENABLED = os.getenv("OLAP_ROLLUP", "1") != "0"
+_rollup_failed = False
+_rollup_lock = threading.Lock()
+
+FACT_COLUMNS = [
+    "order_id", "order_date", "year", "quarter", "month", "month_name",
+    "region", "country", "category", "subcategory", "customer_segment",
+    "quantity", "unit_price", "revenue", "cost", "profit", "profit_margin",
+]
+
+# Bump whenever _init_schema changes so stale database files are rebuilt
+SCHEMA_VERSION = 2
 
 
 def get_connection() -> duckdb.DuckDBPyConnection:
     global _conn
     if _conn is None:
-        _conn = duckdb.connect(database=":memory:")
-        _init_schema(_conn)
+        with _init_lock:
+            if _conn is None:
+                db_path = os.getenv("OLAP_DB_PATH")
+                if db_path:
+                    _conn = _open_persistent(os.path.abspath(db_path))
+                else:
+                    conn = duckdb.connect(database=":memory:")
+                    _init_schema(conn)
+                    _conn = conn
+                bump_data_version()
     return _conn
 
 
-def _init_schema(conn: duckdb.DuckDBPyConnection):
-    """Load CSV and build star schema."""
-    csv_path = os.path.abspath(_CSV_PATH)
+def bump_data_version():
+    """Invalidate cached query results after the underlying data changed."""
+    cache = result_cache.get_result_cache()
+    if cache is not None:
+        cache.bump_version()
+
+
+class CursorPool:
+    """
+    Bounded pool of DuckDB cursors (child connections of the shared database).
+
+    Each checkout gets its own cursor, so concurrent requests execute in
+    parallel instead of racing on the single root connection. Cursors are
+    created lazily up to `size`; when all are in use, callers wait up to
+    `timeout` seconds before a TimeoutError is raised.
+    """
+
+    def __init__(self, conn: duckdb.DuckDBPyConnection, size: int = 8, timeout: float = 30.0):
+        self._conn = conn
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    def _acquire(self) -> duckdb.DuckDBPyConnection:
+        with self._lock:
+            try:
+                cur = self._idle.get_nowait()
+            except queue.Empty:
+                cur = None
+                if self._created < self.size:
+                    self._created += 1
+                    cur = self._conn.cursor()
+            if cur is not None:
+                self._in_use += 1
+                self._stats["checkouts"] += 1
+                return cur
+            self._stats["waits"] += 1
+
+        start = time.perf_counter()
+        try:
+            cur = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise TimeoutError(
+                f"No DuckDB cursor available within {self.timeout}s (pool size {self.size})"
+            )
+        waited_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_ms"] += waited_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+        return cur
+
+    def _release(self, cur: duckdb.DuckDBPyConnection):
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(cur)
+
+    @contextmanager
+    def cursor(self):
+        cur = self._acquire()
+        try:
+            yield cur
+        finally:
+            self._release(cur)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._created - self._in_use,
+                **{k: round(v, 2) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
+
+
+def get_pool() -> CursorPool:
+    """Return the process-wide cursor pool (OLAP_DB_POOL_SIZE / OLAP_DB_POOL_TIMEOUT)."""
+    global _pool
+    if _pool is None:
+        conn = get_connection()
+        with _init_lock:
+            if _pool is None:
+                _pool = CursorPool(
+                    conn,
+                    size=int(os.getenv("OLAP_DB_POOL_SIZE", "8")),
+                    timeout=float(os.getenv("OLAP_DB_POOL_TIMEOUT", "30")),
+                )
+    return _pool
+
+
+def get_pool_stats() -> dict:
+    """Checkout / wait / timeout counters of the cursor pool."""
+    return get_pool().stats()
+
+
+def _csv_fingerprint(csv_path: str) -> dict:
+    """Size, mtime and content hash of the source CSV."""
+    st = os.stat(csv_path)
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+        "schema_version": SCHEMA_VERSION,
+    }
 
-    # Load raw data
+
+def _read_fingerprint(db_path: str) -> dict | None:
+    """Return the fingerprint stored in an existing database file, if any."""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = duckdb.connect(database=db_path, read_only=True)
+        try:
+            row = conn.execute("SELECT fingerprint FROM _olap_meta").fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+    except Exception:
+        return None
+
+
+def _parquet_fingerprint(path: str) -> dict:
+    """Relative path, size and mtime of every Parquet file of the fact dataset."""
+    files = [path] if os.path.isfile(path) else sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(path) for name in names if name.endswith(".parquet")
+    )
+    return {
+        "files": [[os.path.relpath(f, path), os.stat(f).st_size, os.stat(f).st_mtime_ns] for f in files],
+        "schema_version": SCHEMA_VERSION,
+    }
+
+
+def _source_fingerprint(source: str) -> dict:
+    fingerprint = _parquet_fingerprint(source) if _PARQUET_PATH else _csv_fingerprint(source)
+    return {**fingerprint, "rollup": _ROLLUP_ENABLED}
+
+
+def _fingerprint_matches(stored: dict | None, source: str) -> bool:
+    if not stored or stored.get("schema_version") != SCHEMA_VERSION:
+        return False
+    # Files built with OLAP_ROLLUP=0 have no cube (and vice versa)
+    if stored.get("rollup", True) != _ROLLUP_ENABLED:
+        return False
+    if _PARQUET_PATH:
+        return stored.get("files") == _parquet_fingerprint(source)["files"]
+    st = os.stat(source)
+    if stored.get("size") != st.st_size:
+        return False
+    if stored.get("mtime_ns") == st.st_mtime_ns:
+        return True
+    # mtime changed (e.g. fresh checkout) — fall back to the content hash
+    return stored.get("sha256") == _csv_fingerprint(source)["sha256"]
+
+
+def _open_persistent(db_path: str) -> duckdb.DuckDBPyConnection:
+    """Open the on-disk star schema read-only, (re)building it if stale."""
+    source = os.path.abspath(_PARQUET_PATH or _CSV_PATH)
+    if _fingerprint_matches(_read_fingerprint(db_path), source):
+        print(f"[DB] Reusing persistent star schema at {db_path} ✓")
+        return duckdb.connect(database=db_path, read_only=True)
+
+    print(f"[DB] Building persistent star schema at {db_path}")
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = duckdb.connect(database=tmp_path)
+    try:
+        _init_schema(conn)
+        conn.execute("CREATE TABLE _olap_meta (fingerprint VARCHAR)")
+        conn.execute("INSERT INTO _olap_meta VALUES (?)", [json.dumps(_source_fingerprint(source))])
+        conn.execute("CHECKPOINT")
+    finally:
+        conn.close()
+    # Atomic swap so concurrently starting workers never see a half-built file
+    os.replace(tmp_path, db_path)
+    return duckdb.connect(database=db_path, read_only=True)
+
+
+def _load_csv(conn: duckdb.DuckDBPyConnection, csv_path: str):
+    """Ingest the CSV into an in-memory fact_sales table."""
+    conn.execute(f"""
+        CREATE TABLE fact_sales AS
+        SELECT {", ".join(FACT_COLUMNS)}
+        FROM read_csv_auto('{csv_path}')
+    """)
+
+
+def _attach_parquet(conn: duckdb.DuckDBPyConnection, path: str):
+    """
+    Expose a Parquet file or hive-partitioned directory as the fact_sales view.
+    DuckDB prunes partition directories on filters over partition columns and
+    skips row groups by min/max statistics (files are written in date order).
+    """
+    files = path if os.path.isfile(path) else os.path.join(path, "**", "*.parquet")
     conn.execute(f"""
-        CREATE TABLE raw_sales AS
-        SELECT * FROM read_csv_auto('{csv_path}')
+        CREATE VIEW fact_sales AS
+        SELECT {", ".join(FACT_COLUMNS)}
+        FROM read_parquet('{files}', hive_partitioning = true, union_by_name = true)
     """)
+    print(f"[DB] fact_sales → Parquet view over {files}")
+
+
+def _init_schema(conn: duckdb.DuckDBPyConnection):
+    """Load the fact data (CSV table or Parquet view) and build the star schema."""
+    if _PARQUET_PATH:
+        _attach_parquet(conn, os.path.abspath(_PARQUET_PATH))
+        # Dimensions stay lazy too: no scan until one is queried
+        dim_kind = "VIEW"
+    else:
+        _load_csv(conn, os.path.abspath(_CSV_PATH))
+        dim_kind = "TABLE"
 
     # ── Dimension tables ────────────────────────────────────────────────────
-    conn.execute("""
-        CREATE TABLE dim_date AS
+    conn.execute(f"""
+        CREATE {dim_kind} dim_date AS
         SELECT DISTINCT
             order_date,
             year,
             quarter,
             month,
             month_name
-        FROM raw_sales
+        FROM fact_sales
         ORDER BY order_date
     """)
 
-    conn.execute("""
-        CREATE TABLE dim_geography AS
+    conn.execute(f"""
+        CREATE {dim_kind} dim_geography AS
         SELECT DISTINCT
             region,
             country
-        FROM raw_sales
+        FROM fact_sales
         ORDER BY region, country
     """)
 
-    conn.execute("""
-        CREATE TABLE dim_product AS
+    conn.execute(f"""
+        CREATE {dim_kind} dim_product AS
         SELECT DISTINCT
             category,
             subcategory
-        FROM raw_sales
+        FROM fact_sales
         ORDER BY category, subcategory
     """)
 
-    conn.execute("""
-        CREATE TABLE dim_customer AS
+    conn.execute(f"""
+        CREATE {dim_kind} dim_customer AS
         SELECT DISTINCT
             customer_segment
-        FROM raw_sales
+        FROM fact_sales
         ORDER BY customer_segment
     """)
 
-    # ── Fact table ──────────────────────────────────────────────────────────
-    conn.execute("""
-        CREATE TABLE fact_sales AS
-        SELECT
-            order_id,
-            order_date,
-            year,
-            quarter,
-            month,
-            month_name,
-            region,
-            country,
-            category,
-            subcategory,
-            customer_segment,
-            quantity,
-            unit_price,
-            revenue,
-            cost,
-            profit,
-            profit_margin
-        FROM raw_sales
-    """)
-
-    conn.execute("DROP TABLE raw_sales")
+    # ── Rollup cube (only used when rewriting is enabled) ───────────────────
+    if _ROLLUP_ENABLED:
+        conn.execute(rollup.build_sql())
 
     print("[DB] Star schema initialized ✓")
     print(f"[DB] fact_sales rows: {conn.execute('SELECT COUNT(*) FROM fact_sales').fetchone()[0]:,}")
+    if _ROLLUP_ENABLED:
+        print(f"[DB] {rollup.ROLLUP_TABLE} cells: "
+              f"{conn.execute(f'SELECT COUNT(*) FROM {rollup.ROLLUP_TABLE}').fetchone()[0]:,}")
+
+
+def _rollup_active() -> bool:
+    return _ROLLUP_ENABLED and not _rollup_failed
+
+
+def _route(sql: str) -> str:
+    """Redirect eligible aggregate queries to the rollup cube."""
+    if not _rollup_active():
+        return sql
+    return rollup.rewrite(sql) or sql
+
+
+def _after_write(sql: str):
+    """A statement changed the data: drop cached results and refresh the cube."""
+    bump_data_version()
+    normalized = result_cache.normalize_sql(sql)
+    if _ROLLUP_ENABLED and ("fact_sales" in normalized or rollup.ROLLUP_TABLE in normalized):
+        _refresh_rollup()
+
 
+def _refresh_rollup():
+    """Rebuild the rollup cube from fact_sales; rewriting is off while that fails."""
+    global _rollup_failed
+    with _rollup_lock:
+        try:
+            with get_pool().cursor() as cur:
+                cur.execute(rollup.build_sql(replace=True))
+            _rollup_failed = False
+        except duckdb.Error as e:
+            _rollup_failed = True
+            print(f"[DB] Could not rebuild {rollup.ROLLUP_TABLE}, rollup rewriting disabled: {e}")
 
-def query(sql: str) -> pd.DataFrame:
-    """Execute a SQL query and return a DataFrame."""
-    conn = get_connection()
-    return conn.execute(sql).df()
+
+def query(sql: str, params: list | None = None) -> pd.DataFrame:
+    """Execute a SQL query on a pooled cursor and return a DataFrame."""
+    return _execute("df", sql, params, lambda cur, routed: cur.execute(routed, params).df())
+
+
+def query_arrow(sql: str, params: list | None = None) -> QueryResult:
+    """Execute a SQL query and return a columnar (Arrow-backed) result."""
+    def fetch(cur, routed):
+        res = cur.execute(routed, params)
+        # to_arrow_table() replaces fetch_arrow_table(), deprecated in newer DuckDB
+        return QueryResult((getattr(res, "to_arrow_table", None) or res.fetch_arrow_table)())
+
+    return _execute("arrow", sql, params, fetch)
+
+
+def _execute(kind: str, sql: str, params: list | None, fetch):
+    """Serve a query from the result cache or run it (rollup-routed) and cache the result."""
+    cache = result_cache.get_result_cache()
+    key = cache.key(kind, sql, params) if cache is not None else None
+    with telemetry.span("sql") as span:
+        if key is not None:
+            hit = cache.get(key)
+            result = hit and _relabel(hit[0], hit[1], sql, params)
+            if result is not None:
+                span.update(rows=len(result), cached=True)
+                return result
+
+        with get_pool().cursor() as cur:
+            routed = _route(sql)
+            result = fetch(cur, routed)
+        span.update(rows=len(result), rollup=routed is not sql)
+        if key is not None:
+            cache.set(key, result, _exact(sql))
+        elif not result_cache.is_read_only(result_cache.normalize_sql(sql)):
+            _after_write(sql)
+        return result
+
+
+def open_reader(sql: str, params: list | None = None,
+                batch_rows: int = 10_000) -> tuple[duckdb.DuckDBPyConnection | None, pa.RecordBatchReader]:
+    """
+    Run a query on a pooled cursor and return it with an Arrow record batch
+    reader, so arbitrarily large results are consumed batch by batch. The
+    cursor stays checked out of the pool until the caller hands it back with
+    close_reader(), so open readers count against OLAP_DB_POOL_SIZE.
+    """
+    pool = get_pool()
+    cur = pool._acquire()
+    try:
+        with telemetry.span("sql", streamed=True) as span:
+            routed = _route(sql)
+            res = cur.execute(routed, params)
+            span["rollup"] = routed is not sql
+        if not result_cache.is_read_only(result_cache.normalize_sql(sql)):
+            # Write results are small; give the cursor back before the cube
+            # refresh checks one out
+            table = (getattr(res, "to_arrow_table", None) or res.fetch_arrow_table)()
+            pool._release(cur)
+            cur = None
+            _after_write(sql)
+            return None, table.to_reader(batch_rows)
+        to_reader = getattr(res, "to_arrow_reader", None) or res.fetch_record_batch
+        return cur, to_reader(batch_rows)
+    except Exception:
+        if cur is not None:
+            pool._release(cur)
+        raise
+
+
+def close_reader(cur: duckdb.DuckDBPyConnection | None):
+    """Return a cursor from open_reader() to the pool."""
+    if cur is not None:
+        get_pool()._release(cur)
+
+
+def _exact(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def _relabel(result, source: str, sql: str, params: list | None):
+    """
+    A cached result for SQL that differed only in case can differ in column
+    names (aliases and expression names keep their case); ask DuckDB for this
+    statement's names. None if they cannot be matched up.
+    """
+    if _exact(sql) == source:
+        return result
+    try:
+        with get_pool().cursor() as cur:
+            names = [row[0] for row in cur.execute(f"DESCRIBE {sql}", params).fetchall()]
+    except duckdb.Error:
+        return None
+    if len(names) != len(result.columns):
+        return None
+    if isinstance(result, QueryResult):
+        return QueryResult(result.table.rename_columns(names))
+    result.columns = names
+    return result
+
+
+def compile_olap(q: OlapQuery | dict) -> tuple[str, list]:
+    """Compile a structured OLAP query to (sql, params), using the rollup cube if enabled."""
+    if isinstance(q, dict):
+        q = OlapQuery.from_dict(q)
+    return compile_query(q, use_rollup=_rollup_active())
 
 
 def get_schema_info() -> dict:
     """Return schema metadata for agent context."""
-    conn = get_connection()
     info = {}
-    for table in ["fact_sales", "dim_date", "dim_geography", "dim_product", "dim_customer"]:
-        cols = conn.execute(f"PRAGMA table_info({table})").df()
-        info[table] = cols[["name", "type"]].to_dict("records")
+    with get_pool().cursor() as cur:
+        for table in ["fact_sales", "dim_date", "dim_geography", "dim_product", "dim_customer"]:
+            cols = cur.execute(f"PRAGMA table_info({table})").df()
+            info[table] = cols[["name", "type"]].to_dict("records")
     return info
 
 
@@ -159,4 +541,15 @@ CREATE TABLE fact_sales (
     profit            DECIMAL(12,2),
     profit_margin     DECIMAL(5,2)
 );
+
+-- Pre-aggregated rollup cube (GROUPING SETS over every hierarchy level)
+CREATE TABLE agg_sales_rollup (
+    year, quarter, month, month_name,
+    region, country,
+    category, subcategory,
+    customer_segment,
+    revenue, profit, cost, quantity, profit_margin,   -- SUMs
+    _order_count      BIGINT,                         -- COUNT(*)
+    _grouping         INTEGER                         -- GROUPING() bitmask
+);
 """
@@ -0,0 +1,198 @@
+"""
+Structured OLAP query IR and its deterministic SQL compiler.
+
+An OlapQuery names measures, hierarchy levels to group by, dimension filters,
+ordering / top-N, an optional pivot axis and an optional period comparison.
+compile_query turns it into parameterized DuckDB SQL over fact_sales (or the
+rollup cube), so common requests need no LLM-written SQL at all.
+"""
+from __future__ import annotations
+from dataclasses import asdict, dataclass, field
+from backend.db import rollup
+
+# measure name → SELECT expression (alias = measure name)
+MEASURES = {
+    "revenue": "ROUND(SUM(revenue), 2)",
+    "profit": "ROUND(SUM(profit), 2)",
+    "cost": "ROUND(SUM(cost), 2)",
+    "quantity": "SUM(quantity)",
+    "profit_margin": "ROUND(AVG(profit_margin), 2)",
+    "margin_pct": "ROUND(SUM(profit) / NULLIF(SUM(revenue), 0) * 100, 2)",
+    "orders": "COUNT(*)",
+}
+# Pivot cells are plain sums of one measure
+PIVOT_MEASURES = {"revenue", "profit", "cost", "quantity"}
+
+LEVELS = list(rollup.DIM_COLUMNS)
+TIME_LEVELS = [c for level in rollup.HIERARCHIES[0] for c in level]
+# Natural sort key for time levels that do not sort alphabetically
+_SORT_KEY = {"month_name": "month"}
+# Time levels that repeat every year
+_SUB_YEAR = [c for c in TIME_LEVELS if c != "year"]
+
+COMPARISONS = {
+    # comparison → (time columns added to the grain and ordering a series,
+    #               levels that must not split a series, output column)
+    "yoy": (["year"], ["year"], "yoy_growth_pct"),
+    "mom": (["year", "month"], TIME_LEVELS, "mom_change_pct"),
+}
+
+
+@dataclass
+class OlapQuery:
+    measures: list[str] = field(default_factory=lambda: ["revenue"])
+    group_by: list[str] = field(default_factory=list)
+    filters: dict[str, list] = field(default_factory=dict)
+    order_by: str | None = None
+    descending: bool = True
+    top_n: int | None = None
+    pivot: str | None = None
+    pivot_values: list | None = None
+    compare: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OlapQuery":
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def validate(self):
+        for m in self.measures:
+            if m not in MEASURES:
+                raise ValueError(f"Unknown measure: {m}")
+        for col in [*self.group_by, *self.filters, *([self.pivot] if self.pivot else [])]:
+            if col not in LEVELS:
+                raise ValueError(f"Unknown hierarchy level: {col}")
+        for col, values in self.filters.items():
+            if isinstance(values, list) and not values:
+                raise ValueError(f"Filter on {col} has no values")
+        if self.compare and self.compare not in COMPARISONS:
+            raise ValueError(f"Unknown comparison: {self.compare}")
+        compared = [COMPARISONS[self.compare][2]] if self.compare else []
+        if self.order_by and self.order_by not in [*self.measures, *self.group_by, *compared]:
+            raise ValueError(f"order_by must be a selected measure, level or comparison: {self.order_by}")
+        if self.pivot:
+            if not self.pivot_values:
+                raise ValueError("pivot requires pivot_values")
+            if len(self.measures) != 1 or self.measures[0] not in PIVOT_MEASURES:
+                raise ValueError("pivot requires exactly one additive measure")
+            if self.compare:
+                raise ValueError("pivot and compare cannot be combined")
+            if self.order_by in self.measures:
+                # Pivoted columns are named by the pivot values, not the measure
+                raise ValueError("a pivot can only be ordered by a row level")
+        if self.top_n is not None and self.top_n <= 0:
+            raise ValueError("top_n must be positive")
+
+
+def with_year(group_by: list[str], filters: dict, pivot: str | None = None) -> list[str]:
+    """
+    group_by with year added ahead of quarter / month levels, which would
+    otherwise merge the same quarter or month of different years, unless a
+    year filter pins a single year.
+    """
+    group_by = list(group_by)
+    levels = group_by + ([pivot] if pivot else [])
+    years = filters.get("year")
+    pinned = years is not None and len(years if isinstance(years, list) else [years]) == 1
+    if "year" in levels or pinned or not any(c in _SUB_YEAR for c in levels):
+        return group_by
+    first = next((i for i, c in enumerate(group_by) if c in _SUB_YEAR), len(group_by))
+    return group_by[:first] + ["year"] + group_by[first:]
+
+
+def _where(filters: dict[str, list], params: list) -> str:
+    clauses = []
+    for col, values in filters.items():
+        values = values if isinstance(values, list) else [values]
+        placeholders = ", ".join("?" for _ in values)
+        clauses.append(f"{col} IN ({placeholders})")
+        params.extend(values)
+    return f"\nWHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+def _quote(name) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def compile_query(q: OlapQuery, use_rollup: bool = True) -> tuple[str, list]:
+    """Compile an OlapQuery into (sql, params)."""
+    q.validate()
+    params: list = []
+
+    group_by = with_year(q.group_by, q.filters, q.pivot)
+    filters = dict(q.filters)
+    outer_filters = {}
+    if q.compare:
+        time_cols, unsplit, _ = COMPARISONS[q.compare]
+        group_by = [c for c in group_by if c not in time_cols] + time_cols
+        # The window needs the preceding period, so filters on the series' own
+        # time levels apply after it (those levels join the grain so the outer
+        # query can see them); all other filters narrow the base aggregate.
+        outer_filters = {c: filters.pop(c) for c in list(filters) if c in unsplit}
+        group_by += [c for c in outer_filters if c not in group_by]
+    # Sort helpers (e.g. month for month_name) must be grouped too
+    grain = group_by + [_SORT_KEY[c] for c in group_by if c in _SORT_KEY and _SORT_KEY[c] not in group_by]
+
+    if q.pivot:
+        measure = q.measures[0]
+        select = list(grain) + [
+            f"ROUND(SUM(CASE WHEN {q.pivot} = ? THEN {measure} ELSE 0 END), 2) AS {_quote(v)}"
+            for v in q.pivot_values
+        ]
+        params.extend(q.pivot_values)
+    else:
+        select = list(grain) + [f"{MEASURES[m]} AS {m}" for m in q.measures]
+
+    base = f"SELECT {', '.join(select)}\nFROM fact_sales{_where(filters, params)}"
+    if grain:
+        base += f"\nGROUP BY {', '.join(grain)}"
+    if use_rollup:
+        base = rollup.rewrite(base) or base
+
+    order_col = q.order_by or (q.measures[0] if (q.top_n or not group_by) and not q.pivot else None)
+    if order_col:
+        order = f"{order_col} {'DESC' if q.descending else 'ASC'}"
+        if q.compare and order_col == COMPARISONS[q.compare][2]:
+            order += " NULLS LAST"  # the first period of a series has nothing to compare with
+    else:
+        order = ", ".join(dict.fromkeys(_SORT_KEY.get(c, c) for c in grain)) if grain else None
+
+    if q.compare:
+        series_order, unsplit, out_col = COMPARISONS[q.compare]
+        measure = q.measures[0]
+        partition = [c for c in grain if c not in unsplit]
+        if not order_col:
+            order = ", ".join(partition + series_order)
+        window = (f"(PARTITION BY {', '.join(partition)} " if partition else "(") + \
+                 f"ORDER BY {', '.join(series_order)})"
+        sql = (
+            f"WITH base AS (\n{base}\n), compared AS (\n"
+            f"SELECT *, ROUND(({measure} - LAG({measure}) OVER {window}) "
+            f"/ NULLIF(LAG({measure}) OVER {window}, 0) * 100, 2) AS {out_col}\nFROM base\n)\n"
+        )
+        compared = f"SELECT * FROM compared{_where(outer_filters, params)}"
+        if q.top_n:
+            # Rank series on their latest period, not on every period of every series
+            latest = ", ".join(f"{c} DESC" for c in series_order)
+            compared = (
+                f"SELECT * EXCLUDE (period_rank) FROM (\n"
+                f"SELECT *, DENSE_RANK() OVER (ORDER BY {latest}) AS period_rank\n"
+                f"FROM ({compared})\n) latest\nWHERE period_rank = 1"
+            )
+        sql += compared
+    elif q.top_n:
+        sql = (
+            f"SELECT *, RANK() OVER (ORDER BY {order}) AS rank\n"
+            f"FROM (\n{base}\n) ranked"
+        )
+    else:
+        sql = base
+
+    if order:
+        sql += f"\nORDER BY {order}"
+    if q.top_n:
+        sql += f"\nLIMIT {int(q.top_n)}"
+    return sql, params
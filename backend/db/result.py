@@ -0,0 +1,90 @@
+"""
+Columnar query results backed by Arrow.
+
+Agents pass a QueryResult between each other instead of a list of row dicts,
+so the rows are only converted to Python objects once — when the API (or the
+Streamlit UI) serializes the final response.
+"""
+from __future__ import annotations
+from typing import Any
+import pandas as pd
+import pyarrow as pa
+
+
+class QueryResult:
+    """Immutable wrapper around a pyarrow.Table with lazy pandas / records views."""
+
+    def __init__(self, table: pa.Table):
+        self.table = _decimals_to_float(table)
+        self._df: pd.DataFrame | None = None
+
+    @classmethod
+    def from_pandas(cls, df: pd.DataFrame) -> "QueryResult":
+        return cls(pa.Table.from_pandas(df, preserve_index=False))
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.table.column_names)
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def empty(self) -> bool:
+        return self.table.num_rows == 0
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __repr__(self) -> str:
+        return f"QueryResult(rows={self.num_rows}, columns={self.columns})"
+
+    def head(self, n: int = 5) -> "QueryResult":
+        return QueryResult(self.table.slice(0, n))
+
+    def to_pandas(self) -> pd.DataFrame:
+        """DataFrame view, converted once and cached."""
+        if self._df is None:
+            self._df = self.table.to_pandas()
+        return self._df
+
+    def to_records(self) -> list[dict]:
+        return self.table.to_pylist()
+
+
+def _decimals_to_float(table: pa.Table) -> pa.Table:
+    """DECIMAL/HUGEINT aggregates arrive as decimal128; expose them as float64 like .df() does."""
+    for i, f in enumerate(table.schema):
+        if pa.types.is_decimal(f.type):
+            table = table.set_column(i, f.name, table.column(i).cast(pa.float64()))
+    return table
+
+
+def as_frame(data: Any) -> pd.DataFrame:
+    """DataFrame from a QueryResult, DataFrame or list of row dicts."""
+    if isinstance(data, QueryResult):
+        return data.to_pandas()
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.DataFrame(data or [])
+
+
+def as_records(data: Any) -> list[dict]:
+    """List of row dicts from a QueryResult, DataFrame or list of row dicts."""
+    if isinstance(data, QueryResult):
+        return data.to_records()
+    if isinstance(data, pd.DataFrame):
+        return data.to_dict("records")
+    return list(data or [])
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Recursively replace QueryResults in a result payload with row dicts."""
+    if isinstance(obj, QueryResult):
+        return obj.to_records()
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [to_jsonable(v) for v in obj]
+    return obj
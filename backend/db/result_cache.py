@@ -0,0 +1,145 @@
+"""
+Query result cache used by database.query / database.query_arrow.
+
+Results are keyed on the normalized SQL (comments stripped, whitespace
+collapsed and case folded outside string literals and quoted identifiers),
+the bound parameters and the dataset version. The version bumps whenever the
+star schema is (re)loaded or a statement that may write is executed, which
+drops every cached result at once.
+
+Only read-only statements without volatile functions (random(), now(),
+read_csv(), ...) are cached. Memory is bounded by total result bytes with LRU
+eviction.
+
+Configuration (environment):
+  OLAP_DB_CACHE            "0" disables the result cache (default on)
+  OLAP_DB_CACHE_BYTES      max cached result bytes (default 256 MiB)
+  OLAP_DB_CACHE_MAX_ENTRY  largest single result kept, in bytes (default 32 MiB)
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+import pandas as pd
+from backend.db.result import QueryResult
+
+_LITERALS = r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\""
+_TOKENS = re.compile(rf"({_LITERALS}|--[^\n]*|/\*[\s\S]*?\*/)")
+_QUOTED = re.compile(f"({_LITERALS})")
+_READ_ONLY = re.compile(r"^\(*\s*(?:select|with|from|values|describe|show|summarize)\b")
+_VOLATILE = re.compile(
+    r"\b(?:random|uuid|gen_random_uuid|now|today|current_date|current_time|current_timestamp"
+    r"|get_current_time|nextval|currval|setseed|getenv|glob|read_\w+|\w+_scan)\s*\("
+    r"|\bcurrent_(?:date|time|timestamp)\b"
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and case outside literals so trivially different SQL shares a key."""
+    parts = _TOKENS.split(sql)
+    text = "".join(" " if i % 2 and p.startswith(("--", "/*")) else p for i, p in enumerate(parts))
+    parts = _QUOTED.split(text)
+    text = "".join(p if i % 2 else re.sub(r"\s+", " ", p).lower() for i, p in enumerate(parts))
+    return text.strip().rstrip(";").strip()
+
+
+def is_read_only(normalized: str) -> bool:
+    return bool(_READ_ONLY.match(normalized))
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, QueryResult):
+        return value.table.nbytes
+    return int(value.memory_usage(index=True, deep=True).sum())
+
+
+class ResultCache:
+    """LRU of query results bounded by total bytes, invalidated by a data version."""
+
+    def __init__(self, max_bytes: int = 256 << 20, max_entry_bytes: int = 32 << 20):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.version = 0
+        self._data: OrderedDict[tuple, tuple[Any, str, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "skipped": 0}
+
+    def key(self, kind: str, sql: str, params: list | None) -> tuple | None:
+        """Cache key for a statement, or None if it must not be cached."""
+        normalized = normalize_sql(sql)
+        if not is_read_only(normalized) or _VOLATILE.search(_QUOTED.sub("''", normalized)):
+            return None
+        return kind, self.version, normalized, json.dumps(params, default=str) if params else ""
+
+    def get(self, key: tuple) -> tuple[Any, str] | None:
+        """Cached (result, exact SQL text it was computed for), or None."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+        value, source, _ = item
+        return _copy(value), source
+
+    def set(self, key: tuple, value: Any, source: str):
+        size = _nbytes(value)
+        with self._lock:
+            if key[1] != self.version or size > self.max_entry_bytes:
+                self._stats["skipped"] += 1
+                return
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[2]
+            self._data[key] = (_copy(value), source, size)
+            self._bytes += size
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes and self._data:
+                self._bytes -= self._data.popitem(last=False)[1][2]
+                self._stats["evictions"] += 1
+
+    def bump_version(self):
+        """New dataset version: every cached result is stale."""
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "version": self.version,
+            }
+
+
+def _copy(value: Any) -> Any:
+    # Callers may add or overwrite DataFrame columns; QueryResults are immutable
+    return value.copy() if isinstance(value, pd.DataFrame) else value
+
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """Process-wide result cache configured from the environment, or None if disabled."""
+    global _cache
+    if os.getenv("OLAP_DB_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    max_bytes=int(os.getenv("OLAP_DB_CACHE_BYTES", str(256 << 20))),
+                    max_entry_bytes=int(os.getenv("OLAP_DB_CACHE_MAX_ENTRY", str(32 << 20))),
+                )
+    return _cache
@@ -0,0 +1,294 @@
+"""
+Pre-aggregated rollup cube and aggregate-aware query rewriting.
+
+agg_sales_rollup holds SUM(revenue/profit/cost/quantity/profit_margin) and
+order counts for every combination of hierarchy levels:
+
+  Time:      (none) → year → quarter → month/month_name
+  Geography: (none) → region → country
+  Product:   (none) → category → subcategory
+  Customer:  (none) → customer_segment
+
+Each row carries the GROUPING() bitmask of its grouping set in `_grouping`,
+and the table is sorted on it so DuckDB's zone maps skip the other sets.
+
+rewrite() takes agent-generated SQL against fact_sales and, when the query
+only touches hierarchy columns and re-aggregatable measures, swaps fact_sales
+for the coarsest grouping set that covers every referenced column. Anything
+it does not fully understand is left untouched (rewrite returns None).
+"""
+from __future__ import annotations
+import functools
+import itertools
+import re
+import threading
+import duckdb
+
+ROLLUP_TABLE = "agg_sales_rollup"
+
+# Hierarchies, coarsest level first; each level lists the columns it adds
+HIERARCHIES = [
+    [["year"], ["quarter"], ["month", "month_name"]],
+    [["region"], ["country"]],
+    [["category"], ["subcategory"]],
+    [["customer_segment"]],
+]
+
+DIM_COLUMNS = [c for h in HIERARCHIES for level in h for c in level]
+MEASURES = ["revenue", "profit", "cost", "quantity", "profit_margin"]
+# Columns that only exist at order grain — any reference disables rewriting
+ORDER_GRAIN_COLUMNS = {"order_id", "order_date", "unit_price"}
+
+# column → (hierarchy index, level number starting at 1)
+_LEVEL_OF = {
+    col: (h_idx, lvl + 1)
+    for h_idx, h in enumerate(HIERARCHIES)
+    for lvl, level in enumerate(h)
+    for col in level
+}
+
+_stats = {"rewritten": 0, "skipped": 0}
+_stats_lock = threading.Lock()
+
+
+def _grouping_sets() -> list[list[str]]:
+    sets = []
+    for levels in itertools.product(*[range(len(h) + 1) for h in HIERARCHIES]):
+        cols = []
+        for h, depth in zip(HIERARCHIES, levels):
+            for level in h[:depth]:
+                cols.extend(level)
+        sets.append(cols)
+    return sets
+
+
+def build_sql(replace: bool = False) -> str:
+    """CREATE TABLE statement for the rollup cube (expects fact_sales)."""
+    dims = ", ".join(DIM_COLUMNS)
+    measures = ",\n            ".join(f"SUM({m}) AS {m}" for m in MEASURES)
+    sets = ",\n            ".join(f"({', '.join(s)})" for s in _grouping_sets())
+    return f"""
+        CREATE {"OR REPLACE " if replace else ""}TABLE {ROLLUP_TABLE} AS
+        SELECT
+            {dims},
+            {measures},
+            COUNT(*) AS _order_count,
+            GROUPING({dims}) AS _grouping
+        FROM fact_sales
+        GROUP BY GROUPING SETS (
+            {sets}
+        )
+        ORDER BY _grouping
+    """
+
+
+def _grouping_mask(grain: list[int]) -> int:
+    """GROUPING() value for a grain: one bit per DIM_COLUMN, 1 = rolled up."""
+    mask = 0
+    for col in DIM_COLUMNS:
+        h_idx, lvl = _LEVEL_OF[col]
+        mask = (mask << 1) | (0 if lvl <= grain[h_idx] else 1)
+    return mask
+
+
+# ── Rewriter ────────────────────────────────────────────────────────────────
+
+_IDENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_BLOCKERS = re.compile(
+    r"\b(join|with|union|intersect|except|over|qualify|window|using|sample|pivot|unpivot|filter)\b"
+)
+# Aggregates whose result over cube cells equals the result over orders. SUM,
+# AVG and COUNT are checked (and rewritten) argument by argument below; MIN,
+# MAX and ANY_VALUE are only safe over dimensions, which the measure check
+# enforces. Every other aggregate (LIST, MEDIAN, MODE, STRING_AGG, ...) would
+# see one value per cell instead of one per order.
+_CELL_SAFE_AGGREGATES = {"sum", "avg", "count", "min", "max", "any_value", "arbitrary"}
+_KEYWORDS = {"where", "group", "order", "having", "limit", "qualify", "window", "on"}
+
+
+def _mask_literals(sql: str) -> str:
+    """Blank out string literals and comments, keeping offsets intact."""
+    out = list(sql)
+
+    def blank(m):
+        for i in range(m.start(), m.end()):
+            out[i] = " "
+
+    for m in re.finditer(r"--[^\n]*|/\*[\s\S]*?\*/", sql):
+        blank(m)
+    masked = "".join(out)
+    for m in re.finditer(r"'(?:[^']|'')*'", masked):
+        for i in range(m.start() + 1, m.end() - 1):
+            out[i] = " "
+    return "".join(out)
+
+
+def _matching_paren(text: str, open_idx: int) -> int:
+    depth = 0
+    for i in range(open_idx, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _qualified(col: str) -> str:
+    return rf"(?:[A-Za-z_][A-Za-z0-9_]*\.)?{col}"
+
+
+_MEASURE_REF = "|".join(_qualified(m) for m in MEASURES)
+# SUM() arguments that stay correct when summed over pre-aggregated cells
+_SUM_ARG_OK = [
+    re.compile(rf"^\s*(?:{_MEASURE_REF})\s*$"),
+    re.compile(rf"^\s*(?:{_MEASURE_REF})(?:\s*[-+]\s*(?:{_MEASURE_REF}))+\s*$"),
+    re.compile(
+        rf"^\s*case\s+when\s+(?P<cond>[\s\S]+?)\s+then\s+(?:{_MEASURE_REF})\s+(?:else\s+0(?:\.0+)?\s+)?end\s*$"
+    ),
+]
+
+
+@functools.cache
+def _aggregate_functions() -> frozenset[str]:
+    """Names of all aggregate functions DuckDB knows."""
+    conn = duckdb.connect()
+    try:
+        rows = conn.execute(
+            "SELECT DISTINCT function_name FROM duckdb_functions() WHERE function_type = 'aggregate'"
+        ).fetchall()
+    finally:
+        conn.close()
+    return frozenset(name.lower() for (name,) in rows)
+
+
+def rewrite(sql: str) -> str | None:
+    """Return sql redirected to the rollup cube, or None if it is not eligible."""
+    result = _rewrite(sql)
+    with _stats_lock:
+        _stats["rewritten" if result else "skipped"] += 1
+    return result
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _rewrite(sql: str) -> str | None:
+    masked = _mask_literals(sql)
+    lower = masked.lower()
+
+    if _BLOCKERS.search(lower) or len(re.findall(r"\bselect\b", lower)) != 1:
+        return None
+    if re.search(r"\bselect\s+(?:distinct\s+)?(?:\w+\.)?\*", lower):
+        return None
+    froms = list(re.finditer(r"\bfrom\s+(fact_sales)\b(?:\s+(?:as\s+)?([a-z_][a-z0-9_]*))?", lower))
+    qualified_refs = len(re.findall(r"\bfact_sales\s*\.", lower))
+    if len(froms) != 1 or len(re.findall(r"\bfact_sales\b", lower)) != 1 + qualified_refs:
+        return None
+    from_match = froms[0]
+    alias = from_match.group(2)
+    if alias in _KEYWORDS:
+        alias = None
+    from_end = from_match.end(2) if alias else from_match.end(1)
+    # Only one table in FROM
+    if re.match(r"\s*,", lower[from_end:]):
+        return None
+
+    aggregates = _aggregate_functions()
+    for m in re.finditer(r"\b([a-z_][a-z0-9_]*)\s*\(", lower):
+        if m.group(1) in aggregates and m.group(1) not in _CELL_SAFE_AGGREGATES:
+            return None
+
+    needed = [0] * len(HIERARCHIES)
+
+    def note_dims(text: str):
+        for tok in _IDENT.findall(text):
+            if tok in _LEVEL_OF:
+                h_idx, lvl = _LEVEL_OF[tok]
+                needed[h_idx] = max(needed[h_idx], lvl)
+
+    replacements: list[tuple[int, int, str]] = []
+    covered: list[tuple[int, int]] = []
+    has_aggregate = False
+
+    for m in re.finditer(r"\b(sum|avg|count)\s*\(", lower):
+        func = m.group(1)
+        open_idx = m.end() - 1
+        close_idx = _matching_paren(lower, open_idx)
+        if close_idx < 0:
+            return None
+        arg = lower[open_idx + 1:close_idx]
+        orig_arg = sql[open_idx + 1:close_idx]
+        has_aggregate = True
+        covered.append((m.start(), close_idx + 1))
+
+        if func == "sum":
+            if any(t in ORDER_GRAIN_COLUMNS for t in _IDENT.findall(arg)):
+                return None
+            matched = next((p.match(arg) for p in _SUM_ARG_OK if p.match(arg)), None)
+            if not matched:
+                return None
+            cond = matched.groupdict().get("cond")
+            if cond and any(t in MEASURES for t in _IDENT.findall(cond)):
+                return None
+            note_dims(arg)
+        elif func == "avg":
+            mm = re.match(rf"^\s*((?:[a-z_][a-z0-9_]*\.)?)({'|'.join(MEASURES)})\s*$", arg)
+            if not mm:
+                return None
+            prefix = mm.group(1)
+            replacements.append((
+                m.start(), close_idx + 1,
+                f"(SUM({orig_arg.strip()}) / SUM({prefix}_order_count))",
+            ))
+        else:
+            stripped = arg.strip()
+            if re.fullmatch(rf"\*|1|{_qualified('order_id')}", stripped):
+                prefix = stripped.split(".")[0] + "." if "." in stripped else ""
+                replacements.append((
+                    m.start(), close_idx + 1, f"COALESCE(CAST(SUM({prefix}_order_count) AS BIGINT), 0)"
+                ))
+            elif re.fullmatch(rf"distinct\s+{_qualified('(?:' + '|'.join(DIM_COLUMNS) + ')')}", stripped):
+                note_dims(arg)
+            else:
+                return None
+
+    if not has_aggregate and not re.search(r"\bgroup\s+by\b|\bselect\s+distinct\b", lower):
+        return None
+
+    aliases = set(re.findall(r"\bas\s+\"?([a-z_][a-z0-9_]*)\"?", lower))
+    order_by = list(re.finditer(r"\border\s+by\b", lower))
+    order_start = order_by[-1].start() if order_by else len(lower)
+
+    def inside_covered(pos: int) -> bool:
+        return any(s <= pos < e for s, e in covered)
+
+    for m in _IDENT.finditer(lower):
+        tok = m.group(0)
+        if inside_covered(m.start()):
+            continue
+        if tok in ORDER_GRAIN_COLUMNS:
+            return None
+        if tok in MEASURES:
+            if re.search(r"\bas\s*\"?$", lower[:m.start()]):
+                continue
+            if tok in aliases and m.start() > order_start:
+                continue
+            return None
+        if tok in _LEVEL_OF:
+            note_dims(tok)
+
+    mask = _grouping_mask(needed)
+    source = f"(SELECT * FROM {ROLLUP_TABLE} WHERE _grouping = {mask})"
+    replacements.append((
+        from_match.start(0), from_end,
+        f"FROM {source} AS {alias or 'fact_sales'}",
+    ))
+
+    out = sql
+    for start, end, text in sorted(replacements, key=lambda r: r[0], reverse=True):
+        out = out[:start] + text + out[end:]
+    return out
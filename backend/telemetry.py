@@ -0,0 +1,231 @@
+"""
+Per-request stage timings and in-process histograms.
+
+Planner starts a trace for every query; spans opened while it runs (planning,
+each agent stage, every LLM request and DuckDB query) are appended to it with
+their wall time and attributes such as retries, token counts and row counts.
+The trace is returned with the query result as "timings". Every finished span
+is also observed into a process-wide histogram keyed by stage and labels.
+
+Histograms, counters and gauges are exported in the Prometheus text format by
+render_prometheus() (served at GET /metrics).
+"""
+from __future__ import annotations
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+# Upper bounds in milliseconds (the last bucket is +Inf)
+LATENCY_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+SIZE_BUCKETS = [1, 10, 100, 1000, 10000, 100000, 1000000]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with count and sum (Prometheus semantics)."""
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Bucket upper bound containing the q-th observation."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + [float("inf")], self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative, running = [], 0
+        for n in self.counts:
+            running += n
+            cumulative.append(running)
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], cumulative)),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+_histograms: dict[tuple, Histogram] = {}
+_hist_lock = threading.Lock()
+
+
+def observe(name: str, value: float, buckets: list[float] = LATENCY_BUCKETS_MS, **labels):
+    key = _key(name, labels)
+    with _hist_lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(buckets)
+        hist.observe(value)
+
+
+_counters: dict[tuple, float] = {}
+_gauges: dict[tuple, float] = {}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Add to a monotonically increasing counter."""
+    key = _key(name, labels)
+    with _hist_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def in_flight(name: str, **labels) -> Iterator[None]:
+    """Gauge of how many callers are currently inside the block."""
+    key = _key(name, labels)
+    with _hist_lock:
+        _gauges[key] = _gauges.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _hist_lock:
+            _gauges[key] -= 1
+
+
+def get_histograms() -> list[dict]:
+    """Snapshot of every histogram as {name, labels, count, sum, buckets, p50, p95}."""
+    with _hist_lock:
+        return [
+            {"name": name, "labels": dict(labels), **hist.snapshot()}
+            for (name, labels), hist in sorted(_histograms.items())
+        ]
+
+
+# ── Per-request trace ────────────────────────────────────────────────────────
+
+_trace: ContextVar[dict | None] = ContextVar("olap_trace", default=None)
+_current_span: ContextVar[dict | None] = ContextVar("olap_span", default=None)
+_trace_lock = threading.Lock()
+
+# Span attributes that are also aggregated into size histograms
+_SIZE_ATTRS = ("rows", "input_tokens", "output_tokens")
+# Attributes used as histogram labels
+_LABEL_ATTRS = ("agent", "provider", "model", "routed_by")
+
+
+def start_trace() -> dict:
+    trace = {"started": time.perf_counter(), "spans": []}
+    _trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: dict) -> dict:
+    """Serializable view of a trace: total time plus spans in start order."""
+    with _trace_lock:
+        spans = sorted(trace["spans"], key=lambda s: s["start_ms"])
+    return {
+        "total_ms": round((time.perf_counter() - trace["started"]) * 1000, 2),
+        "spans": spans,
+    }
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[dict]:
+    """Time a stage; attributes set on the yielded dict are kept on the span."""
+    trace = _trace.get()
+    start = time.perf_counter()
+    record = {"stage": stage, **attrs}
+    token = _current_span.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # closed from another context (e.g. an abandoned async generator)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        record["ms"] = round(elapsed_ms, 2)
+        labels = {k: record.get(k) for k in _LABEL_ATTRS}
+        observe(f"{stage}_latency_ms", elapsed_ms, **labels)
+        for attr in _SIZE_ATTRS:
+            if isinstance(record.get(attr), (int, float)):
+                observe(f"{stage}_{attr}", record[attr], SIZE_BUCKETS, **labels)
+        if trace is not None:
+            record["start_ms"] = round((start - trace["started"]) * 1000, 2)
+            with _trace_lock:
+                trace["spans"].append(record)
+
+
+def annotate(**attrs):
+    """Set attributes on the innermost open span, if any."""
+    record = _current_span.get()
+    if record is not None:
+        record.update(attrs)
+
+
+# ── Prometheus exposition ────────────────────────────────────────────────────
+
+PREFIX = "olap_"
+
+
+def render_prometheus(samples: list[tuple[str, str, dict, float]] = ()) -> str:
+    """
+    Every histogram, counter and gauge in the Prometheus text format (0.0.4).
+
+    samples are extra (name, "counter" | "gauge", labels, value) values read
+    from other components' stats at scrape time.
+    """
+    with _hist_lock:
+        hists = [(name, dict(labels), hist.snapshot()) for (name, labels), hist in sorted(_histograms.items())]
+        series = ([(name, "counter", dict(labels), v) for (name, labels), v in sorted(_counters.items())]
+                  + [(name, "gauge", dict(labels), v) for (name, labels), v in sorted(_gauges.items())])
+    # Samples of one metric must be contiguous under a single TYPE line
+    series = sorted([*series, *samples], key=lambda s: s[0])
+
+    lines, typed = [], set()
+
+    def declare(name: str, kind: str):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for name, labels, snap in hists:
+        metric = PREFIX + name
+        declare(metric, "histogram")
+        for bound, n in snap["buckets"].items():
+            lines.append(f"{metric}_bucket{_labels({**labels, 'le': bound})} {n}")
+        lines.append(f"{metric}_sum{_labels(labels)} {snap['sum']}")
+        lines.append(f"{metric}_count{_labels(labels)} {snap['count']}")
+    for name, kind, labels, value in series:
+        metric = PREFIX + name
+        declare(metric, kind)
+        lines.append(f"{metric}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
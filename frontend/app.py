@@ -15,6 +15,8 @@ ROOT = os.path.dirname(FRONTEND_DIR)  # project root (one level up from frontend
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+from backend.db.result import as_frame
+
 # ── Page config ──────────────────────────────────────────────────────────────
 st.set_page_config(
     page_title="OLAP BI Assistant",
@@ -271,7 +273,11 @@ def build_chart(df: pd.DataFrame, config: dict):
         kwargs = dict(data_frame=df, x=x, y=y, title=title, color=color_col,
                       template="plotly_dark", color_discrete_sequence=["#58a6ff","#3fb950","#e3b341","#f78166","#bc8cff"])
 
-        if chart_type == "line":
+        value_cols = [c for c in config.get("value_cols") or [] if c in df.columns]
+        if chart_type == "heatmap" and value_cols:
+            fig = px.imshow(df.set_index(x)[value_cols], title=title, aspect="auto",
+                            template="plotly_dark", color_continuous_scale="Blues")
+        elif chart_type == "line":
             fig = px.line(**kwargs)
         elif chart_type == "pie":
             fig = px.pie(df, values=y, names=x, title=title, template="plotly_dark",
@@ -279,7 +285,8 @@ def build_chart(df: pd.DataFrame, config: dict):
         elif chart_type == "scatter":
             fig = px.scatter(**kwargs)
         elif chart_type == "treemap":
-            fig = px.treemap(df, path=[x], values=y, title=title, template="plotly_dark")
+            path = [c for c in config.get("path") or [x] if c in df.columns] or [x]
+            fig = px.treemap(df, path=path, values=y, title=title, template="plotly_dark")
         else:
             if orientation == "h":
                 fig = px.bar(df, x=y, y=x, title=title, color=color_col, orientation="h",
@@ -351,7 +358,7 @@ def render_result(result: dict):
     with tab_objs[tab_idx]:
         tab_idx += 1
         if data:
-            df = pd.DataFrame(data)
+            df = as_frame(data)
 
             # Format numeric columns
             num_cols = df.select_dtypes(include=["float64", "int64"]).columns
@@ -375,7 +382,7 @@ def render_result(result: dict):
     with tab_objs[tab_idx]:
         tab_idx += 1
         if data and viz_config:
-            df = pd.DataFrame(data)
+            df = as_frame(data)
             fig = build_chart(df, viz_config)
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
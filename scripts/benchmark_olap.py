@@ -0,0 +1,311 @@
+"""
+OLAP workload benchmark for backend/db/database.py at several scale factors.
+
+For every scale factor a dataset is generated once (cached under --data-dir)
+and a fresh Python process runs the fixed workload through database.query_arrow,
+so "cold" really is the first execution after start-up. Each query reports:
+
+  cold_ms        first execution
+  warm           p50 / p95 / p99 / mean / min over --runs repetitions
+  rows_returned  result rows
+  rows_scanned   rows read by DuckDB scans (from the query profile)
+  peak_buffer_mb DuckDB peak buffer memory (from the query profile)
+  peak_rss_mb    process RSS high-water mark while the query ran
+
+Results are written as JSON (--output) so releases can be diffed, and
+--compare prints warm p50 ratios against an earlier run.
+
+Examples:
+  python scripts/benchmark_olap.py --scale-factors 1,10,100 --output bench.json
+  python scripts/benchmark_olap.py --scale-factors 100 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# name → (OLAP operation, SQL)
+WORKLOAD = {
+    "slice_year": ("slice", """
+        SELECT region, ROUND(SUM(revenue), 2) AS revenue, ROUND(SUM(profit), 2) AS profit
+        FROM fact_sales WHERE year = 2024
+        GROUP BY region ORDER BY revenue DESC"""),
+    "dice_multi": ("dice", """
+        SELECT country, subcategory, ROUND(SUM(revenue), 2) AS revenue, SUM(quantity) AS units
+        FROM fact_sales
+        WHERE year = 2024 AND quarter = 'Q4' AND category = 'Electronics' AND region = 'Europe'
+        GROUP BY country, subcategory ORDER BY revenue DESC"""),
+    "pivot_region_year": ("pivot", """
+        SELECT region,
+            ROUND(SUM(CASE WHEN year = 2022 THEN revenue ELSE 0 END), 2) AS "2022",
+            ROUND(SUM(CASE WHEN year = 2023 THEN revenue ELSE 0 END), 2) AS "2023",
+            ROUND(SUM(CASE WHEN year = 2024 THEN revenue ELSE 0 END), 2) AS "2024"
+        FROM fact_sales GROUP BY region ORDER BY region"""),
+    "drill_down_month": ("drill_down", """
+        SELECT year, quarter, month, month_name, ROUND(SUM(revenue), 2) AS revenue
+        FROM fact_sales WHERE year = 2024 AND region = 'North America'
+        GROUP BY year, quarter, month, month_name ORDER BY month"""),
+    "roll_up_rollup": ("roll_up", """
+        SELECT year, quarter, ROUND(SUM(revenue), 2) AS revenue, COUNT(*) AS orders
+        FROM fact_sales GROUP BY ROLLUP (year, quarter) ORDER BY year, quarter"""),
+    "yoy_window": ("kpi_yoy", """
+        WITH yearly AS (
+            SELECT region, year, SUM(revenue) AS revenue FROM fact_sales GROUP BY region, year
+        )
+        SELECT region, year, ROUND(revenue, 2) AS revenue,
+            ROUND(100.0 * (revenue - LAG(revenue) OVER w) / LAG(revenue) OVER w, 2) AS yoy_pct
+        FROM yearly WINDOW w AS (PARTITION BY region ORDER BY year) ORDER BY region, year"""),
+    "mom_window": ("kpi_mom", """
+        WITH monthly AS (
+            SELECT year, month, SUM(revenue) AS revenue FROM fact_sales GROUP BY year, month
+        )
+        SELECT year, month, ROUND(revenue, 2) AS revenue,
+            ROUND(100.0 * (revenue - LAG(revenue) OVER w) / LAG(revenue) OVER w, 2) AS mom_pct
+        FROM monthly WINDOW w AS (ORDER BY year, month) ORDER BY year, month"""),
+    "top_n_countries": ("top_n", """
+        SELECT country, ROUND(SUM(profit), 2) AS profit
+        FROM fact_sales WHERE year = 2024
+        GROUP BY country ORDER BY profit DESC LIMIT 5"""),
+    "top_n_orders": ("top_n", """
+        SELECT order_id, order_date, country, revenue
+        FROM fact_sales ORDER BY revenue DESC LIMIT 10"""),
+}
+
+
+class _RssSampler:
+    """High-water mark of this process's RSS (Linux /proc) while the block runs."""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self) -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            return 0
+
+    def _poll(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def _percentiles(samples: list[float]) -> dict:
+    import numpy as np
+    values = np.array(samples)
+    return {
+        "runs": len(samples),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "min_ms": round(float(values.min()), 3),
+    }
+
+
+def _profile(db, sql: str) -> dict:
+    """Rows scanned and peak buffer memory from a profiled run of the routed SQL."""
+    cur = db.get_connection().cursor()
+    path = os.path.join(tempfile.gettempdir(), f"olap_profile_{os.getpid()}.json")
+    try:
+        cur.execute("PRAGMA enable_profiling = 'json'")
+        cur.execute(f"PRAGMA profiling_output = '{path}'")
+        cur.execute("SET custom_profiling_settings = "
+                    "'{\"CUMULATIVE_ROWS_SCANNED\": \"true\", \"SYSTEM_PEAK_BUFFER_MEMORY\": \"true\"}'")
+        cur.execute(db._route(sql)).fetchall()  # the statement query_arrow actually runs
+        cur.execute("PRAGMA disable_profiling")
+        with open(path) as f:
+            profile = json.load(f)
+        return {
+            "rows_scanned": profile.get("cumulative_rows_scanned"),
+            "peak_buffer_mb": round(profile.get("system_peak_buffer_memory", 0) / 2**20, 2),
+        }
+    except Exception as e:  # older DuckDB without these metrics
+        return {"rows_scanned": None, "peak_buffer_mb": None, "profile_error": str(e)}
+    finally:
+        cur.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_workload(runs: int) -> dict:
+    """Worker side: run the workload in this (fresh) process, configured by the environment."""
+    from backend.agents.anomaly_detection import ANOMALY_SQL
+    from backend.db import database as db
+
+    workload = {**WORKLOAD, "anomaly_cube": ("anomaly_detection", ANOMALY_SQL)}
+    start = time.perf_counter()
+    with _RssSampler() as load_rss:
+        db.get_connection()
+    load_s = time.perf_counter() - start
+
+    queries = []
+    for name, (operation, sql) in workload.items():
+        with _RssSampler() as rss:
+            t = time.perf_counter()
+            result = db.query_arrow(sql)
+            cold_ms = (time.perf_counter() - t) * 1000
+            warm = []
+            for _ in range(runs):
+                t = time.perf_counter()
+                db.query_arrow(sql)
+                warm.append((time.perf_counter() - t) * 1000)
+        queries.append({
+            "name": name,
+            "operation": operation,
+            "cold_ms": round(cold_ms, 3),
+            "warm": _percentiles(warm),
+            "rows_returned": result.num_rows,
+            **_profile(db, sql),
+            "peak_rss_mb": round(rss.peak / 2**20, 1),
+        })
+
+    rows = db.query_arrow("SELECT COUNT(*) AS n FROM fact_sales").to_records()[0]["n"]
+    return {"rows": rows, "load_s": round(load_s, 3), "load_peak_rss_mb": round(load_rss.peak / 2**20, 1),
+            "queries": queries}
+
+
+def _dataset(data_dir: str, scale_factor: float, storage: str, workers: int) -> str:
+    """Generate (once) the dataset for a scale factor; returns its path."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from generate_dataset import write_dataset
+
+    name = f"sf{scale_factor:g}"
+    path = os.path.join(data_dir, name if storage == "parquet" else f"{name}.csv")
+    marker = os.path.join(data_dir, f"{name}.{storage}.done")
+    if not os.path.exists(marker):
+        print(f"Generating scale factor {scale_factor:g} ({storage}) → {path}")
+        write_dataset(path, scale_factor, "parquet" if storage == "parquet" else "csv",
+                      ["year"] if storage == "parquet" else None, workers=workers, overwrite=True)
+        open(marker, "w").close()
+    return path
+
+
+def _run_scale_factor(args, scale_factor: float) -> dict:
+    path = _dataset(args.data_dir, scale_factor, args.storage, args.workers)
+    env = {**os.environ, "OLAP_DB_CACHE": "1" if args.result_cache else "0",
+           "OLAP_ROLLUP": "0" if args.no_rollup else "1"}
+    env.pop("OLAP_DB_PATH", None)
+    if args.storage == "parquet":
+        env["OLAP_FACT_PARQUET"] = path
+    else:
+        env.pop("OLAP_FACT_PARQUET", None)
+        env["OLAP_CSV_PATH"] = path
+
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+        output = out.name
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", output,
+                        "--runs", str(args.runs)], env=env, check=True, cwd=ROOT,
+                       stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return {"scale_factor": scale_factor, "storage": args.storage, **json.load(f)}
+    finally:
+        os.remove(output)
+
+
+def _metadata(args) -> dict:
+    import duckdb
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "runs": args.runs,
+        "storage": args.storage,
+        "rollup": not args.no_rollup,
+        "result_cache": args.result_cache,
+    }
+
+
+def _print_report(report: dict, baseline: dict | None):
+    before = {}
+    for sf in (baseline or {}).get("results", []):
+        for q in sf["queries"]:
+            before[(sf["scale_factor"], q["name"])] = q["warm"]["p50_ms"]
+
+    for sf in report["results"]:
+        print(f"\nScale factor {sf['scale_factor']:g}: {sf['rows']:,} rows, load {sf['load_s']:.2f}s")
+        print(f"  {'query':<20} {'cold ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'scanned':>12} {'rss MB':>8}"
+              + (f" {'vs base':>8}" if baseline else ""))
+        for q in sf["queries"]:
+            line = (f"  {q['name']:<20} {q['cold_ms']:>9.2f} {q['warm']['p50_ms']:>9.2f} "
+                    f"{q['warm']['p95_ms']:>9.2f} {q['rows_scanned'] or 0:>12,} {q['peak_rss_mb']:>8.1f}")
+            base = before.get((sf["scale_factor"], q["name"]))
+            if baseline:
+                line += f" {q['warm']['p50_ms'] / base:>7.2f}x" if base else f" {'new':>8}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale-factors", default="1,10,100",
+                        help="comma-separated scale factors (10,000 rows each)")
+    parser.add_argument("--storage", choices=["parquet", "memory"], default="parquet",
+                        help="year-partitioned Parquet view, or CSV loaded into memory")
+    parser.add_argument("--runs", type=int, default=20, help="warm repetitions per query")
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "data", "bench"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes used to generate datasets")
+    parser.add_argument("--no-rollup", action="store_true", help="disable rollup cube routing")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="keep the query result cache on (warm runs become cache hits)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare warm p50 against")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_workload(args.runs)
+        with open(args.worker, "w") as f:
+            json.dump(result, f)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    scale_factors = [float(s) for s in args.scale_factors.split(",") if s.strip()]
+    report = {"meta": _metadata(args), "results": [_run_scale_factor(args, sf) for sf in scale_factors]}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
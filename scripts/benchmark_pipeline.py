@@ -0,0 +1,264 @@
+"""
+End-to-end Planner benchmark on the "replay" LLM provider.
+
+LLM responses come from a recorded fixture file (backend/agents/replay.py), so
+each run measures our own pipeline — planning, SQL, Arrow/pandas conversion,
+agent orchestration and JSON serialization — with a fixed, synthetic LLM
+latency instead of provider latency and network jitter. The LLM response cache
+and the DuckDB result cache are off unless asked for.
+
+Record fixtures once against a live provider, then replay as often as needed:
+  python scripts/benchmark_pipeline.py --record --upstream groq
+  python scripts/benchmark_pipeline.py --runs 20 --output pipeline.json
+  python scripts/benchmark_pipeline.py --latency-ms 800 --concurrency 8
+  python scripts/benchmark_pipeline.py --compare pipeline.json
+
+Per query it reports total latency (p50 / p95), time inside LLM, SQL and
+agent spans, JSON serialization time and LLM calls per execution.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+QUERIES = [
+    "Show only Q4 2024 sales",
+    "Show Electronics sales in Europe for 2024",
+    "Break down 2024 revenue by quarter, then drill into Q4 by month",
+    "Roll up monthly sales to quarterly totals by region",
+    "Compare 2023 vs 2024 revenue by region",
+    "Top 5 countries by profit in 2024",
+    "Show revenue by region as columns, with years as rows",
+    "Find unusual patterns or anomalies in our sales data",
+    "Which category has the highest profit margin?",
+    "Break down Q4 sales by region, then drill into the top performer by month",
+]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    import numpy as np
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+def _stage_ms(timings: dict, stage: str) -> float:
+    return sum(s["ms"] for s in timings.get("spans", []) if s["stage"] == stage)
+
+
+def _serialize_ms(result: dict) -> float:
+    from backend.db.result import to_jsonable
+    start = time.perf_counter()
+    json.dumps(to_jsonable(result), default=str)
+    return (time.perf_counter() - start) * 1000
+
+
+def run_query(planner, query: str, runs: int) -> dict:
+    """Sequential Planner.execute runs of one query."""
+    totals, llm, sql, agents, serialize, calls, errors = [], [], [], [], [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = planner.execute(query)
+        totals.append((time.perf_counter() - start) * 1000)
+        serialize.append(_serialize_ms(result))
+        timings = result.get("timings") or {}
+        llm.append(_stage_ms(timings, "llm"))
+        sql.append(_stage_ms(timings, "sql"))
+        agents.append(_stage_ms(timings, "agent"))
+        calls.append(result["llm_calls"]["llm_calls"])
+        if result.get("error"):
+            errors.append(result["error"])
+    return {
+        "query": query,
+        "runs": runs,
+        "p50_ms": _percentile(totals, 50),
+        "p95_ms": _percentile(totals, 95),
+        "mean_ms": round(sum(totals) / len(totals), 3),
+        "llm_ms": _percentile(llm, 50),
+        "sql_ms": _percentile(sql, 50),
+        "agent_ms": _percentile(agents, 50),
+        "serialize_ms": _percentile(serialize, 50),
+        "llm_calls": max(calls),
+        "errors": len(errors),
+        "first_error": errors[0][:200] if errors else None,
+    }
+
+
+async def run_concurrent(planner, queries: list[str], concurrency: int, rounds: int) -> dict:
+    """Throughput of Planner.aexecute with `concurrency` queries in flight."""
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            result = await planner.aexecute(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += bool(result.get("error"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for _ in range(rounds) for q in queries))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "executions": len(latencies),
+        "wall_s": round(wall, 3),
+        "throughput_qps": round(len(latencies) / wall, 2),
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "errors": errors,
+    }
+
+
+def _configure(args):
+    """Environment read at import time by the backend modules."""
+    os.environ["OLAP_REPLAY_MODE"] = "record" if args.record else "replay"
+    os.environ["OLAP_REPLAY_FIXTURES"] = args.fixtures
+    os.environ["OLAP_REPLAY_UPSTREAM"] = args.upstream
+    os.environ["OLAP_REPLAY_LATENCY_MS"] = args.latency_ms
+    os.environ["OLAP_REPLAY_JITTER_MS"] = str(args.jitter_ms)
+    if not args.llm_cache:
+        os.environ["OLAP_LLM_CACHE"] = "0"
+    if not args.result_cache:
+        os.environ["OLAP_DB_CACHE"] = "0"
+
+
+def _metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "runs": args.runs,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "llm_cache": args.llm_cache,
+        "result_cache": args.result_cache,
+        "consolidated": os.getenv("OLAP_CONSOLIDATED", "0") == "1",
+        "router": os.getenv("OLAP_ROUTER", "1") != "0",
+    }
+
+
+def _print_report(report: dict, baseline: dict | None):
+    before = {q["query"]: q["p50_ms"] for q in (baseline or {}).get("queries", [])}
+    print(f"\n  {'query':<44} {'p50 ms':>8} {'p95 ms':>8} {'llm':>7} {'sql':>7} {'json':>6} {'calls':>5}"
+          + (f" {'vs base':>8}" if baseline else ""))
+    for q in report["queries"]:
+        line = (f"  {q['query'][:44]:<44} {q['p50_ms']:>8.2f} {q['p95_ms']:>8.2f} {q['llm_ms']:>7.2f} "
+                f"{q['sql_ms']:>7.2f} {q['serialize_ms']:>6.2f} {q['llm_calls']:>5}")
+        if baseline:
+            base = before.get(q["query"])
+            line += f" {q['p50_ms'] / base:>7.2f}x" if base else f" {'new':>8}"
+        print(line + (f"  ({q['errors']} errors)" if q["errors"] else ""))
+    if report.get("concurrent"):
+        c = report["concurrent"]
+        print(f"\n  concurrency {c['concurrency']}: {c['executions']} executions in {c['wall_s']:.2f}s, "
+              f"{c['throughput_qps']:.2f} q/s, p50 {c['p50_ms']:.1f} ms, p95 {c['p95_ms']:.1f} ms"
+              + (f", {c['errors']} errors" if c["errors"] else ""))
+    f = report["fixtures"]
+    print(f"\n  fixtures: {f['entries']} entries, {f['hits']} hits, {f['misses']} misses, {f['recorded']} recorded")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default=os.path.join(ROOT, "data", "llm_fixtures.jsonl"))
+    parser.add_argument("--record", action="store_true",
+                        help="run every query once against --upstream and record the responses")
+    parser.add_argument("--upstream", default="groq", help="live provider to record from")
+    parser.add_argument("--queries", help="file with one query per line (default: the /examples queries)")
+    parser.add_argument("--runs", type=int, default=10, help="sequential executions per query")
+    parser.add_argument("--latency-ms", default="0",
+                        help="synthetic LLM latency per call in ms, or 'recorded' (default 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra seeded per-prompt latency")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="also measure aexecute throughput with this many queries in flight")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--result-cache", action="store_true", help="keep the DuckDB result cache on")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare p50 against")
+    args = parser.parse_args()
+
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    _configure(args)
+    from backend.agents.planner import Planner
+    from backend.agents.replay import get_fixtures
+    from backend.db import database as db
+
+    start = time.perf_counter()
+    db.get_connection()
+    print(f"Star schema ready in {time.perf_counter() - start:.2f}s")
+    planner = Planner(provider="replay")
+
+    if args.record:
+        for query in queries:
+            result = planner.execute(query)
+            print(f"  recorded {result['llm_calls']['llm_calls']} calls for {query!r}"
+                  + (f" (error: {result['error']})" if result.get("error") else ""))
+        f = get_fixtures().stats()
+        print(f"\n{f['recorded']} responses recorded, {f['entries']} in {args.fixtures}")
+        return
+
+    if not len(get_fixtures()):
+        raise SystemExit(f"No fixtures in {args.fixtures}; record them first with --record")
+
+    # Warm-up (imports, connection pool, first-touch pages) doubles as a check that
+    # every LLM call of a query is recorded: agents turn a replay miss into an
+    # error result, so only queries that ran cleanly without a miss are timed.
+    recorded = []
+    for query in queries:
+        misses = get_fixtures().stats()["misses"]
+        try:
+            error = planner.execute(query).get("error")
+        except LookupError as e:
+            error = str(e)
+        if get_fixtures().stats()["misses"] > misses:
+            print(f"  skipping {query!r}: not fully recorded")
+        elif error:
+            print(f"  skipping {query!r}: {error}")
+        else:
+            recorded.append(query)
+    if not recorded:
+        raise SystemExit(f"None of the queries run cleanly from {args.fixtures}")
+    queries = recorded
+    warm_misses = get_fixtures().stats()["misses"]
+
+    report = {"meta": _metadata(args), "queries": [run_query(planner, q, args.runs) for q in queries]}
+    if args.concurrency:
+        report["concurrent"] = asyncio.run(run_concurrent(planner, queries, args.concurrency, args.runs))
+    report["fixtures"] = get_fixtures().stats()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    timed_misses = report["fixtures"]["misses"] - warm_misses
+    if timed_misses:
+        raise SystemExit(f"{timed_misses} LLM calls missed the fixtures during timed runs, "
+                         f"so the numbers above include error paths")
+
+
+if __name__ == "__main__":
+    main()
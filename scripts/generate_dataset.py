@@ -1,14 +1,25 @@
 """
-Generate the Global Retail Sales dataset (10,000 transactions, 2022-2024).
+Generate the Global Retail Sales dataset (10,000 transactions per scale factor, 2022-2024).
+
+Rows are generated with NumPy in fixed-size chunks, each from its own seed
+derived from --seed, so the output is identical whatever the number of
+worker processes. Memory stays bounded by the chunk size.
+
+Examples:
+  python scripts/generate_dataset.py                       # data/global_retail_sales.csv
+  python scripts/generate_dataset.py --scale-factor 10000 --format parquet \\
+      --partition-by year --workers 8 --output data/fact_sales
 """
-import pandas as pd
-import numpy as np
-import random
-from datetime import datetime, timedelta
+import argparse
 import os
-
-random.seed(42)
-np.random.seed(42)
+import shutil
+import time
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 REGIONS = {
     "North America": ["United States", "Canada", "Mexico"],
@@ -66,71 +77,216 @@ PROFIT_MARGINS = {
     "Clothing": (0.40, 0.65),
 }
 
-def random_date(start, end):
-    delta = end - start
-    return start + timedelta(days=random.randint(0, delta.days))
-
-def generate_dataset(n=10000):
-    start_date = datetime(2022, 1, 1)
-    end_date = datetime(2024, 12, 31)
-
-    records = []
-    for i in range(n):
-        region = random.choice(list(REGIONS.keys()))
-        country = random.choice(REGIONS[region])
-        category = random.choice(list(PRODUCTS.keys()))
-        subcategory = random.choice(list(PRODUCTS[category].keys()))
-        price_range = PRODUCTS[category][subcategory]
-        segment = random.choice(SEGMENTS)
-
-        order_date = random_date(start_date, end_date)
-        month = order_date.month
-        year = order_date.year
-        quarter = (month - 1) // 3 + 1
-
-        base_price = random.uniform(*price_range)
-        seg_mult = SEGMENT_MULTIPLIERS[segment]
-        season_mult = SEASONAL_MULTIPLIERS[month]
-
-        # Year over year growth trend
-        year_mult = 1.0 + (year - 2022) * 0.12
-
-        unit_price = round(base_price * seg_mult * 0.4, 2)
-        quantity = max(1, int(np.random.exponential(2) * season_mult * year_mult))
-        revenue = round(unit_price * quantity, 2)
-
-        margin_range = PROFIT_MARGINS[category]
-        profit_margin = random.uniform(*margin_range)
-        cost = round(revenue * (1 - profit_margin), 2)
-        profit = round(revenue - cost, 2)
-
-        records.append({
-            "order_id": f"ORD-{i+1:05d}",
-            "order_date": order_date.strftime("%Y-%m-%d"),
-            "year": year,
-            "quarter": f"Q{quarter}",
-            "month": month,
-            "month_name": order_date.strftime("%B"),
-            "region": region,
-            "country": country,
-            "category": category,
-            "subcategory": subcategory,
-            "customer_segment": segment,
-            "quantity": quantity,
-            "unit_price": unit_price,
-            "revenue": revenue,
-            "cost": cost,
-            "profit": profit,
-            "profit_margin": round(profit_margin * 100, 2),
-        })
-
-    df = pd.DataFrame(records)
-    df = df.sort_values("order_date").reset_index(drop=True)
-    return df
+ROWS_PER_SCALE_FACTOR = 10_000
+START_DATE = np.datetime64("2022-01-01")
+END_DATE = np.datetime64("2024-12-31")
+MONTH_NAMES = np.array(["January", "February", "March", "April", "May", "June", "July",
+                        "August", "September", "October", "November", "December"])
+
+# Flattened lookup tables for vectorized sampling
+_REGIONS = list(REGIONS)
+_COUNTRIES = [c for r in _REGIONS for c in REGIONS[r]]
+_COUNTRY_OFFSET = np.cumsum([0] + [len(REGIONS[r]) for r in _REGIONS])[:-1]
+_COUNTRY_COUNT = np.array([len(REGIONS[r]) for r in _REGIONS])
+_CATEGORIES = list(PRODUCTS)
+_SUBCATEGORIES = [(c, s) for c in _CATEGORIES for s in PRODUCTS[c]]
+# Subcategory names repeat across categories ("Accessories")
+_SUB_NAMES = list(dict.fromkeys(s for _, s in _SUBCATEGORIES))
+_SUB_NAME_CODE = np.array([_SUB_NAMES.index(s) for _, s in _SUBCATEGORIES])
+_SUB_OFFSET = np.cumsum([0] + [len(PRODUCTS[c]) for c in _CATEGORIES])[:-1]
+_SUB_COUNT = np.array([len(PRODUCTS[c]) for c in _CATEGORIES])
+_PRICE_LOW = np.array([PRODUCTS[c][s][0] for c, s in _SUBCATEGORIES], dtype=float)
+_PRICE_HIGH = np.array([PRODUCTS[c][s][1] for c, s in _SUBCATEGORIES], dtype=float)
+_SEGMENT_MULT = np.array([SEGMENT_MULTIPLIERS[s] for s in SEGMENTS])
+_SEASONAL_MULT = np.array([SEASONAL_MULTIPLIERS[m] for m in range(1, 13)])
+_MARGIN_LOW = np.array([PROFIT_MARGINS[c][0] for c in _CATEGORIES])
+_MARGIN_HIGH = np.array([PROFIT_MARGINS[c][1] for c in _CATEGORIES])
+
+
+def generate_chunk(n: int, seed, first_id: int = 1, id_width: int = 5) -> pd.DataFrame:
+    """Generate n transactions with one vectorized pass; ids start at first_id."""
+    rng = np.random.default_rng(seed)
+
+    region = rng.integers(0, len(_REGIONS), n)
+    country = _COUNTRY_OFFSET[region] + (rng.random(n) * _COUNTRY_COUNT[region]).astype(np.int64)
+    category = rng.integers(0, len(_CATEGORIES), n)
+    sub = _SUB_OFFSET[category] + (rng.random(n) * _SUB_COUNT[category]).astype(np.int64)
+    segment = rng.integers(0, len(SEGMENTS), n)
+
+    days = int((END_DATE - START_DATE).astype(int))
+    order_date = START_DATE + rng.integers(0, days + 1, n).astype("timedelta64[D]")
+    year = order_date.astype("datetime64[Y]").astype(int) + 1970
+    month = order_date.astype("datetime64[M]").astype(int) % 12 + 1
+
+    base_price = rng.uniform(_PRICE_LOW[sub], _PRICE_HIGH[sub])
+    # Year over year growth trend
+    year_mult = 1.0 + (year - 2022) * 0.12
+
+    unit_price = np.round(base_price * _SEGMENT_MULT[segment] * 0.4, 2)
+    quantity = np.maximum(1, (rng.exponential(2, n) * _SEASONAL_MULT[month - 1] * year_mult).astype(np.int64))
+    revenue = np.round(unit_price * quantity, 2)
+
+    profit_margin = rng.uniform(_MARGIN_LOW[category], _MARGIN_HIGH[category])
+    cost = np.round(revenue * (1 - profit_margin), 2)
+    profit = np.round(revenue - cost, 2)
+
+    ids = pd.Series(np.arange(first_id, first_id + n)).astype(str).str.zfill(id_width)
+    df = pd.DataFrame({
+        "order_id": "ORD-" + ids,
+        "order_date": order_date,
+        "year": year,
+        "quarter": pd.Categorical.from_codes((month - 1) // 3, ["Q1", "Q2", "Q3", "Q4"]),
+        "month": month,
+        "month_name": pd.Categorical.from_codes(month - 1, MONTH_NAMES),
+        "region": pd.Categorical.from_codes(region, _REGIONS),
+        "country": pd.Categorical.from_codes(country, _COUNTRIES),
+        "category": pd.Categorical.from_codes(category, _CATEGORIES),
+        "subcategory": pd.Categorical.from_codes(_SUB_NAME_CODE[sub], _SUB_NAMES),
+        "customer_segment": pd.Categorical.from_codes(segment, SEGMENTS),
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "revenue": revenue,
+        "cost": cost,
+        "profit": profit,
+        "profit_margin": np.round(profit_margin * 100, 2),
+    })
+    return df.sort_values("order_date", kind="stable").reset_index(drop=True)
+
+
+def generate_dataset(n=10000, seed=42):
+    """Whole dataset as one DataFrame (small sizes only; use write_dataset for large ones)."""
+    return generate_chunk(n, np.random.SeedSequence(seed), id_width=max(5, len(str(n))))
+
+
+def _chunks(rows: int, chunk_size: int, seed: int) -> list[tuple]:
+    """(index, rows, seed, first id) per chunk; seeds depend only on --seed and the chunk index."""
+    count = max(1, -(-rows // chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(count)
+    return [(i, min(chunk_size, rows - i * chunk_size), seeds[i], i * chunk_size + 1) for i in range(count)]
+
+
+def _write_partitioned(task: tuple) -> int:
+    """Worker: generate one chunk and write it as one file per partition."""
+    (index, n, seed, first_id), id_width, output, fmt, partition_by = task
+    df = generate_chunk(n, seed, first_id, id_width)
+    for key, part in df.groupby(partition_by, observed=True, sort=False):
+        key = key if isinstance(key, tuple) else (key,)
+        path = os.path.join(output, *(f"{col}={val}" for col, val in zip(partition_by, key)))
+        os.makedirs(path, exist_ok=True)
+        part = part.drop(columns=partition_by)
+        file = os.path.join(path, f"part-{index:05d}.{fmt}")
+        if fmt == "parquet":
+            pq.write_table(_to_arrow(part), file)
+        else:
+            part.to_csv(file, index=False)
+    return n
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Calendar dates, matching what DuckDB infers from the CSV
+    i = table.schema.get_field_index("order_date")
+    return table.set_column(i, "order_date", table.column(i).cast(pa.date32()))
+
+
+def _generate(task: tuple) -> pd.DataFrame:
+    (_, n, seed, first_id), id_width = task
+    return generate_chunk(n, seed, first_id, id_width)
+
+
+def _ordered(pool, fn, tasks: list, window: int):
+    """Results in task order, with at most `window` chunks generated ahead of the consumer."""
+    if pool is None:
+        yield from map(fn, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(fn, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def write_dataset(output: str, scale_factor: float = 1.0, fmt: str = "csv",
+                  partition_by: list[str] | None = None, chunk_size: int = 1_000_000,
+                  workers: int = 1, seed: int = 42, overwrite: bool = False) -> int:
+    """
+    Generate ROWS_PER_SCALE_FACTOR * scale_factor rows chunk by chunk. Without
+    partition_by, output is a single CSV / Parquet file; with it, a hive-style
+    directory tree (e.g. output/year=2024/part-00000.parquet). An existing
+    file, or a directory that already contains files, is only replaced when
+    overwrite is set.
+    """
+    rows = max(1, int(round(ROWS_PER_SCALE_FACTOR * scale_factor)))
+    id_width = max(5, len(str(rows)))
+    chunks = _chunks(rows, chunk_size, seed)
+    pool = Pool(workers) if workers > 1 and len(chunks) > 1 else None
+    written = 0
+    try:
+        if partition_by:
+            if os.path.isdir(output) and os.listdir(output):
+                if not overwrite:
+                    raise SystemExit(f"{output} is not empty (pass --overwrite to replace it)")
+                shutil.rmtree(output)
+            os.makedirs(output, exist_ok=True)
+            tasks = [(c, id_width, output, fmt, partition_by) for c in chunks]
+            for n in _ordered(pool, _write_partitioned, tasks, window=2 * workers):
+                written += n
+                print(f"  {written:,} / {rows:,} rows")
+            return written
+
+        if os.path.isdir(output):
+            raise SystemExit(f"{output} is a directory")
+        if os.path.exists(output):
+            if not overwrite:
+                raise SystemExit(f"{output} already exists (pass --overwrite to replace it)")
+            os.remove(output)
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        writer = None
+        try:
+            for df in _ordered(pool, _generate, [(c, id_width) for c in chunks], window=2 * workers):
+                if fmt == "parquet":
+                    table = _to_arrow(df)
+                    writer = writer or pq.ParquetWriter(output, table.schema)
+                    writer.write_table(table)
+                else:
+                    df.to_csv(output, index=False, mode="a" if written else "w", header=not written)
+                written += len(df)
+                print(f"  {written:,} / {rows:,} rows")
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale-factor", type=float, default=1.0,
+                        help=f"dataset size in units of {ROWS_PER_SCALE_FACTOR:,} rows (default 1)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--partition-by", default="",
+                        help="comma-separated partition columns, e.g. year or year,region")
+    parser.add_argument("--output", help="output file (or directory when partitioned)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows generated per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="processes generating chunks")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing output file or directory")
+    args = parser.parse_args()
+
+    partition_by = [c.strip() for c in args.partition_by.split(",") if c.strip()]
+    output = args.output or ("data/fact_sales" if partition_by
+                             else f"data/global_retail_sales.{args.format}")
+    start = time.perf_counter()
+    rows = write_dataset(output, args.scale_factor, args.format, partition_by,
+                         args.chunk_size, args.workers, args.seed, args.overwrite)
+    print(f"Dataset generated: {rows:,} records in {time.perf_counter() - start:.1f}s → {output}")
+
 
 if __name__ == "__main__":
-    os.makedirs("data", exist_ok=True)
-    df = generate_dataset(10000)
-    df.to_csv("data/global_retail_sales.csv", index=False)
-    print(f"Dataset generated: {len(df)} records")
-    print(df.describe())
+    main()
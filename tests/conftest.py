@@ -0,0 +1,10 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Tests run against the in-memory star schema built from the bundled CSV,
+# without the result cache so every query really executes
+for var in ("OLAP_DB_PATH", "OLAP_FACT_PARQUET", "OLAP_CSV_PATH", "OLAP_ROLLUP"):
+    os.environ.pop(var, None)
+os.environ["OLAP_DB_CACHE"] = "0"
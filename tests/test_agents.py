@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from backend.agents.cube_operations import CubeOperationsAgent
+from backend.agents.dimension_navigator import DimensionNavigatorAgent
+from backend.agents.kpi_calculator import KPICalculatorAgent
+from backend.db import database as db
+
+LLM_SQL = "SELECT region, ROUND(SUM(revenue), 2) AS revenue FROM fact_sales GROUP BY region ORDER BY region"
+OLAP_QUERY = {"measures": ["revenue"], "group_by": ["region"]}
+
+
+@pytest.fixture
+def broken_compiler(monkeypatch):
+    """Compiled SQL that DuckDB rejects at execution time."""
+    monkeypatch.setattr(db, "compile_olap", lambda q: ("SELECT no_such_column FROM fact_sales", []))
+
+
+def _agent(cls, monkeypatch):
+    agent = cls(provider="replay")
+    calls = []
+
+    def fake_llm(system, user, max_tokens=1500):
+        calls.append(user)
+        return LLM_SQL if len(calls) == 1 else "explanation"
+
+    async def afake_llm(system, user, max_tokens=1500):
+        return fake_llm(system, user, max_tokens)
+
+    monkeypatch.setattr(agent, "_call_llm", fake_llm)
+    monkeypatch.setattr(agent, "_acall_llm", afake_llm)
+    return agent, calls
+
+
+@pytest.mark.parametrize("cls", [CubeOperationsAgent, DimensionNavigatorAgent, KPICalculatorAgent])
+def test_failing_compiled_sql_falls_back_to_llm_sql(cls, monkeypatch, broken_compiler):
+    agent, calls = _agent(cls, monkeypatch)
+    result = agent.run("Revenue by region", olap_query=OLAP_QUERY)
+    assert result["error"] is None
+    assert result["sql"] == LLM_SQL
+    assert result["row_count"] == 4
+
+    calls.clear()
+    result = asyncio.run(agent.arun("Revenue by region", olap_query=OLAP_QUERY))
+    assert result["error"] is None
+    assert result["sql"] == LLM_SQL
+
+
+@pytest.mark.parametrize("cls", [CubeOperationsAgent, DimensionNavigatorAgent, KPICalculatorAgent])
+def test_compiled_sql_skips_llm_sql(cls, monkeypatch):
+    agent, calls = _agent(cls, monkeypatch)
+    result = agent.run("Revenue by region", olap_query=OLAP_QUERY)
+    assert result["error"] is None
+    assert result["row_count"] == 4
+    assert all("Generate the SQL" not in user for user in calls)
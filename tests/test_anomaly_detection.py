@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from backend.agents.anomaly_detection import AnomalyDetectionAgent, detect_anomalies
+
+
+def _cube(revenue: dict[str, list[float]]) -> pd.DataFrame:
+    """year × quarter series per region, profit at 20% of revenue."""
+    rows = []
+    for region, values in revenue.items():
+        for i, value in enumerate(values):
+            rows.append({"year": 2022 + i // 4, "quarter": f"Q{i % 4 + 1}", "region": region,
+                         "total_revenue": value, "total_profit": value * 0.2, "avg_margin": 20.0})
+    return pd.DataFrame(rows)
+
+
+def _find(anomalies, kind, dimension):
+    return [a for a in anomalies if a["type"] == kind and a["dimension"] == dimension]
+
+
+def test_flags_outliers_drops_and_spikes_within_a_series():
+    flat = [100.0] * 12
+    df = _cube({"Europe": flat[:6] + [400.0] + flat[7:], "Asia": flat[:9] + [50.0] + flat[10:]})
+    anomalies = detect_anomalies(df)
+
+    spike = "year=2023, quarter=Q3, region=Europe"
+    assert _find(anomalies, "outlier", spike)
+    assert _find(anomalies, "spike", spike)
+    assert _find(anomalies, "drop", "year=2024, quarter=Q2, region=Asia")
+    assert _find(anomalies, "spike", "year=2024, quarter=Q3, region=Asia")
+    assert not [a for a in anomalies if a["type"] != "underperformer" and "Q1" in a["dimension"]]
+
+
+def test_negative_margins_are_reported():
+    df = _cube({"Europe": [100.0] * 8})
+    df.loc[3, "avg_margin"] = -5.0
+    found = [a for a in detect_anomalies(df) if a["type"] == "negative_margin"]
+    assert [a["dimension"] for a in found] == ["year=2022, quarter=Q4, region=Europe"]
+    assert found[0]["severity"] == "high"
+
+
+def test_results_are_ranked_and_capped_at_top_k():
+    rng = np.random.default_rng(0)
+    df = _cube({f"r{i}": list(rng.normal(100, 30, 12)) for i in range(50)})
+    anomalies = detect_anomalies(df, top_k=7)
+    assert len(anomalies) == 7
+    scores = [a["score"] for a in anomalies]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_shapes_without_anomalies():
+    assert detect_anomalies(pd.DataFrame()) == []
+    assert detect_anomalies(pd.DataFrame({"region": ["Europe", "Asia"]})) == []
+    assert detect_anomalies(_cube({"Europe": [100.0] * 8})) == []
+
+
+def test_agent_detects_over_the_full_cube_without_the_llm(monkeypatch):
+    agent = AnomalyDetectionAgent()
+
+    def no_llm(*args, **kwargs):
+        raise AssertionError("LLM called")
+
+    monkeypatch.setattr(agent, "_call_llm", no_llm)
+    result = agent.run("Find anomalies")
+    assert result["error"] is None
+    assert result["anomalies"]
+    assert result["summary"].startswith(f"Found {len(result['anomalies'])} notable anomalies across")
+
+
+def test_month_names_are_ordered_by_calendar_not_alphabet():
+    months = ["January", "February", "March", "April", "May", "June"]
+    df = pd.DataFrame({"year": 2024, "month_name": months * 2, "region": ["Europe"] * 6 + ["Asia"] * 6,
+                       "total_revenue": [100.0, 100.0, 100.0, 200.0, 200.0, 200.0] + [100.0] * 6})
+    df = df.sort_values(["region", "month_name"])  # alphabetical: April, February, ...
+    changes = [a for a in detect_anomalies(df) if a["type"] in ("drop", "spike")]
+    assert [(a["type"], a["dimension"]) for a in changes] == \
+        [("spike", "year=2024, month_name=April, region=Europe")]
+
+
+def test_input_row_order_does_not_change_the_result():
+    rng = np.random.default_rng(1)
+    df = _cube({f"r{i}": list(rng.normal(100, 30, 12)) for i in range(20)})
+    shuffled = df.sample(frac=1, random_state=2).reset_index(drop=True)
+    assert detect_anomalies(shuffled) == detect_anomalies(df)
@@ -0,0 +1,62 @@
+import json
+import pandas as pd
+from backend.agents.context import estimate_tokens, get_prompt_stats, record_prompt, summarize_context
+from backend.agents.kpi_calculator import KPICalculatorAgent
+from backend.db.result import QueryResult
+
+SQL = ("SELECT year, month_name, country, ROUND(SUM(revenue), 2) AS revenue FROM fact_sales\n"
+       "WHERE year = ? AND region IN ('Europe', 'Asia Pacific')\nGROUP BY year, month_name, country")
+
+
+def _drill_down(rows: int = 2000) -> dict:
+    df = pd.DataFrame({
+        "year": [2024] * rows,
+        "month_name": [f"m{i % 12}" for i in range(rows)],
+        "country": [f"country {i % 150}" for i in range(rows)],
+        "revenue": [float(i) for i in range(rows)],
+    })
+    return {"agent": "Dimension Navigator", "operation": "drill_down", "sql": SQL, "params": [2024],
+            "data": QueryResult.from_pandas(df), "explanation": "x" * 5000}
+
+
+def test_digest_of_a_large_result_fits_the_budget():
+    context = _drill_down()
+    text = summarize_context(context, budget=800)
+    assert estimate_tokens(text) <= 800
+    assert len(text) < len(str(context["data"].to_records())) / 50
+
+    digest = json.loads(text)
+    assert digest["row_count"] == 2000
+    assert digest["operation"] == "drill_down"
+    assert set(digest["schema"]) == {"year", "month_name", "country", "revenue"}
+    assert digest["stats"]["revenue"]["sum"] == sum(range(2000))
+
+
+def test_digest_lists_applied_filters():
+    digest = json.loads(summarize_context(_drill_down(rows=5)))
+    assert digest["filters"] == ["year = ? AND region IN ('Europe', 'Asia Pacific')", "params=[2024]"]
+    assert len(digest["top_rows"]) == 5
+
+    nested = "SELECT * FROM (SELECT * FROM fact_sales WHERE quarter IN (?, ?)) t WHERE revenue > 0 LIMIT 5"
+    digest = json.loads(summarize_context({**_drill_down(rows=5), "sql": nested, "params": None}))
+    assert digest["filters"] == ["quarter IN (?, ?)", "revenue > 0"]
+
+
+def test_no_context_gives_no_digest():
+    assert summarize_context(None) == ""
+    assert summarize_context({}) == ""
+
+
+def test_agents_prompt_with_the_digest_not_the_full_result():
+    request = KPICalculatorAgent()._sql_request("Rank the countries", "ranking", _drill_down())
+    assert "country 149" not in request
+    assert estimate_tokens(request) < 900
+
+
+def test_prompt_sizes_are_recorded_per_agent():
+    before = get_prompt_stats().get("Test Agent", {"calls": 0, "tokens": 0})
+    record_prompt("Test Agent", "s" * 400, "u" * 400)
+    stats = get_prompt_stats()["Test Agent"]
+    assert stats["calls"] == before["calls"] + 1
+    assert stats["tokens"] == before["tokens"] + 200
+    assert stats["max_tokens"] >= 200
@@ -0,0 +1,95 @@
+import asyncio
+import httpx
+import pytest
+from backend.api import jobs, main
+
+
+def _result(query: str) -> dict:
+    return {"query": query, "plan": {}, "final_data": [{"x": 1}], "final_columns": ["x"],
+            "report": None, "viz_config": None, "agent_results": {}, "error": None}
+
+
+class GatedRunner:
+    """Planner stand-in: emits the plan, then waits until the test opens the gate."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+
+    async def __call__(self, job, emit):
+        emit(("plan", {"agents": ["kpi_calculator"]}))
+        await self.gate.wait()
+        if job["query"] == "fail":
+            raise RuntimeError("boom")
+        return _result(job["query"])
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    """One worker and one queue slot behind the API, running GatedRunner."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    gated = GatedRunner()
+    monkeypatch.setattr(main, "_jobs", jobs.JobQueue(gated, workers=1, max_queued=1))
+    return gated
+
+
+def test_full_queue_is_rejected_with_429(runner):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"query": "Revenue by region", "provider": "openai"}
+            running = await client.post("/jobs", json=body)
+            await asyncio.sleep(0.01)  # the single worker picks it up
+            queued = await client.post("/jobs", json=body)
+            rejected = await client.post("/jobs", json=body)
+            runner.gate.set()
+            return running, queued, rejected
+
+    running, queued, rejected = asyncio.run(scenario())
+    assert (running.status_code, queued.status_code) == (202, 202)
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "5"
+
+
+def test_job_reports_partial_results_then_the_full_payload(runner):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            job_id = (await client.post("/jobs", json={"query": "Revenue", "provider": "openai"})).json()["id"]
+            await asyncio.sleep(0.01)
+            running = (await client.get(f"/jobs/{job_id}")).json()
+            runner.gate.set()
+            await asyncio.sleep(0.01)
+            return running, (await client.get(f"/jobs/{job_id}")).json()
+
+    running, done = asyncio.run(scenario())
+    assert running["status"] == "running"
+    assert running["partial"] == {"plan": {"agents": ["kpi_calculator"]}}
+    assert running["result"] is None
+    assert done["status"] == "done"
+    assert done["result"]["final_data"] == [{"x": 1}]
+    assert done["finished_at"] >= done["started_at"] >= done["created_at"]
+
+
+def test_failed_and_unknown_jobs(runner):
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            job_id = (await client.post("/jobs", json={"query": "fail", "provider": "openai"})).json()["id"]
+            runner.gate.set()
+            await asyncio.sleep(0.01)
+            return (await client.get(f"/jobs/{job_id}")).json(), await client.get("/jobs/nope")
+
+    failed, unknown = asyncio.run(scenario())
+    assert (failed["status"], failed["error"]) == ("failed", "boom")
+    assert unknown.status_code == 404
+
+
+def test_finished_jobs_expire():
+    async def scenario():
+        q = jobs.JobQueue(lambda job, emit: asyncio.sleep(0, _result(job["query"])), ttl=0)
+        job = q.submit("Revenue", "openai", [])
+        await asyncio.sleep(0.01)
+        assert job["status"] == "done"
+        return q.get(job["id"])
+
+    assert asyncio.run(scenario()) is None
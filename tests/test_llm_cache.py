@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import pytest
+from backend.agents import llm_cache
+from backend.agents.base import BaseAgent
+from backend.agents.llm_cache import LLMCache, MemoryStore, SQLiteStore, cache_key
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStore(max_entries=2)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.get("a", ttl=60)
+    store.set("c", "3")
+    assert store.get("b", ttl=60) is None
+    assert store.get("a", ttl=60) == "1"
+    assert store.evictions == 1
+
+
+def test_memory_store_is_bounded_by_payload_bytes():
+    store = MemoryStore(max_entries=100, max_bytes=10)
+    for key in "abc":
+        store.set(key, "xxxx")
+    assert len(store) == 2
+    assert store.bytes == 8
+
+
+def test_expired_entries_miss():
+    store = MemoryStore()
+    store.set("a", "1", created=time.time() - 10)
+    assert store.get("a", ttl=5) is None
+    assert len(store) == 0
+
+
+def test_prompts_differing_only_in_whitespace_and_case_share_a_key():
+    key = cache_key("groq", "m", "system", "Revenue  by\nRegion", 100)
+    assert key == cache_key("groq", "m", "system", "revenue by region", 100)
+    assert key != cache_key("groq", "m", "system", "revenue by region", 200)
+    assert key != cache_key("groq", "m", "other system", "revenue by region", 100)
+
+
+def test_disk_tier_outlives_the_process_cache(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    LLMCache(disk=SQLiteStore(path)).set("k", "cached")
+
+    cache = LLMCache(disk=SQLiteStore(path))
+    assert cache.get("k") == "cached"
+    assert cache.stats()["disk_hits"] == 1
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.delenv("OLAP_LLM_CACHE", raising=False)
+    cache = LLMCache()
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    return cache
+
+
+def test_call_llm_only_requests_on_a_miss(monkeypatch, fresh_cache):
+    agent = BaseAgent(provider="groq")
+    requests = []
+
+    def fake_request(system, user, max_tokens):
+        requests.append(user)
+        return "SELECT 1"
+
+    monkeypatch.setattr(agent, "_request_llm", fake_request)
+    assert agent._call_llm("system", "Revenue by region") == "SELECT 1"
+    assert agent._call_llm("system", "  revenue BY region ") == "SELECT 1"
+    assert len(requests) == 1
+    assert fresh_cache.stats()["hits"] == 1
+
+
+def test_empty_responses_are_not_cached(monkeypatch, fresh_cache):
+    agent = BaseAgent(provider="groq")
+    monkeypatch.setattr(agent, "_request_llm", lambda system, user, max_tokens: "")
+    agent._call_llm("system", "Revenue by region")
+    assert fresh_cache.stats()["stores"] == 0
+
+
+def test_async_calls_use_the_disk_tier_off_the_event_loop(monkeypatch, tmp_path):
+    cache = LLMCache(disk=SQLiteStore(str(tmp_path / "llm_cache.sqlite")))
+    monkeypatch.delenv("OLAP_LLM_CACHE", raising=False)
+    monkeypatch.setattr(llm_cache, "_cache", cache)
+    threads = []
+    for name in ("get", "set"):
+        def traced(*args, _call=getattr(SQLiteStore, name)):
+            threads.append(threading.current_thread())
+            return _call(cache.disk, *args)
+        monkeypatch.setattr(cache.disk, name, traced)
+
+    agent = BaseAgent(provider="groq")
+
+    async def fake_request(system, user, max_tokens):
+        return "SELECT 1"
+
+    monkeypatch.setattr(agent, "_arequest_llm", fake_request)
+    assert asyncio.run(agent._acall_llm("system", "Revenue by region")) == "SELECT 1"
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
@@ -0,0 +1,27 @@
+import asyncio
+from backend.agents import llm_clients
+
+
+async def _client():
+    return llm_clients.get_client("replay", asynchronous=True)
+
+
+def test_async_clients_are_shared_within_a_loop():
+    async def twice():
+        return await _client(), await _client()
+
+    first, second = asyncio.run(twice())
+    assert first is second
+
+
+def test_async_clients_are_not_reused_or_kept_across_loops():
+    clients = [asyncio.run(_client()) for _ in range(5)]
+    assert len({id(c) for c in clients}) == 5
+
+    async def registered_loops():
+        await _client()
+        return list(llm_clients._loop_clients), asyncio.get_running_loop()
+
+    loops, current = asyncio.run(registered_loops())
+    # Clients of the closed loops were dropped on this lookup
+    assert loops == [current]
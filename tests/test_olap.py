@@ -0,0 +1,117 @@
+import pandas as pd
+import pytest
+from backend.agents import router
+from backend.db import database as db
+from backend.db.olap import OlapQuery, compile_query
+
+
+def _run(q: OlapQuery, use_rollup: bool) -> pd.DataFrame:
+    sql, params = compile_query(q, use_rollup=use_rollup)
+    return db.query(sql, params)
+
+
+def _raw(sql: str) -> pd.DataFrame:
+    with db.get_pool().cursor() as cur:
+        return cur.execute(sql).df()
+
+
+@pytest.mark.parametrize("query, compare", [
+    ("Compare Q4 2023 vs 2024 revenue by region", "yoy"),
+    ("Month over month revenue change in Q4 2024 by region", "mom"),
+])
+def test_routed_comparison_with_quarter_filter(query, compare):
+    plan = router.route(query, None)
+    assert plan and plan["olap_query"]["compare"] == compare
+    assert plan["olap_query"]["filters"]["quarter"] == ["Q4"]
+
+    df = db.query(*db.compile_olap(plan["olap_query"]))
+    out_col = "yoy_growth_pct" if compare == "yoy" else "mom_change_pct"
+    assert len(df) > 0
+    # Every shown period has its preceding period, even the first one
+    assert df[out_col].notna().all()
+
+
+def test_yoy_with_quarter_filter_matches_raw():
+    q = OlapQuery(measures=["revenue"], group_by=["region"],
+                  filters={"year": [2023, 2024], "quarter": ["Q4"]}, compare="yoy")
+    df = _run(q, use_rollup=True).sort_values(["region", "year"]).reset_index(drop=True)
+
+    raw = _raw("SELECT region, year, SUM(revenue) AS revenue FROM fact_sales "
+               "WHERE quarter = 'Q4' GROUP BY region, year ORDER BY region, year")
+    raw["yoy"] = raw.groupby("region")["revenue"].pct_change() * 100
+    raw = raw[raw["year"].isin([2023, 2024])].reset_index(drop=True)
+
+    assert list(df["region"]) == list(raw["region"])
+    assert df["revenue"].tolist() == pytest.approx(raw["revenue"].round(2).tolist())
+    assert df["yoy_growth_pct"].tolist() == pytest.approx(raw["yoy"].tolist(), abs=0.01)
+
+
+def test_mom_with_quarter_filter_compares_against_previous_month():
+    q = OlapQuery(measures=["revenue"], filters={"year": [2024], "quarter": ["Q4"]}, compare="mom")
+    df = _run(q, use_rollup=True)
+    assert df["month"].tolist() == [10, 11, 12]
+
+    raw = _raw("SELECT month, SUM(revenue) AS revenue FROM fact_sales "
+               "WHERE year = 2024 GROUP BY month ORDER BY month")
+    expected = (raw["revenue"].pct_change() * 100).iloc[9:].tolist()
+    assert df["mom_change_pct"].tolist() == pytest.approx(expected, abs=0.01)
+
+
+def test_ranked_yoy_keeps_top_n_of_the_latest_year():
+    q = OlapQuery(measures=["revenue"], group_by=["country"], compare="yoy",
+                  order_by="yoy_growth_pct", top_n=5)
+    df = _run(q, use_rollup=True)
+
+    raw = _raw("SELECT country, year, SUM(revenue) AS revenue FROM fact_sales "
+               "GROUP BY country, year ORDER BY country, year")
+    raw["yoy"] = raw.groupby("country")["revenue"].pct_change() * 100
+    top = raw[raw["year"] == raw["year"].max()].nlargest(5, "yoy")
+
+    assert df["country"].tolist() == top["country"].tolist()
+    assert df["yoy_growth_pct"].tolist() == pytest.approx(top["yoy"].tolist(), abs=0.01)
+    assert list(df.columns) == ["country", "year", "revenue", "yoy_growth_pct"]
+
+
+@pytest.mark.parametrize("q, group_by", [
+    (OlapQuery(measures=["revenue"], group_by=["quarter", "region"]), ["year", "quarter", "region"]),
+    (OlapQuery(measures=["revenue"], group_by=["region"], pivot="quarter",
+               pivot_values=["Q1", "Q2", "Q3", "Q4"]), ["region", "year"]),
+    (OlapQuery(measures=["revenue"], group_by=["month_name"], filters={"year": [2024]}), ["month_name"]),
+    (OlapQuery(measures=["revenue"], group_by=["quarter"], pivot="year", pivot_values=[2023, 2024]),
+     ["quarter"]),
+])
+def test_quarters_and_months_are_grouped_within_their_year(q, group_by):
+    df = _run(q, use_rollup=True)
+    assert [c for c in df.columns if c in ("year", "quarter", "month_name", "region")] == group_by
+    assert not df.duplicated(group_by).any()
+
+
+@pytest.mark.parametrize("q", [
+    OlapQuery(measures=["revenue", "profit"], group_by=["region"], filters={"year": [2024]}),
+    OlapQuery(measures=["margin_pct", "orders"], group_by=["category", "subcategory"]),
+    OlapQuery(measures=["profit"], group_by=["country"], top_n=5),
+    OlapQuery(measures=["revenue"], group_by=["region"], pivot="year", pivot_values=[2022, 2023, 2024]),
+    OlapQuery(measures=["revenue"], group_by=["month_name"], filters={"year": [2024]}),
+    OlapQuery(measures=["quantity"], group_by=["customer_segment"], compare="yoy"),
+    OlapQuery(measures=["revenue"], group_by=["category"], filters={"region": ["Europe"]}, compare="mom"),
+    OlapQuery(measures=["revenue"], group_by=["region"], compare="mom", order_by="mom_change_pct",
+              descending=False, top_n=2),
+])
+def test_rollup_and_fact_table_compile_to_same_result(q):
+    pd.testing.assert_frame_equal(_run(q, use_rollup=True), _run(q, use_rollup=False), check_dtype=False)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"measures": ["nope"]},
+    {"group_by": ["order_id"]},
+    {"compare": "wow"},
+    {"pivot": "year"},
+    {"top_n": 0},
+    {"order_by": "yoy_growth_pct"},
+    {"compare": "mom", "order_by": "yoy_growth_pct"},
+    {"filters": {"region": []}},
+    {"group_by": ["region"], "pivot": "year", "pivot_values": [2024], "order_by": "revenue"},
+])
+def test_invalid_queries_raise_value_error(kwargs):
+    with pytest.raises(ValueError):
+        compile_query(OlapQuery(**kwargs))
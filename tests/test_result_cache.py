@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+from backend.db import database as db
+from backend.db import result_cache
+from backend.db.result_cache import ResultCache, normalize_sql
+
+SQL = "SELECT region, ROUND(SUM(revenue), 2) AS revenue FROM fact_sales GROUP BY region ORDER BY region"
+
+
+def test_normalization_ignores_whitespace_case_and_comments_outside_literals():
+    assert normalize_sql("SELECT  a\n FROM t -- note\n WHERE b = 'X  Y';") == "select a from t where b = 'X  Y'"
+    assert normalize_sql('SELECT "Mixed Case" FROM t /* c */') == 'select "Mixed Case" from t'
+
+
+@pytest.mark.parametrize("sql", [
+    "INSERT INTO t VALUES (1)",
+    "CREATE TABLE t AS SELECT 1",
+    "SELECT random()",
+    "SELECT * FROM read_csv('data.csv')",
+    "SELECT current_date",
+])
+def test_writes_and_volatile_statements_are_not_cached(sql):
+    assert ResultCache().key("df", sql, None) is None
+
+
+def test_function_names_inside_literals_do_not_block_caching():
+    assert ResultCache().key("df", "SELECT * FROM t WHERE note = 'random()'", None) is not None
+
+
+def test_params_are_part_of_the_key():
+    cache = ResultCache()
+    assert cache.key("df", "SELECT ?", [1]) != cache.key("df", "SELECT ?", [2])
+
+
+def test_memory_is_bounded_by_result_bytes():
+    frame = pd.DataFrame({"x": range(1000)})
+    size = int(frame.memory_usage(index=True, deep=True).sum())
+    cache = ResultCache(max_bytes=size * 2, max_entry_bytes=size)
+    for i in range(3):
+        cache.set(cache.key("df", f"SELECT {i}", None), frame, f"SELECT {i}")
+    assert cache.get(cache.key("df", "SELECT 0", None)) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == size * 2
+
+    cache.set(cache.key("df", "SELECT 9", None), pd.concat([frame, frame]), "SELECT 9")
+    assert cache.stats()["skipped"] == 1
+
+
+def test_new_data_version_drops_results_and_late_stores():
+    cache = ResultCache()
+    key = cache.key("df", "SELECT 1", None)
+    cache.set(key, pd.DataFrame({"x": [1]}), "SELECT 1")
+    cache.bump_version()
+    assert cache.get(cache.key("df", "SELECT 1", None)) is None
+    cache.set(key, pd.DataFrame({"x": [1]}), "SELECT 1")
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    db.get_connection()  # loading the schema bumps the data version
+    monkeypatch.setenv("OLAP_DB_CACHE", "1")
+    fresh = ResultCache()
+    monkeypatch.setattr(result_cache, "_cache", fresh)
+    return fresh
+
+
+def test_repeated_queries_are_served_from_the_cache(cache):
+    first = db.query_arrow(SQL)
+    second = db.query_arrow(SQL.lower().replace(" ", "  "))
+    assert cache.stats()["hits"] == 1
+    assert second.to_pandas().equals(first.to_pandas())
+
+
+def test_case_only_variants_keep_their_own_column_names(cache):
+    db.query("SELECT region AS Region FROM fact_sales GROUP BY region ORDER BY region")
+    df = db.query("SELECT region AS REGION FROM fact_sales GROUP BY region ORDER BY region")
+    assert cache.stats()["hits"] == 1
+    assert list(df.columns) == ["REGION"]
+
+
+def test_writes_invalidate_cached_results(cache):
+    db.query("CREATE OR REPLACE TEMP TABLE cache_probe AS SELECT 1 AS x")
+    assert db.query("SELECT SUM(x) AS x FROM cache_probe")["x"][0] == 1
+    db.query("INSERT INTO cache_probe VALUES (2)")
+    assert db.query("SELECT SUM(x) AS x FROM cache_probe")["x"][0] == 3
+    db.query("DROP TABLE cache_probe")
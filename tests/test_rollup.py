@@ -0,0 +1,135 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+from backend.db import database as db
+from backend.db import rollup
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _raw(sql: str) -> pd.DataFrame:
+    with db.get_pool().cursor() as cur:
+        return cur.execute(sql).df()
+
+
+def _assert_same_as_raw(sql: str):
+    """The rollup rewrite must return exactly what fact_sales returns."""
+    rewritten = rollup.rewrite(sql)
+    assert rewritten is not None, "expected the query to be rewritten"
+    with db.get_pool().cursor() as cur:
+        expected = cur.execute(sql).df()
+        actual = cur.execute(rewritten).df()
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-9)
+
+
+EQUIVALENT = [
+    "SELECT region, SUM(revenue) AS revenue FROM fact_sales GROUP BY region ORDER BY region",
+    "SELECT year, quarter, ROUND(SUM(profit), 2) AS p, COUNT(*) AS n FROM fact_sales "
+    "GROUP BY year, quarter ORDER BY year, quarter",
+    "SELECT category, AVG(profit_margin) AS m FROM fact_sales WHERE region = 'Europe' "
+    "GROUP BY category ORDER BY category",
+    "SELECT COUNT(*) AS n, COUNT(1) AS one, COUNT(order_id) AS ids FROM fact_sales",
+    "SELECT COUNT(*) AS n FROM fact_sales WHERE country IS NULL",
+    "SELECT SUM(revenue) AS r, COUNT(*) AS n FROM fact_sales WHERE year = 1999",
+    "SELECT region, COUNT(DISTINCT country) AS countries, MIN(country) AS first_country, "
+    "MAX(country) AS last_country FROM fact_sales GROUP BY region ORDER BY region",
+    "SELECT region, SUM(CASE WHEN year = 2024 THEN revenue ELSE 0 END) AS r24 FROM fact_sales "
+    "GROUP BY region ORDER BY region",
+    "SELECT f.customer_segment, SUM(f.revenue - f.cost) AS gross FROM fact_sales f "
+    "GROUP BY f.customer_segment ORDER BY gross DESC",
+    "SELECT month_name, SUM(quantity) AS units FROM fact_sales WHERE year = 2023 "
+    "GROUP BY month, month_name ORDER BY month",
+    "SELECT region, COUNT(*) AS n FROM fact_sales GROUP BY region HAVING COUNT(*) > 0 ORDER BY n DESC",
+]
+
+
+@pytest.mark.parametrize("sql", EQUIVALENT)
+def test_rewrite_matches_fact_table(sql):
+    _assert_same_as_raw(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT region, LIST(country) AS countries FROM fact_sales GROUP BY region",
+    "SELECT region, MEDIAN(year) AS y FROM fact_sales GROUP BY region",
+    "SELECT region, MODE(category) AS c FROM fact_sales GROUP BY region",
+    "SELECT region, STRING_AGG(country, ',') AS c FROM fact_sales GROUP BY region",
+    "SELECT region, COUNT(country) AS n FROM fact_sales GROUP BY region",
+    "SELECT region, MAX(revenue) AS r FROM fact_sales GROUP BY region",
+    "SELECT region, COUNT(*) FILTER (WHERE year = 2024) AS n FROM fact_sales GROUP BY region",
+])
+def test_cell_sensitive_aggregates_are_not_rewritten(sql):
+    assert rollup.rewrite(sql) is None
+
+
+def test_count_on_empty_input_is_zero():
+    rewritten = rollup.rewrite("SELECT COUNT(*) AS n FROM fact_sales WHERE country IS NULL")
+    with db.get_pool().cursor() as cur:
+        assert cur.execute(rewritten).fetchone()[0] == 0
+
+
+def test_cube_not_built_when_rewriting_disabled():
+    script = (
+        "from backend.db import database as db\n"
+        "n = db.query(\"SELECT COUNT(*) AS n FROM information_schema.tables "
+        "WHERE table_name = 'agg_sales_rollup'\")['n'][0]\n"
+        "print('cube tables:', n)\n"
+    )
+    env = {**os.environ, "OLAP_ROLLUP": "0"}
+    out = subprocess.run([sys.executable, "-c", script], env=env, cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    assert "cube tables: 0" in out
+
+
+@pytest.fixture
+def fresh_db():
+    """A private star schema for tests that write; rebuilt for later tests."""
+    def reset():
+        if db._conn is not None:
+            db._conn.close()
+        db._conn = db._pool = None
+        db._rollup_failed = False
+
+    reset()
+    yield
+    reset()
+
+
+def _counts_match_raw():
+    for sql in [
+        "SELECT COUNT(*) AS n FROM fact_sales",
+        "SELECT year, COUNT(*) AS n, ROUND(SUM(revenue), 2) AS r FROM fact_sales GROUP BY year ORDER BY year",
+    ]:
+        assert rollup.rewrite(sql) is not None
+        pd.testing.assert_frame_equal(db.query(sql), _raw(sql), check_dtype=False)
+
+
+def test_cube_follows_writes_through_query(fresh_db):
+    db.query("DELETE FROM fact_sales WHERE year = 2022")
+    assert db.query("SELECT COUNT(*) AS n FROM fact_sales")["n"][0] == _raw(
+        "SELECT COUNT(*) AS n FROM fact_sales")["n"][0]
+    assert 2022 not in db.query("SELECT year FROM fact_sales GROUP BY year")["year"].tolist()
+    _counts_match_raw()
+
+
+def test_cube_follows_writes_through_reader(fresh_db):
+    cur, reader = db.open_reader("UPDATE fact_sales SET revenue = revenue * 2 WHERE region = 'Europe'")
+    reader.read_all()
+    db.close_reader(cur)
+    _counts_match_raw()
+    sql = "SELECT region, ROUND(SUM(revenue), 2) AS r FROM fact_sales GROUP BY region ORDER BY region"
+    pd.testing.assert_frame_equal(db.query(sql), _raw(sql), check_dtype=False)
+
+
+def test_rewriting_pauses_while_cube_cannot_be_rebuilt(fresh_db):
+    db.query("ALTER TABLE fact_sales RENAME TO fact_sales_old")
+    assert not db._rollup_active()
+    db.query("CREATE TABLE fact_sales AS SELECT * FROM fact_sales_old WHERE year = 2024")
+    assert db._rollup_active()
+    _counts_match_raw()
+
+    db.query("ALTER TABLE fact_sales DROP COLUMN customer_segment")
+    assert not db._rollup_active()
+    sql = "SELECT COUNT(*) AS n FROM fact_sales"
+    pd.testing.assert_frame_equal(db.query(sql), _raw(sql), check_dtype=False)
@@ -0,0 +1,75 @@
+import pytest
+from backend.agents import router
+
+HISTORY = [{"role": "user", "content": "Show 2024 revenue by region"}]
+
+
+@pytest.mark.parametrize("query, operation, agent", [
+    ("Show only Q4 2024 sales", "slice_dice", "cube_operations"),
+    ("Break down 2024 revenue by quarter", "drill_down", "dimension_navigator"),
+    ("Roll up monthly sales to quarterly totals by region", "roll_up", "dimension_navigator"),
+    ("Compare 2023 vs 2024 revenue by region", "yoy_growth", "kpi_calculator"),
+    ("Month over month revenue change by region", "mom_change", "kpi_calculator"),
+    ("Top 5 countries by profit in 2024", "ranking", "kpi_calculator"),
+    ("Which category has the highest profit margin?", "profit_margin", "kpi_calculator"),
+    ("Show revenue by region as columns, with years as rows", "pivot", "cube_operations"),
+    ("Find unusual patterns or anomalies in our sales data", "anomaly", "anomaly_detection"),
+])
+def test_common_shapes_take_the_fast_path(query, operation, agent):
+    plan = router.route(query)
+    assert plan is not None
+    assert plan["operation"] == operation
+    assert plan["primary_agent"] == agent
+    assert plan["agents"] == [agent, "visualization", "report_generator"]
+    assert plan["routed_by"] == "rules"
+
+
+def test_parameters_are_extracted():
+    plan = router.classify("Show Electronics sales in Europe for 2024")
+    assert plan["parameters"]["filters"] == {"year": [2024], "region": ["Europe"], "category": ["Electronics"]}
+
+    params = router.classify("Top 5 countries by profit in Q4 2024")["parameters"]
+    assert params["filters"] == {"year": [2024], "quarter": ["Q4"]}
+    assert params["metric"] == "profit"
+    assert params["top_n"] == 5
+
+
+def test_quarters_and_months_are_grouped_within_their_year():
+    plan = router.route("Roll up monthly sales to quarterly totals by region")
+    assert plan["olap_query"]["group_by"] == ["year", "quarter", "region"]
+    # A single pinned year needs no year level
+    assert router.classify("Break down 2024 revenue by quarter")["parameters"]["groupby"] == ["quarter"]
+
+
+def test_ranked_comparisons_keep_top_n_and_order():
+    plan = router.route("Top 5 countries by YoY growth")
+    assert plan["olap_query"] == {
+        "filters": {}, "measures": ["revenue"], "group_by": ["country"], "compare": "yoy",
+        "order_by": "yoy_growth_pct", "descending": True, "top_n": 5,
+    }
+    olap = router.route("Bottom 3 regions by month over month profit change")["olap_query"]
+    assert (olap["order_by"], olap["descending"], olap["top_n"]) == ("mom_change_pct", False, 3)
+
+
+@pytest.mark.parametrize("query", [
+    "Hello there",
+    "Break down Q4 sales by region, then drill into the top performer by month",
+])
+def test_unmatched_or_multi_step_queries_defer_to_the_llm(query):
+    assert router.route(query) is None
+
+
+def test_follow_ups_that_lean_on_history_defer_to_the_llm():
+    query = "Filter to Europe instead"
+    assert router.route(query) is not None
+    assert router.route(query, HISTORY) is None
+
+
+def test_stats_count_fast_path_and_llm_decisions():
+    before = router.get_stats()
+    router.route("Show only Q4 2024 sales")
+    router.route("Hello there")
+    after = router.get_stats()
+    assert after["fast_path"] == before["fast_path"] + 1
+    assert after["llm"] == before["llm"] + 1
+    assert after["by_operation"]["slice_dice"] >= 1
@@ -0,0 +1,74 @@
+import asyncio
+import httpx
+import pytest
+from backend.api import main
+
+
+class SlowPlanner:
+    """Stands in for Planner.aexecute; counts runs and takes a moment to answer."""
+
+    def __init__(self):
+        self.runs = []
+
+    async def aexecute(self, query, history=None, **kwargs):
+        self.runs.append(query)
+        await asyncio.sleep(0.05)
+        return {"query": query, "plan": {}, "final_data": [{"n": len(self.runs)}], "final_columns": ["n"],
+                "report": None, "viz_config": None, "agent_results": {}, "error": None}
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    fake = SlowPlanner()
+    monkeypatch.setitem(main._planners, "openai", fake)
+    return fake
+
+
+def _post_all(bodies: list[dict]) -> list[dict]:
+    async def burst():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(client.post("/query", json=b) for b in bodies))
+        return [r.json() for r in responses]
+
+    return asyncio.run(burst())
+
+
+def test_identical_concurrent_queries_share_one_run(planner):
+    queries = ["Revenue by region", "revenue  BY region", "Revenue by region"]
+    responses = _post_all([{"query": q, "provider": "openai"} for q in queries])
+    assert len(planner.runs) == 1
+    assert sorted(r["coalesced"] for r in responses) == [False, True, True]
+    assert all(r["final_data"] == [{"n": 1}] for r in responses)
+    assert main._inflight == {}
+
+
+def test_different_queries_or_history_run_separately(planner):
+    history = [{"role": "user", "content": "Show 2024 revenue"}]
+    _post_all([
+        {"query": "Revenue by region", "provider": "openai"},
+        {"query": "Profit by region", "provider": "openai"},
+        {"query": "Revenue by region", "provider": "openai", "history": history},
+    ])
+    assert len(planner.runs) == 3
+
+
+def test_finished_runs_are_not_reused(planner):
+    _post_all([{"query": "Revenue by region", "provider": "openai"}])
+    responses = _post_all([{"query": "Revenue by region", "provider": "openai"}])
+    assert len(planner.runs) == 2
+    assert responses[0]["coalesced"] is False
+
+
+@pytest.mark.parametrize("enabled, mode, accepted", [
+    (False, "replay", False),
+    (True, "record", False),
+    (True, "replay", True),
+])
+def test_replay_provider_needs_opt_in_and_never_records(monkeypatch, enabled, mode, accepted):
+    monkeypatch.setattr(main, "_REPLAY_API", enabled)
+    monkeypatch.setenv("OLAP_REPLAY_MODE", mode)
+    monkeypatch.setitem(main._planners, "replay", SlowPlanner())
+    response = _post_all([{"query": "Revenue by region", "provider": "replay"}])[0]
+    assert ("final_data" in response) is accepted
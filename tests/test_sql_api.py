@@ -0,0 +1,101 @@
+import io
+import json
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+from backend.api import main
+from backend.db import cursors
+from backend.db import database as db
+
+SQL = "SELECT order_id, region, revenue FROM fact_sales ORDER BY order_id"
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+def _pages(client, body: dict) -> list[dict]:
+    pages = [client.post("/sql", json=body).json()]
+    while pages[-1]["next_page_token"]:
+        follow = {"page_token": pages[-1]["next_page_token"], "page_size": body.get("page_size")}
+        pages.append(client.post("/sql", json=follow).json())
+    return pages
+
+
+def test_json_is_paged_through_a_server_side_cursor(client):
+    pages = _pages(client, {"sql": SQL, "page_size": 4000})
+    assert [p["row_count"] for p in pages] == [4000, 4000, 2000]
+    assert pages[0]["columns"] == ["order_id", "region", "revenue"]
+    ids = [row["order_id"] for p in pages for row in p["data"]]
+    assert len(set(ids)) == 10_000
+    assert not any(p["truncated"] for p in pages)
+
+
+def test_row_limit_truncates(client):
+    pages = _pages(client, {"sql": SQL, "page_size": 300, "limit": 500})
+    assert [p["row_count"] for p in pages] == [300, 200]
+    assert pages[-1]["truncated"] is True
+
+
+def test_page_tokens_are_single_use(client):
+    token = client.post("/sql", json={"sql": SQL, "page_size": 10}).json()["next_page_token"]
+    assert client.post("/sql", json={"page_token": token}).status_code == 200
+    assert client.post("/sql", json={"page_token": token}).status_code == 410
+
+
+@pytest.mark.parametrize("body, headers", [
+    ({"sql": SQL, "limit": 1500, "format": "csv"}, {}),
+    ({"sql": SQL, "limit": 1500}, {"Accept": "text/csv"}),
+])
+def test_csv_export(client, body, headers):
+    response = client.post("/sql", json=body, headers=headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].replace('"', "") == "order_id,region,revenue"
+    assert len(lines) == 1501
+
+
+def test_ndjson_export(client):
+    response = client.post("/sql", json={"sql": SQL, "limit": 25, "format": "ndjson"})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 25
+    assert set(rows[0]) == {"order_id", "region", "revenue"}
+
+
+def test_arrow_and_parquet_exports(client):
+    arrow = client.post("/sql", json={"sql": SQL, "format": "arrow"})
+    table = pa.ipc.open_stream(arrow.content).read_all()
+    assert table.num_rows == 10_000
+
+    parquet = client.post("/sql", json={"sql": SQL, "limit": 123}, headers={"Accept": "application/vnd.apache.parquet"})
+    assert pq.read_table(io.BytesIO(parquet.content)).num_rows == 123
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"sql": SQL, "format": "xlsx"}, 406),
+    ({"sql": "  "}, 400),
+    ({"sql": "SELECT no_such_column FROM fact_sales"}, 400),
+    ({"page_token": "unknown"}, 410),
+])
+def test_bad_requests(client, body, status):
+    assert client.post("/sql", json=body).status_code == status
+
+
+def test_open_cursors_count_against_the_pool(client, monkeypatch):
+    pool = db.CursorPool(db.get_connection(), size=2, timeout=0.05)
+    monkeypatch.setattr(db, "_pool", pool)
+    monkeypatch.setattr(cursors, "_cursors", OrderedDict())
+    first = client.post("/sql", json={"sql": SQL, "page_size": 10}).json()
+    second = client.post("/sql", json={"sql": SQL, "page_size": 10, "limit": 30}).json()
+    # Parked pages always leave a pooled cursor free: the older one was closed
+    assert pool.stats()["in_use"] == 1
+    assert client.post("/sql", json={"page_token": first["next_page_token"]}).status_code == 410
+
+    with pool.cursor():
+        assert client.post("/sql", json={"sql": SQL}).status_code == 503
+    pages = _pages(client, {"page_token": second["next_page_token"], "page_size": 10})
+    assert sum(p["row_count"] for p in pages) == 20
+    assert pool.stats()["in_use"] == 0
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+from backend.agents.visualization_agent import VisualizationAgent, recommend_chart
+from backend.db.result import QueryResult
+
+REGIONS = ["North America", "Europe", "Asia Pacific", "Latin America"]
+
+
+def _frame(**columns) -> pd.DataFrame:
+    return pd.DataFrame(columns)
+
+
+def test_time_series_is_a_line_coloured_by_a_small_category():
+    df = _frame(quarter=["Q1", "Q2"] * 4, region=REGIONS * 2, revenue=[1.0] * 8)
+    config = recommend_chart(df)
+    assert (config["chart_type"], config["x_col"], config["color_col"]) == ("line", "quarter", "region")
+
+
+def test_month_name_is_the_x_axis_and_its_sort_helper_is_ignored():
+    df = _frame(month=[1, 2, 3], month_name=["January", "February", "March"], revenue=[1.0, 2.0, 3.0])
+    config = recommend_chart(df)
+    assert (config["chart_type"], config["x_col"], config["y_col"]) == ("line", "month_name", "revenue")
+
+
+def test_parent_child_levels_make_a_treemap():
+    df = _frame(country=["Germany", "France", "Japan"], region=["Europe", "Europe", "Asia Pacific"],
+                revenue=[3.0, 2.0, 1.0])
+    config = recommend_chart(df)
+    assert config["chart_type"] == "treemap"
+    assert config["path"] == ["region", "country"]
+
+
+@pytest.mark.parametrize("operation, query, chart, orientation", [
+    ("", "Revenue by region", "bar", "v"),
+    ("ranking", "Top regions by revenue", "bar", "h"),
+    ("", "What share of revenue does each region have?", "pie", "v"),
+])
+def test_single_category(operation, query, chart, orientation):
+    df = _frame(region=REGIONS, revenue=[4.0, 3.0, 2.0, 1.0])
+    config = recommend_chart(df, operation, query)
+    assert (config["chart_type"], config["orientation"]) == (chart, orientation)
+
+
+def test_many_categories_are_horizontal_bars():
+    df = _frame(country=[f"c{i}" for i in range(30)], revenue=[1.0] * 30)
+    assert recommend_chart(df)["orientation"] == "h"
+
+
+def test_pivot_output_is_a_heatmap():
+    df = _frame(year=[2022, 2023, 2024], **{r: [1.0, 2.0, 3.0] for r in REGIONS})
+    config = recommend_chart(df, "pivot")
+    assert config["chart_type"] == "heatmap"
+    assert config["value_cols"] == REGIONS
+
+
+def test_competing_series_dimensions_are_left_to_the_llm():
+    df = _frame(quarter=["Q1"] * 4, region=REGIONS, category=["Furniture"] * 4, revenue=[1.0] * 4)
+    assert recommend_chart(df) is None
+
+
+def test_agent_only_calls_the_llm_for_ambiguous_shapes(monkeypatch):
+    agent = VisualizationAgent()
+    calls = []
+    monkeypatch.setattr(agent, "_call_llm", lambda system, user, max_tokens=1500: calls.append(user) or "{}")
+
+    df = _frame(region=REGIONS, revenue=[4.0, 3.0, 2.0, 1.0])
+    result = agent.run("Revenue by region", {"data": QueryResult.from_pandas(df), "columns": list(df.columns)})
+    assert result["config"]["chart_type"] == "bar"
+    assert calls == []
+
+    df = _frame(quarter=["Q1"] * 4, region=REGIONS, category=["Furniture"] * 4, revenue=[1.0] * 4)
+    agent.run("Revenue", {"data": QueryResult.from_pandas(df), "columns": list(df.columns)})
+    assert len(calls) == 1